@@ -0,0 +1,173 @@
+"""
+Exact accrual of interest, as an optional alternative to the yearly
+approximation in simulation.calculate_interest_totals.
+
+* Notes and Bonds pay semiannual coupons of half their interest rate on
+  their face amount. Coupon dates step back six months at a time from the
+  maturity date (month ends stay month ends), and each coupon accrues
+  evenly over the actual days of its coupon period (actual/actual). A
+  first coupon period starting before the issue date only accrues from the
+  issue date.
+* Bills are sold at a discount to their maturity value. The discount is
+  found from the bill's investment yield over the actual days to maturity,
+  on the actual length of the year after issue, and accrues evenly over
+  those days.
+
+With cash_basis, coupons are instead counted on their payment dates, less
+the interest accrued before issue that buyers pay at issue, and a bill's
+discount when the bill matures.
+
+Coupon schedules are built as arrays over every coupon of every security,
+so the cost grows with the number of coupons rather than with a loop over
+rows.
+"""
+import numpy as np
+import pandas as pd
+from periods import add_months, get_period_starts, get_period_labels, spread_by_period, get_live_periods
+
+# Values of 'Security Class 1 Description' sold at a discount rather than paying coupons.
+DISCOUNT_SECURITY_TYPES = ['Bills Maturity Value']
+
+# Months between coupon payments.
+COUPON_MONTHS = 6
+
+def is_discount_security(df: pd.DataFrame) -> np.ndarray:
+    """
+    Whether each security is a bill. Securities without a type (e.g. new
+    debt) pay coupons, which keeps their interest linear in rates.
+    """
+    if 'Security Class 1 Description' in df.columns:
+        return df['Security Class 1 Description'].isin(DISCOUNT_SECURITY_TYPES).to_numpy()
+    return np.zeros(len(df), dtype=bool)
+
+def build_coupon_schedule(issue_dates: np.ndarray, maturity_dates: np.ndarray) -> tuple:
+    """
+    Every coupon date after the issue date of each security.
+
+    Params:
+    issue_dates, maturity_dates: datetime64[D] arrays.
+
+    Returns:
+    (security_index, coupon_dates, previous_coupon_dates) with one element
+    per coupon, where previous_coupon_dates start each coupon period and may
+    fall before the issue date.
+    """
+    if len(issue_dates) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype='datetime64[D]'), np.zeros(0, dtype='datetime64[D]')
+    maturity_months = maturity_dates.astype('datetime64[M]')
+    maturity_days = (maturity_dates - maturity_months.astype('datetime64[D]')).astype(np.int64)
+    is_month_end = (maturity_dates + 1).astype('datetime64[M]') != maturity_months
+    maturity_months = maturity_months.astype(np.int64)
+    months = maturity_months - issue_dates.astype('datetime64[M]').astype(np.int64)
+    num_candidates = np.maximum(months, 0) // COUPON_MONTHS + 2
+    security_index = np.repeat(np.arange(len(issue_dates)), num_candidates)
+    coupon_number = np.arange(len(security_index)) - np.repeat(np.cumsum(num_candidates) - num_candidates, num_candidates)
+
+    # Converting each coupon's month to a date is slow, so look up the first
+    # day and length of every month the coupons fall in instead.
+    first_month = (maturity_months - COUPON_MONTHS * num_candidates).min()
+    month_starts = np.arange(first_month, maturity_months.max() + 2).astype('datetime64[M]').astype('datetime64[D]')
+    days_in_month = np.diff(month_starts).astype(np.int64)
+    coupon_months = maturity_months[security_index] - first_month - COUPON_MONTHS * coupon_number
+    # Month end maturities pay on the last day of every month.
+    coupon_days = np.where(is_month_end, 31, maturity_days)[security_index]
+
+    coupon_dates = month_starts[coupon_months] + np.minimum(coupon_days, days_in_month[coupon_months] - 1)
+    previous_months = coupon_months - COUPON_MONTHS
+    previous_coupon_dates = month_starts[previous_months] + np.minimum(coupon_days, days_in_month[previous_months] - 1)
+
+    is_paid = coupon_dates > issue_dates[security_index]
+    return security_index[is_paid], coupon_dates[is_paid], previous_coupon_dates[is_paid]
+
+def calculate_bill_discounts(
+        issue_dates: np.ndarray,
+        maturity_dates: np.ndarray,
+        maturity_values: np.ndarray,
+        yields: np.ndarray) -> np.ndarray:
+    """
+    Discount at issue of bills with the given investment yields (percent),
+    i.e. maturity value less price, where price * (1 + yield * days / year)
+    is the maturity value and year is the actual length of the year after
+    issue.
+    """
+    days = (maturity_dates - issue_dates).astype(np.int64)
+    days_in_year = (add_months(issue_dates, 12) - issue_dates).astype(np.int64)
+    return maturity_values * (1 - 1 / (1 + (yields / 100) * days / days_in_year))
+
+def calculate_exact_interest(
+        df: pd.DataFrame,
+        period: str = 'year',
+        groups: np.ndarray = None,
+        num_groups: int = None,
+        cash_basis: bool = False) -> tuple:
+    """
+    Exact interest of the securities in each group summed into periods.
+
+    Parameters:
+    df: As for simulation.calculate_interest_totals. Bills use their yield.
+    period: One of periods.PERIODS.
+    groups: Group index (0, 1, ...) of each security. All securities are in
+        one group if None.
+    num_groups: Number of groups, including any without securities.
+        Defaults to the highest group index plus one.
+    cash_basis: Count coupons when paid and bill discounts at maturity
+        instead of accruing them.
+
+    Returns:
+    (totals, labels) as returned by periods.calculate_interest_by_period.
+    """
+    if groups is None:
+        groups = np.zeros(len(df), dtype=np.int64)
+    if num_groups is None:
+        num_groups = int(groups.max()) + 1 if len(df) else 1
+    if len(df) == 0:
+        return np.zeros((num_groups, 0)), np.zeros(0, dtype=str)
+
+    issue_dates = df['Issue Date'].to_numpy().astype('datetime64[D]')
+    maturity_dates = np.maximum(df['Maturity Date'].to_numpy().astype('datetime64[D]'), issue_dates)
+    issue_amount = df['Issued Amount (in Millions)'].to_numpy(dtype=np.float64)
+    ## Bonds and Notes use interest rate. Bills don't have one; use yield.
+    interest_rate = df['Interest Rate'].to_numpy(dtype=np.float64)
+    if 'Yield' in df.columns:
+        interest_rate = np.where(np.isnan(interest_rate), df['Yield'].to_numpy(dtype=np.float64), interest_rate)
+    is_bill = is_discount_security(df)
+
+    # As elsewhere, securities accrue from the day after issue through maturity.
+    starts = get_period_starts(period, issue_dates.min() + 1, maturity_dates.max())
+    has_live_security = get_live_periods(issue_dates + 1, maturity_dates + 1, starts)
+
+    bill_index = np.flatnonzero(is_bill)
+    bill_discounts = calculate_bill_discounts(
+        issue_dates[bill_index], maturity_dates[bill_index], issue_amount[bill_index], interest_rate[bill_index])
+
+    coupon_index = np.flatnonzero(~is_bill)
+    security_index, coupon_dates, previous_coupon_dates = build_coupon_schedule(
+        issue_dates[coupon_index], maturity_dates[coupon_index])
+    security_index = coupon_index[security_index]
+    coupons = issue_amount[security_index] * interest_rate[security_index] / (100 * 12 / COUPON_MONTHS)
+
+    # Coupons accrue over their coupon period, from the issue date at the earliest.
+    accrual_start = np.maximum(previous_coupon_dates, issue_dates[security_index])
+    accrued_coupons = coupons * (coupon_dates - accrual_start).astype(np.int64) / (
+        coupon_dates - previous_coupon_dates).astype(np.int64)
+
+    if cash_basis:
+        # Buyers pay the interest accrued before issue, and get it back with the first coupon.
+        paid_dates = np.concatenate([coupon_dates, issue_dates[security_index], maturity_dates[bill_index]])
+        paid_groups = np.concatenate([groups[security_index], groups[security_index], groups[bill_index]])
+        periods = np.searchsorted(starts, np.maximum(paid_dates, starts[0]), side='right') - 1
+        totals = np.bincount(
+            paid_groups * (len(starts) - 1) + periods,
+            np.concatenate([coupons, accrued_coupons - coupons, bill_discounts]),
+            minlength=num_groups * (len(starts) - 1)).reshape(num_groups, len(starts) - 1)
+    else:
+        totals = spread_by_period(
+            np.concatenate([accrual_start, issue_dates[bill_index]]) + 1,
+            np.concatenate([coupon_dates, maturity_dates[bill_index]]) + 1,
+            np.concatenate([accrued_coupons, bill_discounts]),
+            starts,
+            np.concatenate([groups[security_index], groups[bill_index]]),
+            num_groups)
+
+    labels = get_period_labels(period, starts[:-1])
+    return totals[:, has_live_security], labels[has_live_security]
@@ -0,0 +1,251 @@
+"""
+Historical as-of replay of the projection against realized interest.
+
+As of each record date in the MSPD data, the model only knows the
+securities that had appeared by then. It projects their interest, with
+those maturing on or after the record date reissued at the rates observed
+around it, and the projection is compared with the interest actually paid
+on every security in the latest data.
+
+Rather than filter the securities and rerun the pipeline once per record
+date, each security is indexed once by two record dates:
+* first: the record date it first appears on. It is known as of every
+  record date from first on.
+* last: the last record date on or before its maturity date. It is
+  reissued as of every record date up to last.
+
+Interest on known securities is summed into groups by first and
+accumulated over record dates. Reissued interest is linear in the rate of
+each term, so the rollovers of every security are accrued once at a rate
+of 100 percent into (record date, term) groups, added from first and
+removed after last, and accumulated the same way. The projections as of
+every record date then cost one pass over the securities plus a product
+with each record date's curve.
+
+New debt is not projected, so errors include the interest on debt issued
+beyond rollovers since each record date. Securities that were issued and
+matured between two monthly record dates never appear in the data, so
+realized interest misses some of the shortest bills.
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from utils import load_config, parse_terms, find_closest_value_indices
+from data import load_securities
+from simulation import compute_reissue_schedule, calculate_interest_totals
+
+def index_record_dates(df: pd.DataFrame) -> tuple:
+    """
+    Record dates of the securities in df, sorted, with the first and last
+    record date index of each security (see module docstring). Securities
+    that matured before they were first recorded have last < first.
+
+    Params:
+    df: Securities with a 'First Record Date' column (see
+        data.read_securities).
+
+    Returns:
+    (record_dates, first, last)
+    """
+    record_dates = np.unique(df['First Record Date'].to_numpy())
+    first = np.searchsorted(record_dates, df['First Record Date'].to_numpy())
+    last = np.searchsorted(record_dates, df['Maturity Date'].to_numpy(), side='right') - 1
+    return record_dates, first, last
+
+def observe_rate_curves(
+        df: pd.DataFrame,
+        record_dates: np.ndarray,
+        terms: list,
+        window_days: int = 91) -> np.ndarray:
+    """
+    Interest rate curve as of each record date, from the securities issued
+    in the window_days up to it. Each security is put in the bucket of the
+    closest term. A bucket with no issues in the window takes the rate of
+    its latest earlier issue, or the mean rate of its securities if there
+    is none.
+
+    Returns:
+    Array of shape (len(record_dates), len(terms)), in percent.
+    """
+    bucket = find_closest_value_indices(df['term_days'].to_numpy() / 365, terms)
+    issue_dates = df['Issue Date'].to_numpy()
+    rates = df['Interest Rate'].to_numpy(dtype=np.float64)
+    window_start = record_dates - np.timedelta64(window_days, 'D')
+    curves = np.empty((len(record_dates), len(terms)))
+    for i in range(len(terms)):
+        in_bucket = (bucket == i) & ~np.isnan(rates)
+        order = np.argsort(issue_dates[in_bucket], kind='stable')
+        bucket_issue_dates = issue_dates[in_bucket][order]
+        bucket_rates = rates[in_bucket][order]
+        if len(bucket_rates) == 0:
+            curves[:, i] = np.nan
+            continue
+        # Window means from running sums over the issues sorted by date.
+        cumulative_rates = np.concatenate([[0.0], np.cumsum(bucket_rates)])
+        stop = np.searchsorted(bucket_issue_dates, record_dates, side='right')
+        start = np.searchsorted(bucket_issue_dates, window_start, side='right')
+        latest = bucket_rates[np.maximum(stop - 1, 0)]
+        window_means = (cumulative_rates[stop] - cumulative_rates[start]) / np.maximum(stop - start, 1)
+        curves[:, i] = np.where(stop > start, window_means, np.where(stop > 0, latest, bucket_rates.mean()))
+    # Terms with no securities at all take the closest term that has some.
+    has_rates = ~np.isnan(curves[0])
+    closest = np.flatnonzero(has_rates)[find_closest_value_indices(terms, np.asarray(terms)[has_rates])]
+    return curves[:, closest]
+
+def run_backtest(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        terms: list,
+        interest_rates: dict = None,
+        window_days: int = 91,
+        all_securities: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Projects interest as of every record date and compares it with
+    realized interest.
+
+    Params:
+    df: Securities with first record dates, as returned by
+        load_securities(..., first_record_dates=True).
+    max_record_date: Max record date in the raw data.
+    terms: Term buckets of the reissue rate curves, in years.
+    interest_rates: Fixed curve {term_years: rate} to reissue at as of every
+        record date. If None, curves are observed from the data (see
+        observe_rate_curves).
+    window_days: See observe_rate_curves.
+    all_securities: Securities of every type, with first record dates. If
+        given, the ratio of their realized interest to that of df is
+        reported as implied_multiplier, the counterpart of the multiplier
+        in the config.
+
+    Returns:
+    Long-format DataFrame with a row per record date and later year up to
+    the last complete year of the data: as_of, year, horizon (years after
+    the record date's year), projected, realized, error (projected less
+    realized), pct_error and, with all_securities, realized_all and
+    implied_multiplier.
+    """
+    record_dates, first, last = index_record_dates(df)
+    num_dates = len(record_dates)
+    terms = sorted(terms)
+    # Reissue through the last year the data has complete realized interest for.
+    last_year = max_record_date.year - 1
+    reissue_end_date = pd.Timestamp(year=last_year, month=12, day=31)
+
+    # Interest on known securities: per first record date, accumulated over record dates.
+    known_totals, known_years = calculate_interest_totals(df, first, num_dates)
+    known_totals = np.cumsum(known_totals, axis=0)
+
+    # Rollovers of securities maturing on or after each record date, by term, at 100 percent.
+    is_reissued = last >= first
+    reissue_df = df[is_reissued].reset_index(drop=True)
+    row_index, issue_dates, maturity_dates = compute_reissue_schedule(reissue_df, reissue_end_date)
+    bucket = find_closest_value_indices(reissue_df['term_days'].to_numpy() / 365, terms)[row_index]
+    reissue_first = first[is_reissued][row_index]
+    reissue_last = last[is_reissued][row_index]
+    # Added from first, removed after last; removals past the last record date are dropped.
+    is_removed = reissue_last + 1 < num_dates
+    unit_totals, reissue_years = calculate_interest_totals(pd.DataFrame({
+        'Interest Rate': 100.0,
+        'Issue Date': np.concatenate([issue_dates, issue_dates[is_removed]]),
+        'Maturity Date': np.concatenate([maturity_dates, maturity_dates[is_removed]]),
+        'Issued Amount (in Millions)': np.concatenate([
+            reissue_df['Issued Amount (in Millions)'].to_numpy()[row_index],
+            -reissue_df['Issued Amount (in Millions)'].to_numpy()[row_index][is_removed]])
+    }), np.concatenate([
+        reissue_first * len(terms) + bucket,
+        (reissue_last[is_removed] + 1) * len(terms) + bucket[is_removed]
+    ]), num_dates * len(terms))
+    exposure = np.cumsum(unit_totals.reshape(num_dates, len(terms), -1), axis=0)
+
+    if interest_rates is None:
+        curves = observe_rate_curves(df, record_dates, terms, window_days)
+    else:
+        curves = np.broadcast_to(np.array([interest_rates[term] for term in terms], dtype=np.float64), (num_dates, len(terms)))
+
+    # Projections on a shared year axis.
+    years = np.union1d(known_years, reissue_years)
+    projected = np.zeros((num_dates, len(years)))
+    projected[:, np.searchsorted(years, known_years)] += known_totals
+    projected[:, np.searchsorted(years, reissue_years)] += np.einsum('dty,dt->dy', exposure, curves / 100)
+
+    # Realized interest, on every security in the data.
+    realized = pd.Series(known_totals[-1], index=known_years)
+    realized_all = None
+    if all_securities is not None:
+        all_totals, all_years = calculate_interest_totals(all_securities)
+        realized_all = pd.Series(all_totals[0], index=all_years)
+
+    as_of_years = record_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    as_of_index, year_index = np.nonzero((years[None, :] > as_of_years[:, None]) & (years[None, :] <= last_year))
+    result = pd.DataFrame({
+        'as_of': pd.to_datetime(record_dates[as_of_index]),
+        'year': years[year_index],
+        'horizon': years[year_index] - as_of_years[as_of_index],
+        'projected': projected[as_of_index, year_index],
+        'realized': realized.reindex(years[year_index], fill_value=0).to_numpy()
+    })
+    result['error'] = result['projected'] - result['realized']
+    result['pct_error'] = result['error'] / result['realized']
+    if realized_all is not None:
+        result['realized_all'] = realized_all.reindex(result['year'], fill_value=0).to_numpy()
+        result['implied_multiplier'] = result['realized_all'] / result['realized']
+    return result
+
+def summarize_backtest(result: pd.DataFrame) -> pd.DataFrame:
+    """Mean, mean absolute and worst percentage error by horizon."""
+    summary = result.groupby('horizon')['pct_error'].agg(
+        projections='count',
+        mean_pct_error='mean',
+        mean_abs_pct_error=lambda pct_error: pct_error.abs().mean(),
+        max_abs_pct_error=lambda pct_error: pct_error.abs().max())
+    return summary.round(4)
+
+if __name__ == "__main__":
+    # Load config.
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(current_dir, 'config_old.yml')
+    config = load_config(config_path)
+
+    parser = argparse.ArgumentParser(
+        description='Replay the projection as of every MSPD record date and compare it with realized interest.')
+    parser.add_argument('--static-rates', action='store_true',
+                        help='Reissue at interest_rates_default from config as of every record date '
+                             '(default: rates observed around each record date).')
+    parser.add_argument('--window-days', type=int, default=91,
+                        help='Days of issues before each record date its observed rates are averaged over.')
+    parser.add_argument('--multiplier', action='store_true',
+                        help='Also read securities of every type and report the implied multiplier by year.')
+    parser.add_argument('--output', default=None,
+                        help='Output .csv path (default: output_path from config with a _backtest suffix).')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always parse the raw .csv instead of using the preprocessed snapshot in cache_dir.')
+    args = parser.parse_args()
+
+    cache_dir = None if args.no_cache else config['io'].get('cache_dir')
+    interest_rates = parse_terms(config['simulation']['interest_rates_default'])
+    df, max_record_date = load_securities(
+        config['io']['raw_data_path'], config['simulation']['security_types'], cache_dir, first_record_dates=True)
+    all_securities = None
+    if args.multiplier:
+        all_securities, _ = load_securities(config['io']['raw_data_path'], None, cache_dir)
+
+    result = run_backtest(
+        df=df,
+        max_record_date=max_record_date,
+        terms=list(interest_rates),
+        interest_rates=interest_rates if args.static_rates else None,
+        window_days=args.window_days,
+        all_securities=all_securities
+    )
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(f"Projections as of {result['as_of'].nunique()} record dates, by horizon:")
+        print(summarize_backtest(result))
+        if all_securities is not None:
+            implied = result.groupby('year')['implied_multiplier'].first()
+            print(f"Implied multiplier by year (config: {config['simulation']['multiplier']}):")
+            print(implied.round(3))
+
+    output_path = args.output or '{}_backtest.csv'.format(os.path.splitext(config['io']['output_path'])[0])
+    result.to_csv(output_path, index=False)
+    print(f"Wrote {len(result)} rows to {output_path}")
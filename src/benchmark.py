@@ -0,0 +1,262 @@
+"""
+Benchmarks of each pipeline stage on synthetic MSPD data (see synthetic.py),
+so performance can be measured and compared without the real data.
+
+For every data size the load stages are timed, and for every reissue end
+date (horizon) so are the scenario stages: reissue, accrual, new debt and
+aggregation, plus the per-security breakdown and its groupby by id and by
+security type (by_security/...). The original row-by-row reissue_security,
+calculate_interest_payments and single pool issue_new_debt are timed on a
+fixed sample of securities (legacy/...), since they are far too slow for
+the full data.
+
+Stage times come from the instrumentation in profiling.py; each is the
+best of several repeats. Results can be saved as a named baseline under
+benchmarks/baselines and later runs compared against it.
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import datetime
+import contextlib
+import numpy as np
+import pandas as pd
+from utils import load_config, parse_terms
+from data import load_securities
+from profiling import start_profiling, stop_profiling
+from synthetic import write_synthetic_data
+from main import load_historical_gdps, run_scenario
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+BASELINES_DIR = os.path.join(BENCHMARKS_DIR, 'baselines')
+
+DEFAULT_SIZES = [10000, 100000]
+DEFAULT_HORIZONS = ['2034-12-31', '2054-12-31', '2074-12-31']
+
+# Stages that are this much slower than the baseline are reported as regressions.
+REGRESSION_RATIO = 1.25
+# Stages quicker than this are mostly timer noise and never flagged.
+MIN_FLAGGED_SECONDS = 0.05
+
+def time_stages(func, repeats: int) -> dict:
+    """
+    Runs func repeats times with profiling on and its output suppressed.
+
+    Returns:
+    {stage: {'seconds': best wall time, 'rows': rows}}
+    """
+    best = {}
+    for _ in range(repeats):
+        profiler = start_profiling()
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                func()
+        finally:
+            stop_profiling()
+        for record in profiler.stages.values():
+            stage = record['stage']
+            if stage not in best or record['wall_s'] < best[stage]['seconds']:
+                best[stage] = {'seconds': record['wall_s'], 'rows': record['rows']}
+    return best
+
+def run_benchmarks(
+        sizes: list,
+        horizons: list,
+        scenario: dict,
+        security_types: list,
+        repeats: int = 3,
+        legacy_sample: int = 1000,
+        data_dir: str = None,
+        seed: int = 0) -> dict:
+    """
+    Params:
+    sizes: Numbers of synthetic securities.
+    horizons: Reissue end dates, as strings.
+    scenario: Scenario parameters passed to main.run_scenario
+        (interest_rates, gdp_millions, ...).
+    security_types: Values of 'Security Class 1 Description' to keep.
+    repeats: Times each stage is run; the best time is kept.
+    legacy_sample: Number of securities the legacy row-by-row stages are
+        timed on.
+    data_dir: Where synthetic data is written and reused.
+    seed: Seed of the synthetic data.
+
+    Returns:
+    Report with the machine, the settings and one result per size,
+    horizon and stage.
+    """
+    data_dir = data_dir or os.path.join(BENCHMARKS_DIR, 'data')
+    results = []
+
+    def add_results(num_securities, horizon, stages, prefix=''):
+        for stage, timing in stages.items():
+            results.append({
+                'securities': num_securities,
+                'horizon': horizon,
+                'stage': prefix + stage,
+                'seconds': round(timing['seconds'], 4),
+                'rows': timing['rows']
+            })
+
+    for num_securities in sizes:
+        raw_data_path, historical_gdps_path = write_synthetic_data(num_securities, data_dir, seed)
+        print(f"Benchmarking {num_securities} securities...")
+        add_results(num_securities, None, time_stages(
+            lambda: load_securities(raw_data_path, security_types), repeats))
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            df, max_record_date = load_securities(raw_data_path, security_types)
+            historical_gdps = load_historical_gdps(historical_gdps_path)
+        sample = df.sample(min(legacy_sample, len(df)), random_state=seed).reset_index(drop=True)
+
+        for horizon in horizons:
+            reissue_end_date = pd.Timestamp(horizon)
+            print(f"  Horizon {horizon}")
+            add_results(num_securities, horizon, time_stages(lambda: run_scenario(
+                df=df,
+                max_record_date=max_record_date,
+                historical_gdps=historical_gdps,
+                reissue_end_date=reissue_end_date,
+                new_debt=True,
+                write_intermediates=False,
+                **scenario), repeats))
+            add_results(num_securities, horizon, time_stages(lambda: run_scenario(
+                df=df,
+                max_record_date=max_record_date,
+                historical_gdps=historical_gdps,
+                reissue_end_date=reissue_end_date,
+                new_debt=True,
+                write_intermediates=False,
+                by_security=True,
+                **scenario), repeats), prefix='by_security/')
+            # The legacy stages are slow and their times stable, so run them once.
+            add_results(num_securities, horizon, time_stages(lambda: run_scenario(
+                df=sample,
+                max_record_date=max_record_date,
+                historical_gdps=historical_gdps,
+                reissue_end_date=reissue_end_date,
+                new_debt=True,
+                write_intermediates=False,
+                legacy_reissue=True,
+                legacy_accrual=True,
+                legacy_new_debt=True,
+                **scenario), 1), prefix='legacy/')
+
+    return {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__
+        },
+        'settings': {
+            'repeats': repeats,
+            'legacy_sample': legacy_sample,
+            'seed': seed
+        },
+        'results': results
+    }
+
+def compare_results(baseline: dict, current: dict) -> pd.DataFrame:
+    """
+    Stage times of current against baseline, matched on size, horizon and stage.
+
+    Returns:
+    DataFrame with baseline_s, current_s, ratio (current / baseline) and a
+    status of 'slower', 'faster' or '' per stage. Stages under
+    MIN_FLAGGED_SECONDS are never flagged. Stages only timed in the
+    baseline have the status 'missing' and those only timed in current
+    'new', e.g. after a stage is renamed.
+    """
+    key = ['securities', 'horizon', 'stage']
+    baseline_df = pd.DataFrame(baseline['results'])[key + ['seconds']].fillna({'horizon': ''})
+    current_df = pd.DataFrame(current['results'])[key + ['seconds']].fillna({'horizon': ''})
+    comparison = baseline_df.merge(current_df, on=key, how='outer', suffixes=('_baseline', '_current'), sort=False)
+    comparison = comparison.rename(columns={'seconds_baseline': 'baseline_s', 'seconds_current': 'current_s'})
+    comparison['ratio'] = (comparison['current_s'] / comparison['baseline_s']).round(2)
+    is_timed = comparison[['baseline_s', 'current_s']].max(axis=1) >= MIN_FLAGGED_SECONDS
+    comparison['status'] = np.select(
+        [
+            comparison['current_s'].isna(),
+            comparison['baseline_s'].isna(),
+            is_timed & (comparison['ratio'] > REGRESSION_RATIO),
+            is_timed & (comparison['ratio'] < 1 / REGRESSION_RATIO)
+        ],
+        ['missing', 'new', 'slower', 'faster'],
+        '')
+    return comparison
+
+def get_baseline_path(name: str) -> str:
+    return os.path.join(BASELINES_DIR, f"{name}.json")
+
+if __name__ == "__main__":
+    # Load config.
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(current_dir, 'config_old.yml')
+    config = load_config(config_path)
+
+    parser = argparse.ArgumentParser(description='Benchmark pipeline stages on synthetic MSPD data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Numbers of synthetic securities, e.g. 10000 100000 1000000.')
+    parser.add_argument('--horizons', nargs='+', default=DEFAULT_HORIZONS, help='Reissue end dates.')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per stage; the best time is kept.')
+    parser.add_argument('--legacy-sample', type=int, default=1000,
+                        help='Number of securities the legacy row-by-row stages are timed on.')
+    parser.add_argument('--data-dir', default=None,
+                        help='Directory for the synthetic data (default: benchmarks/data).')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data.')
+    parser.add_argument('--output', default=None, help='Also write the results to this .json path.')
+    parser.add_argument('--save-baseline', default=None, metavar='NAME',
+                        help='Save the results as benchmarks/baselines/NAME.json.')
+    parser.add_argument('--compare', default='default', metavar='NAME',
+                        help='Compare against benchmarks/baselines/NAME.json, if it exists (default: default).')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Exit with an error if any stage is slower than the baseline.')
+    args = parser.parse_args()
+
+    scenario = {
+        'interest_rates': parse_terms(config['simulation']['interest_rates_default']),
+        'gdp_millions': config['simulation']['gdp_millions'],
+        'gdp_growth_rate': config['simulation']['gdp_growth_rate'],
+        'new_debt_pct_gdp': config['simulation']['new_debt_pct_gdp'],
+        'new_debt_interest_rate': config['simulation']['new_debt_interest_rate'],
+        'new_debt_maturity_mix': parse_terms(config['simulation']['new_debt_maturity_mix']),
+        'multiplier': config['simulation']['multiplier'],
+    }
+    report = run_benchmarks(
+        sizes=args.sizes,
+        horizons=args.horizons,
+        scenario=scenario,
+        security_types=config['simulation']['security_types'],
+        repeats=args.repeats,
+        legacy_sample=args.legacy_sample,
+        data_dir=args.data_dir,
+        seed=args.seed
+    )
+
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        results = pd.DataFrame(report['results']).fillna({'horizon': ''}).astype({'rows': 'Int64'})
+        print(results.to_string(index=False))
+
+        baseline_path = get_baseline_path(args.compare)
+        comparison = None
+        if os.path.exists(baseline_path) and args.compare != args.save_baseline:
+            with open(baseline_path) as f:
+                comparison = compare_results(json.load(f), report)
+            print(f"\nCompared to {baseline_path}:")
+            print(comparison.to_string(index=False))
+
+    for path in [args.output, args.save_baseline and get_baseline_path(args.save_baseline)]:
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Wrote results to {path}")
+
+    if args.fail_on_regression and comparison is not None and (comparison['status'] == 'slower').any():
+        sys.exit(1)
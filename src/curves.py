@@ -0,0 +1,205 @@
+"""
+Interest rate curves interpolated between their terms.
+
+A curve gives rates at a few terms (e.g. 1, 2, 5, 10 and 30 years), and
+every security needs the rate for its own term. Three interpolations are
+supported:
+* nearest: The rate of the closest term, as originally modelled. Ties go
+  to the first term of the curve.
+* linear: Linear between the two surrounding terms.
+* monotone_cubic: Piecewise cubic through every term, with slopes chosen so
+  the curve never overshoots between two terms (Fritsch-Carlson, as in
+  PCHIP).
+Terms shorter or longer than those of the curve take the rate of its
+shortest or longest term.
+
+Nearest and linear rates are weighted sums of the curve's rates, so
+interest stays linear in rates (see get_term_weights and exposure.py).
+Monotone cubic slopes depend on the rates themselves, so it is not.
+
+A RateCurve interpolates once per distinct term (and, for a rate path, per
+distinct issue year) and looks every security's rate up from that table.
+"""
+import numpy as np
+import pandas as pd
+from typing import Union
+from utils import get_rates_by_year, find_closest_value_indices
+
+INTERPOLATIONS = ['nearest', 'linear', 'monotone_cubic']
+
+def get_term_weights(term_years: np.ndarray, terms: list, interpolation: str = 'nearest') -> np.ndarray:
+    """
+    Weight of each curve term in the rate of each of term_years.
+
+    Params:
+    term_years: Terms to price, in years.
+    terms: Terms of the curve, in years, in the curve's order.
+    interpolation: 'nearest' or 'linear'.
+
+    Returns:
+    Array of shape (len(term_years), len(terms)) whose rows sum to 1, so
+    rates are weights @ curve rates.
+    """
+    term_years = np.asarray(term_years, dtype=np.float64)
+    weights = np.zeros((len(term_years), len(terms)))
+    rows = np.arange(len(term_years))
+    if interpolation == 'nearest':
+        weights[rows, find_closest_value_indices(term_years, terms)] = 1.0
+        return weights
+    if interpolation != 'linear':
+        raise ValueError(f"{interpolation} interpolation is not linear in rates; use nearest or linear.")
+    lower, upper, fraction = get_linear_bounds(term_years, terms)
+    np.add.at(weights, (rows, lower), 1 - fraction)
+    np.add.at(weights, (rows, upper), fraction)
+    return weights
+
+def get_linear_bounds(term_years: np.ndarray, terms: list) -> tuple:
+    """
+    Curve terms on either side of each of term_years, for linear
+    interpolation.
+
+    Returns:
+    (lower, upper, fraction) where lower and upper index terms and the rate
+    is (1 - fraction) * rate[lower] + fraction * rate[upper].
+    """
+    term_years = np.asarray(term_years, dtype=np.float64)
+    order = np.argsort(terms, kind='stable')
+    sorted_terms = np.asarray(terms, dtype=np.float64)[order]
+    clipped = np.clip(term_years, sorted_terms[0], sorted_terms[-1])
+    lower = np.clip(np.searchsorted(sorted_terms, clipped, side='right') - 1, 0, max(len(terms) - 2, 0))
+    upper = np.minimum(lower + 1, len(terms) - 1)
+    span = sorted_terms[upper] - sorted_terms[lower]
+    fraction = np.divide(clipped - sorted_terms[lower], span, out=np.zeros(len(term_years)), where=span > 0)
+    return order[lower], order[upper], fraction
+
+def interpolate_monotone_cubic(terms: np.ndarray, rates: np.ndarray, term_years: np.ndarray) -> np.ndarray:
+    """
+    Monotone cubic interpolation of curves.
+
+    Params:
+    terms: Sorted terms of the curves, in years.
+    rates: Array of shape (..., len(terms)), one curve per row.
+    term_years: Terms to price, in years.
+
+    Returns:
+    Array of shape (..., len(term_years)).
+    """
+    if len(terms) < 3:
+        # Two points give a straight line.
+        lower, upper, fraction = get_linear_bounds(term_years, list(terms))
+        return (1 - fraction) * rates[..., lower] + fraction * rates[..., upper]
+    widths = np.diff(terms)
+    slopes = np.diff(rates, axis=-1) / widths
+
+    # Interior derivatives are weighted harmonic means of the slopes on
+    # either side, or flat where the curve turns.
+    w1 = 2 * widths[1:] + widths[:-1]
+    w2 = widths[1:] + 2 * widths[:-1]
+    is_monotone = slopes[..., :-1] * slopes[..., 1:] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        harmonic = (w1 + w2) / (w1 / slopes[..., :-1] + w2 / slopes[..., 1:])
+    derivatives = np.zeros(rates.shape)
+    derivatives[..., 1:-1] = np.where(is_monotone, harmonic, 0.0)
+
+    def end_derivative(h0, h1, m0, m1):
+        # Three point estimate, kept from overshooting.
+        d = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+        d = np.where(np.sign(d) != np.sign(m0), 0.0, d)
+        return np.where((np.sign(m0) != np.sign(m1)) & (np.abs(d) > 3 * np.abs(m0)), 3 * m0, d)
+
+    derivatives[..., 0] = end_derivative(widths[0], widths[1], slopes[..., 0], slopes[..., 1])
+    derivatives[..., -1] = end_derivative(widths[-1], widths[-2], slopes[..., -1], slopes[..., -2])
+
+    # Cubic Hermite on the interval of each term.
+    clipped = np.clip(np.asarray(term_years, dtype=np.float64), terms[0], terms[-1])
+    k = np.clip(np.searchsorted(terms, clipped, side='right') - 1, 0, len(terms) - 2)
+    h = widths[k]
+    t = (clipped - terms[k]) / h
+    return (
+        (2 * t**3 - 3 * t**2 + 1) * rates[..., k]
+        + (t**3 - 2 * t**2 + t) * h * derivatives[..., k]
+        + (-2 * t**3 + 3 * t**2) * rates[..., k + 1]
+        + (t**3 - t**2) * h * derivatives[..., k + 1])
+
+class RateCurve:
+    def __init__(self, interest_rates: Union[dict, pd.DataFrame], interpolation: str = 'nearest'):
+        """
+        Params:
+        interest_rates: Dictionary in the form {term_years: interest_rate},
+            or a rate path (see utils.load_rate_path), in which case rates
+            are looked up by issue year.
+        interpolation: One of INTERPOLATIONS.
+        """
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f"Unknown interpolation {interpolation!r}; expected one of {INTERPOLATIONS}.")
+        self.interest_rates = interest_rates
+        self.interpolation = interpolation
+        self.terms = list(interest_rates.keys())
+        # Other columns of a rate path, e.g. 'new_debt', are not terms.
+        non_terms = [term for term in self.terms if isinstance(term, str)]
+        if non_terms:
+            raise ValueError(f"Interest rates have columns {non_terms} that are not terms; pop them before use.")
+        self.is_path = isinstance(interest_rates, pd.DataFrame)
+
+    def interpolate(self, rates: np.ndarray, term_years: np.ndarray) -> np.ndarray:
+        """
+        Rates at term_years of curves with this curve's terms.
+
+        Params:
+        rates: Array of shape (..., len(terms)), in the order of terms.
+
+        Returns:
+        Array of shape (..., len(term_years)).
+        """
+        term_years = np.asarray(term_years, dtype=np.float64)
+        if self.interpolation == 'nearest':
+            return rates[..., find_closest_value_indices(term_years, self.terms)]
+        if self.interpolation == 'linear':
+            # Elementwise rather than a matrix product, so each rate comes out
+            # the same whichever other terms are priced alongside it.
+            lower, upper, fraction = get_linear_bounds(term_years, self.terms)
+            return (1 - fraction) * rates[..., lower] + fraction * rates[..., upper]
+        order = np.argsort(self.terms, kind='stable')
+        return interpolate_monotone_cubic(
+            np.asarray(self.terms, dtype=np.float64)[order], rates[..., order], term_years)
+
+    def get_rates(self, term_years: np.ndarray, issue_years: np.ndarray = None) -> np.ndarray:
+        """
+        Rates at term_years, for a rate path in each of issue_years.
+
+        Returns:
+        Array of shape (len(term_years),) for a curve, or (len(issue_years),
+        len(term_years)) for a rate path.
+        """
+        if self.is_path:
+            rates = get_rates_by_year(self.interest_rates[self.terms], issue_years)
+        else:
+            rates = np.array(list(self.interest_rates.values()), dtype=np.float64)
+        return self.interpolate(rates, term_years)
+
+    def lookup(self, term_days: np.ndarray, issue_years: np.ndarray = None, index: np.ndarray = None) -> np.ndarray:
+        """
+        Rates from a table of the rate of every distinct term (and issue
+        year, for a rate path), so each rate is a single array lookup.
+
+        Params:
+        term_days: Term of each security in days.
+        issue_years: Year each rate applies from, for a rate path, with the
+            length of the result.
+        index: Security each rate is for, e.g. the row_index of
+            simulation.compute_reissue_schedule. One rate per security if None.
+
+        Returns:
+        Array of rates, one per element of index.
+        """
+        distinct_days, day_index = np.unique(term_days, return_inverse=True)
+        if index is not None:
+            day_index = day_index[index]
+        if not self.is_path:
+            return self.get_rates(distinct_days / 365)[day_index]
+        if len(day_index) == 0:
+            return np.zeros(0)
+        # Years are few and consecutive, so they index the table directly.
+        first_year = issue_years.min()
+        table = self.get_rates(distinct_days / 365, np.arange(first_year, issue_years.max() + 1))
+        return table[issue_years - first_year, day_index]
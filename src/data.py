@@ -0,0 +1,388 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from profiling import stage, stage_iter
+
+# Bump whenever read_securities changes what it outputs, so stale cached
+# snapshots are not picked up.
+CACHE_VERSION = 2
+
+USECOLS = [
+    'Record Date',
+    #'Security Type Description', # Marketable or Non-Marketable
+    'Security Class 1 Description', # Type of security
+    'Security Class 2 Description', # CUSIP ID number (unique for each security)
+    'Interest Rate',
+    'Yield',
+    'Issue Date',
+    'Maturity Date',
+    'Issued Amount (in Millions)', # Read as non-numeric due to *
+    #'Outstanding Amount (in Millions)', # Read as non-numeric due to *
+]
+
+def preprocess_securities(df: pd.DataFrame, security_types: list, validate_security_types: bool = True) -> tuple:
+    """
+    Cleans the raw MSPD securities data.
+
+    Params:
+    df: Raw data read from the MSPD .csv with USECOLS.
+    security_types: Values of 'Security Class 1 Description' to keep.
+    validate_security_types: Raise if a security type is missing from df.
+        Turn off when df is only part of the raw data.
+
+    Returns:
+    (df, max_record_date) where df holds one row per security with numeric
+    amounts, datetime dates and a 'term_days' column, in the representation
+    of compact_securities.
+    """
+    """
+    Security types: As of writing, only interested in non-TIPS, non-FSN marketable securities.
+
+    Yes: 'Notes', 'Bonds', 'Bills Maturity Value'
+    No: 'Inflation-Protected Securities', 'Floating Rate Notes'
+    """
+    # Ensure valid security types were passed
+    class_1_descriptions_to_keep = security_types
+    valid_class_1_descriptions = df['Security Class 1 Description'].unique()
+    invalid_security_passed = any(x not in valid_class_1_descriptions for x in class_1_descriptions_to_keep)
+    if validate_security_types and invalid_security_passed:
+        raise ValueError("An invalid security type was passed. Ensure all security types are included in raw data.")
+    # Filter data
+    df = df[df['Security Class 1 Description'].isin(class_1_descriptions_to_keep)]
+    print(f"Filtered to specified security types: {class_1_descriptions_to_keep}")
+    print(f"Shape: {df.shape}")
+
+    """
+    Duplicates: Raw data is append-only, so there can be multiple lines for
+    the same security with different record dates.
+
+    Note this is different than adding onto a security, which will have a
+    different issue date, so we drop on both ID and issue date.
+    """
+    subset = ['Security Class 2 Description', 'Issue Date']
+    df = df.drop_duplicates(subset=subset, keep='first')
+    print("Duplicates dropped.")
+    print(f"Shape: {df.shape}")
+
+    # Some records represent totals; we only want individual securities.
+    # These all contain the string 'Total' in their descriptions.
+    df = df[~df['Security Class 2 Description'].str.contains('Total')]
+    print("Totals records removed.")
+    print(f"Shape: {df.shape}")
+
+    df, max_record_date = convert_securities(df)
+    print(f"Max record date: {max_record_date}")
+    print("Negative term records removed.")
+    print(f"Shape: {df.shape}")
+
+    return compact_securities(df), max_record_date
+
+def convert_securities(df: pd.DataFrame) -> tuple:
+    """
+    Converts filtered, deduplicated securities to numeric and datetime
+    columns, drops 'Record Date' and adds 'term_days'.
+
+    Returns:
+    (df, max_record_date)
+    """
+    df = df.copy()
+
+    # Change columns to numeric.
+    df['Issued Amount (in Millions)'] = pd.to_numeric(df['Issued Amount (in Millions)'])
+
+    # Change columns to datetime after dropping nulls.
+    df.dropna(subset=['Issue Date', 'Maturity Date'], inplace=True) # (1)
+    df['Issue Date'] = pd.to_datetime(df['Issue Date'])
+    df['Maturity Date'] = pd.to_datetime(df['Maturity Date'])
+    df['Record Date'] = pd.to_datetime(df['Record Date'])
+
+    # Max record date; don't need to reissue anything that matures before this.
+    max_record_date = df['Record Date'].max()
+    df.drop('Record Date', axis=1, inplace=True)
+
+    # Safety: ensures the reissue function doesn't run forever due to error in raw data.
+    df['term_days'] = (df['Maturity Date'] - df['Issue Date']).dt.days
+    df = df[df['term_days'] > 0]
+
+    return df, max_record_date
+
+def compact_securities(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compact representation of converted securities, used from preprocessing
+    onwards:
+    * Security type and CUSIP are categoricals, i.e. integer codes into a
+      single copy of each string.
+    * 'Interest Rate' resolves the Bills fallback to 'Yield' once, and
+      'Yield' is dropped.
+    * 'term_days' is int32.
+
+    Dates stay datetime64; pandas has no day resolution and its coarsest
+    unit takes the same 8 bytes. Safe to call on already compact securities.
+    """
+    df = df.copy()
+    df['Security Class 1 Description'] = df['Security Class 1 Description'].astype('category')
+    df['Security Class 2 Description'] = df['Security Class 2 Description'].astype('category')
+    ## Bonds and Notes use interest rate. Bills don't have one; use yield.
+    if 'Yield' in df.columns:
+        df['Interest Rate'] = df['Interest Rate'].fillna(df['Yield'])
+        df.drop('Yield', axis=1, inplace=True)
+    df['term_days'] = df['term_days'].astype(np.int32)
+    return df
+
+def report_memory_usage(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Deep memory usage in MB of each column of two frames, with totals."""
+    report = pd.DataFrame({
+        'before_mb': before.memory_usage(index=False, deep=True),
+        'after_mb': after.memory_usage(index=False, deep=True)
+    }) / 2**20
+    report.loc['Total'] = report.sum()
+    report['ratio'] = report['before_mb'] / report['after_mb']
+    return report.round(2)
+
+################################################################################
+#
+################################################################################
+
+def read_securities(
+        raw_data_path: str,
+        security_types: list,
+        chunk_size: int = 500000,
+        after_record_date: pd.Timestamp = None,
+        validate_security_types: bool = True,
+        first_record_dates: bool = False) -> tuple:
+    """
+    Streaming equivalent of reading the whole .csv and running
+    preprocess_securities on it.
+
+    The file is read chunk_size rows at a time, and each chunk is filtered
+    to the security types, stripped of totals, deduplicated against every
+    (CUSIP, issue date) seen so far and converted before the next one is
+    read. Peak memory is proportional to the surviving securities rather
+    than the raw file.
+
+    Params:
+    raw_data_path: Path to the MSPD .csv.
+    security_types: Values of 'Security Class 1 Description' to keep, or
+        None to keep every type.
+    chunk_size: Number of raw rows per chunk.
+    after_record_date: If given, only read records with a later record date.
+    validate_security_types: As in preprocess_securities.
+    first_record_dates: Add a 'First Record Date' column with the earliest
+        record date of each security, i.e. when it first appeared in the data.
+
+    Returns:
+    (df, max_record_date), as returned by preprocess_securities.
+    """
+    subset = ['Security Class 2 Description', 'Issue Date']
+    seen_class_1_descriptions = set()
+    seen_keys = pd.DataFrame(columns=subset, dtype=str)
+    chunks = []
+    chunk_first_record_dates = []
+    max_record_date = pd.NaT
+    num_raw_rows = 0
+
+    # Text columns are read as strings so every chunk gets the same dtypes as a
+    # whole-file read, e.g. amounts go through to_numeric whether or not the
+    # chunk happens to contain a '*'.
+    dtype = dict.fromkeys([
+        'Record Date',
+        'Security Class 1 Description',
+        'Security Class 2 Description',
+        'Issue Date',
+        'Maturity Date',
+        'Issued Amount (in Millions)'
+    ], str)
+    reader = pd.read_csv(raw_data_path, usecols=USECOLS, dtype=dtype, chunksize=chunk_size)
+    for chunk in stage_iter('parse', reader):
+        num_raw_rows += len(chunk)
+        with stage('filter') as info:
+            seen_class_1_descriptions.update(chunk['Security Class 1 Description'].dropna().unique())
+            if after_record_date is not None:
+                chunk = chunk[pd.to_datetime(chunk['Record Date']) > after_record_date]
+            if security_types is not None:
+                chunk = chunk[chunk['Security Class 1 Description'].isin(security_types)]
+            # Totals never share a key with a security, so dropping them before
+            # deduplicating gives the same result as preprocess_securities.
+            chunk = chunk[~chunk['Security Class 2 Description'].str.contains('Total')]
+            info['rows'] = len(chunk)
+
+        if first_record_dates:
+            # Record dates are ISO strings, so the earliest sorts first.
+            chunk_first_record_dates.append(chunk.groupby(subset)['Record Date'].min())
+
+        with stage('dedup') as info:
+            # Keep the first record of each (CUSIP, issue date) across the whole file.
+            chunk = chunk.drop_duplicates(subset=subset, keep='first')
+            keys = pd.concat([seen_keys, chunk[subset]], axis=0, ignore_index=True)
+            chunk = chunk[~keys.duplicated(keep='first').to_numpy()[len(seen_keys):]]
+            seen_keys = pd.concat([seen_keys, chunk[subset]], axis=0, ignore_index=True)
+            info['rows'] = len(chunk)
+
+        with stage('convert') as info:
+            chunk, chunk_max_record_date = convert_securities(chunk)
+            info['rows'] = len(chunk)
+
+        chunks.append(chunk)
+        if pd.isna(max_record_date) or chunk_max_record_date > max_record_date:
+            max_record_date = chunk_max_record_date
+
+    # Ensure valid security types were passed
+    invalid_security_passed = any(x not in seen_class_1_descriptions for x in security_types or [])
+    if validate_security_types and invalid_security_passed:
+        raise ValueError("An invalid security type was passed. Ensure all security types are included in raw data.")
+
+    with stage('compact') as info:
+        df = pd.concat(chunks, axis=0, ignore_index=True)
+        if first_record_dates:
+            first_record_date = pd.concat(chunk_first_record_dates).groupby(level=subset).min().reset_index()
+            first_record_date['Issue Date'] = pd.to_datetime(first_record_date['Issue Date'])
+            df['First Record Date'] = pd.to_datetime(
+                df[subset].merge(first_record_date, on=subset, how='left')['Record Date']).to_numpy()
+        df = compact_securities(df)
+        info['rows'] = len(df)
+    print(f"Read {num_raw_rows} raw records in chunks of {chunk_size}.")
+    print(f"Filtered to specified security types: {security_types}")
+    print(f"Max record date: {max_record_date}")
+    print(f"Shape: {df.shape}")
+
+    return df, max_record_date
+
+################################################################################
+#
+################################################################################
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents, read in chunks."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def get_cache_path(raw_data_path: str, security_types: list, cache_dir: str, first_record_dates: bool = False) -> str:
+    """
+    Location of the preprocessed snapshot for a raw data file. The key covers
+    the file contents, the security types kept, any extra columns and
+    CACHE_VERSION, so any change to one of them results in a fresh snapshot.
+    """
+    key = {
+        'raw_data_sha256': hash_file(raw_data_path),
+        'security_types': None if security_types is None else list(security_types),
+        'cache_version': CACHE_VERSION
+    }
+    if first_record_dates:
+        key['first_record_dates'] = True
+    key = json.dumps(key, sort_keys=True)
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"securities_{digest}.feather")
+
+################################################################################
+#
+################################################################################
+
+def write_feather(df: pd.DataFrame, path: str, metadata: dict) -> None:
+    """
+    Writes df as an uncompressed Feather (Arrow IPC) file, which can be
+    memory-mapped back, with string metadata in the schema. Writes then
+    renames so an interrupted run never leaves a partial file.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(metadata)
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+def read_feather(path: str) -> tuple:
+    """Memory-maps a file written by write_feather. Returns (df, metadata)."""
+    table = feather.read_table(path, memory_map=True)
+    metadata = {k.decode(): v.decode() for k, v in table.schema.metadata.items()}
+    return table.replace_schema_metadata(None).to_pandas(), metadata
+
+################################################################################
+#
+################################################################################
+
+def load_securities(
+        raw_data_path: str,
+        security_types: list,
+        cache_dir: str = None,
+        chunk_size: int = 500000,
+        first_record_dates: bool = False) -> tuple:
+    """
+    Reads and preprocesses the MSPD securities data.
+
+    If cache_dir is given, the preprocessed frame is stored there as an
+    uncompressed Feather (Arrow IPC) file and memory-mapped back on later
+    runs against the same raw file, which skips CSV parsing entirely.
+
+    Params:
+    raw_data_path: Path to the MSPD .csv.
+    security_types: Values of 'Security Class 1 Description' to keep.
+    cache_dir: Directory for preprocessed snapshots. No caching if None.
+    chunk_size: Number of raw rows read at a time (see read_securities).
+    first_record_dates: See read_securities.
+
+    Returns:
+    (df, max_record_date), as returned by preprocess_securities.
+    """
+    cache_path = None
+    if cache_dir is not None:
+        with stage('hash_raw'):
+            cache_path = get_cache_path(raw_data_path, security_types, cache_dir, first_record_dates)
+        if os.path.exists(cache_path):
+            with stage('read_cache') as info:
+                df, metadata = read_feather(cache_path)
+                info['rows'] = len(df)
+            max_record_date = pd.Timestamp(metadata['max_record_date'])
+            print(f"Loaded preprocessed securities from cache: {cache_path}")
+            print(f"Shape: {df.shape}")
+            print(f"Max record date: {max_record_date}")
+            return df, max_record_date
+
+    # Read the .csv containing securities data.
+    df, max_record_date = read_securities(
+        raw_data_path, security_types, chunk_size, first_record_dates=first_record_dates)
+
+    if cache_path is not None:
+        with stage('write_cache'):
+            write_feather(df, cache_path, {'max_record_date': max_record_date.isoformat()})
+        print(f"Saved preprocessed securities to cache: {cache_path}")
+
+    return df, max_record_date
+
+if __name__ == "__main__":
+    """
+    Reports memory used by the securities before and after
+    compact_securities, for the raw data in the config.
+    """
+    from utils import load_config, parse_terms
+    from simulation import reissue_securities
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    config = load_config(os.path.join(current_dir, 'config_old.yml'))
+    security_types = config['simulation']['security_types']
+    reissue_end_date = pd.to_datetime(config['simulation']['reissue_end_date'])
+    interest_rates = parse_terms(config['simulation']['interest_rates_default'])
+
+    raw_df = pd.read_csv(config['io']['raw_data_path'], usecols=USECOLS, low_memory=False)
+    raw_df = raw_df[raw_df['Security Class 1 Description'].isin(security_types)]
+    raw_df = raw_df.drop_duplicates(subset=['Security Class 2 Description', 'Issue Date'], keep='first')
+    raw_df = raw_df[~raw_df['Security Class 2 Description'].str.contains('Total')]
+    before, max_record_date = convert_securities(raw_df)
+    after = compact_securities(before)
+
+    print("Securities:")
+    print(report_memory_usage(before, after))
+
+    print("Securities with reissued securities:")
+    reissued = []
+    for df in [before, after]:
+        reissue_df = df[df['Maturity Date'] >= max_record_date].reset_index(drop=True)
+        reissued.append(pd.concat(
+            [df, reissue_securities(reissue_df, interest_rates, reissue_end_date)], axis=0, ignore_index=True))
+    print(report_memory_usage(*reissued))
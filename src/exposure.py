@@ -0,0 +1,213 @@
+"""
+Interest is linear in the rate assigned to each term bucket: a reissued
+security pays amount x fraction of year x rate, and its rate is looked up
+from the bucket closest to its term. So per-year interest is
+
+    fixed + exposure @ rates
+
+where fixed is the interest on securities already in the data (their
+coupons don't change), exposure is a years x terms matrix of
+amount x fraction of year summed over the reissued securities in each
+bucket, and rates is the interest rate curve. The matrix only depends on
+the data, the end date and the curve's terms, so once it is built any
+curve with the same terms costs one matrix-vector product.
+
+When rates change from year to year, a reissued security gets the rates
+of the year it is issued, so the exposure is also split by issue year
+(path_exposure, years x issue years x terms) and a rate path is a tensor
+contraction over issue years and terms.
+
+With linear interpolation between terms (see curves.py), a security's
+rate is a weighted sum of the rates of the two terms around it, so its
+interest is split between their buckets by weight. Monotone cubic
+interpolation is not linear in rates and has no exposure.
+
+Principal outstanding does not depend on rates at all, so it is stored
+alongside at every year end.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Union
+from utils import get_rates_by_year
+from curves import get_term_weights
+from simulation import compute_reissue_schedule, calculate_interest_totals, calculate_outstanding_debt
+
+# Bump whenever build_rate_exposure changes what it outputs, so stale
+# cached exposures are not picked up.
+EXPOSURE_VERSION = 5
+
+def build_rate_exposure(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        terms: list,
+        reissue_end_date: pd.Timestamp,
+        interpolation: str = 'nearest') -> dict:
+    """
+    Builds the fixed interest and rate exposure of the securities in df.
+
+    Params:
+    df: Preprocessed securities, as returned by load_securities.
+    max_record_date: Max record date in the raw data.
+    terms: Keys of the interest rate curves to evaluate, in years.
+    reissue_end_date: No security is reissued after this date.
+    interpolation: 'nearest' or 'linear' (see curves.INTERPOLATIONS).
+
+    Returns:
+    {
+        'terms': array of terms,
+        'years': int array of years,
+        'issue_years': int array of years in which securities are reissued,
+        'fixed': interest on the securities in df per year,
+        'exposure': years x terms matrix (divide rates by 100 before use),
+        'path_exposure': years x issue_years x terms array, which sums to
+            exposure over issue years,
+        'outstanding_dates': the end of every year from the year before
+            years through the last of years, and max_record_date,
+        'outstanding': principal outstanding at outstanding_dates, as
+            returned by calculate_outstanding_debt,
+        'interpolation': interpolation
+    }
+    """
+    terms = np.asarray(terms)
+    issue_years = np.arange(max_record_date.year, reissue_end_date.year + 1)
+
+    # Securities already in the data pay their own coupon.
+    fixed_totals, fixed_years = calculate_interest_totals(df)
+
+    # Reissue at a rate of 100 percent so accrual yields amount x fraction of year.
+    reissue_df = df[df['Maturity Date'] >= max_record_date].reset_index(drop=True)
+    row_index, issue_dates, maturity_dates = compute_reissue_schedule(reissue_df, reissue_end_date)
+    issue_year_index = issue_dates.astype('datetime64[Y]').astype(np.int64) + 1970 - issue_years[0]
+
+    # Each rollover goes in every bucket its rate is weighted on, with its share of the amount.
+    distinct_days, day_index = np.unique(reissue_df['term_days'].to_numpy(), return_inverse=True)
+    weights = get_term_weights(distinct_days / 365, list(terms), interpolation)
+    weight_term, weight_bucket = np.nonzero(weights)
+    num_weights = np.bincount(weight_term, minlength=len(distinct_days))
+    rollover_term = day_index[row_index]
+    repeats = num_weights[rollover_term]
+    rollover = np.repeat(np.arange(len(row_index)), repeats)
+    weight_index = (np.cumsum(num_weights) - num_weights)[rollover_term[rollover]] + (
+        np.arange(len(rollover)) - np.repeat(np.cumsum(repeats) - repeats, repeats))
+    bucket = weight_bucket[weight_index]
+    share = weights[weight_term[weight_index], bucket]
+
+    # Sum over securities straight into (issue year, term bucket) groups.
+    group_sums, reissue_years = calculate_interest_totals(pd.DataFrame({
+        'Interest Rate': 100.0,
+        'Issue Date': issue_dates[rollover],
+        'Maturity Date': maturity_dates[rollover],
+        'Issued Amount (in Millions)': reissue_df['Issued Amount (in Millions)'].to_numpy()[row_index[rollover]] * share
+    }), issue_year_index[rollover] * len(terms) + bucket, len(issue_years) * len(terms))
+
+    # Put everything on a shared year axis.
+    years = np.union1d(fixed_years, reissue_years)
+    fixed = np.zeros(len(years))
+    fixed[np.searchsorted(years, fixed_years)] = fixed_totals[0]
+    path_exposure = np.zeros((len(years), len(issue_years), len(terms)))
+    path_exposure[np.searchsorted(years, reissue_years)] = group_sums.T.reshape(
+        len(reissue_years), len(issue_years), len(terms))
+
+    outstanding_dates = np.union1d(
+        (np.arange(years[0] - 1, years[-1] + 1) - 1969).astype('datetime64[Y]').astype('datetime64[D]') - 1,
+        [np.datetime64(max_record_date.date())])
+
+    return {
+        'terms': terms,
+        'years': years,
+        'issue_years': issue_years,
+        'fixed': fixed,
+        'exposure': path_exposure.sum(axis=1),
+        'path_exposure': path_exposure,
+        'outstanding_dates': outstanding_dates,
+        'outstanding': calculate_outstanding_debt(df, max_record_date, reissue_end_date, terms, outstanding_dates),
+        'interpolation': np.array(interpolation)
+    }
+
+def evaluate_rate_exposure(rate_exposure: dict, interest_rates: Union[dict, pd.DataFrame]) -> pd.Series:
+    """
+    Per-year interest payments for an interest rate curve or rate path.
+
+    Params:
+    rate_exposure: As returned by build_rate_exposure.
+    interest_rates: Dictionary in the form {term_years: interest_rate}, or a
+        rate path (see utils.load_rate_path). Must have the same terms as
+        the exposure.
+
+    Returns:
+    Series of interest payments indexed by year (as a string).
+    """
+    terms = list(rate_exposure['terms'])
+    if sorted(interest_rates.keys()) != sorted(terms):
+        raise ValueError(f"Interest rate terms {sorted(interest_rates.keys())} do not match exposure terms {sorted(terms)}.")
+    if isinstance(interest_rates, pd.DataFrame):
+        rate_paths = get_rates_by_year(interest_rates[terms], rate_exposure['issue_years'])[None]
+        interest = evaluate_rate_paths(rate_exposure, rate_paths)[0]
+    else:
+        rates = np.array([interest_rates[term] for term in terms], dtype=np.float64) / 100
+        interest = rate_exposure['fixed'] + rate_exposure['exposure'] @ rates
+    return pd.Series(interest, index=rate_exposure['years'].astype(str))
+
+def evaluate_rate_paths(rate_exposure: dict, rate_paths: np.ndarray) -> np.ndarray:
+    """
+    Per-year interest payments for many rate paths at once.
+
+    Params:
+    rate_exposure: As returned by build_rate_exposure.
+    rate_paths: Array of shape (paths, issue_years, terms), in percent, with
+        issue years and terms in the order of the exposure.
+
+    Returns:
+    Array of shape (paths, years).
+    """
+    num_paths = len(rate_paths)
+    path_exposure = rate_exposure['path_exposure'].reshape(len(rate_exposure['years']), -1)
+    return rate_exposure['fixed'] + (rate_paths.reshape(num_paths, -1) / 100) @ path_exposure.T
+
+################################################################################
+#
+################################################################################
+
+def load_rate_exposure(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        terms: list,
+        reissue_end_date: pd.Timestamp,
+        cache_dir: str = None,
+        interpolation: str = 'nearest') -> dict:
+    """
+    build_rate_exposure, cached in cache_dir as .npz keyed by the contents
+    of df, the max record date, the terms, the end date, the interpolation
+    and EXPOSURE_VERSION.
+    """
+    if cache_dir is None:
+        return build_rate_exposure(df, max_record_date, terms, reissue_end_date, interpolation)
+
+    sha = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    key = {
+        'max_record_date': pd.Timestamp(max_record_date).isoformat(),
+        'terms': [float(term) for term in terms],
+        'reissue_end_date': pd.Timestamp(reissue_end_date).isoformat(),
+        'exposure_version': EXPOSURE_VERSION
+    }
+    if interpolation != 'nearest':
+        key['interpolation'] = interpolation
+    sha.update(json.dumps(key, sort_keys=True).encode())
+    cache_path = os.path.join(cache_dir, f"exposure_{sha.hexdigest()[:16]}.npz")
+
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as npz:
+            print(f"Loaded rate exposure from cache: {cache_path}")
+            return {key: npz[key] for key in npz.files}
+
+    rate_exposure = build_rate_exposure(df, max_record_date, terms, reissue_end_date, interpolation)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write then rename so an interrupted run never leaves a partial file.
+    tmp_path = f"{cache_path}.tmp.npz"
+    np.savez(tmp_path, **rate_exposure)
+    os.replace(tmp_path, cache_path)
+    print(f"Saved rate exposure to cache: {cache_path}")
+    return rate_exposure
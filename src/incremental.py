@@ -0,0 +1,168 @@
+"""
+Incremental updates for append-only MSPD data.
+
+A monthly data drop only adds records with a newer 'Record Date'. Rather
+than reprocess 20+ years of records, the processed securities and their
+per-year interest are kept in a state directory and patched:
+
+* Records newer than the stored max record date are read and preprocessed.
+  (CUSIP, issue date) pairs already stored keep their stored record.
+* New securities are accrued, and reissued if they mature on or after the
+  new max record date.
+* Stored securities maturing between the old and new max record dates are
+  no longer reissued (their reissuance is now in the data), so the
+  interest of their reissued chains is subtracted.
+
+Securities maturing after the new max record date are reissued exactly as
+before, so their contribution is left as is.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Dict, Union
+from data import compact_securities, read_securities, load_securities, write_feather, read_feather
+from simulation import reissue_securities, calculate_interest_totals
+
+# Bump whenever the stored state changes shape, so old state is rebuilt.
+STATE_VERSION = 2
+
+def summarize_interest(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-year interest of the securities in df.
+
+    Returns:
+    DataFrame indexed by year (int) with the columns interest_payment and
+    live_securities, the number of securities paying interest that year.
+    The counts let years drop out exactly when their last security is
+    subtracted.
+    """
+    interest_totals, years = calculate_interest_totals(df)
+    year_issued = df['Issue Date'].dt.year.to_numpy()
+    year_matured = df['Maturity Date'].dt.year.to_numpy()
+    first_year = years[0] if len(years) else 0
+    live_securities = np.zeros(len(years) + 1, dtype=np.int64)
+    np.add.at(live_securities, year_issued - first_year, 1)
+    np.add.at(live_securities, year_matured - first_year + 1, -1)
+    return pd.DataFrame({
+        'interest_payment': interest_totals[0],
+        'live_securities': np.cumsum(live_securities)[:-1]
+    }, index=pd.Index(years, name='year'))
+
+def simulate_interest(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        reissue_end_date: pd.Timestamp,
+        interpolation: str = 'nearest') -> pd.DataFrame:
+    """summarize_interest of the securities in df plus those reissued from them."""
+    reissue_df = df[df['Maturity Date'] >= max_record_date].reset_index(drop=True)
+    reissue_result = reissue_securities(reissue_df, interest_rates, reissue_end_date, interpolation)
+    return summarize_interest(pd.concat([df, reissue_result], axis=0, ignore_index=True))
+
+################################################################################
+#
+################################################################################
+
+def get_state_key(
+        security_types: list,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        reissue_end_date: pd.Timestamp,
+        interpolation: str = 'nearest') -> str:
+    """Stored state is only valid for the parameters it was simulated with."""
+    if isinstance(interest_rates, pd.DataFrame):
+        rates = interest_rates.to_json()
+    else:
+        rates = json.dumps({str(k): v for k, v in interest_rates.items()}, sort_keys=True)
+    key = {
+        'security_types': list(security_types),
+        'interest_rates': rates,
+        'reissue_end_date': pd.Timestamp(reissue_end_date).isoformat(),
+        'state_version': STATE_VERSION
+    }
+    if interpolation != 'nearest':
+        key['interpolation'] = interpolation
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def update_incremental(
+        raw_data_path: str,
+        security_types: list,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        reissue_end_date: pd.Timestamp,
+        state_dir: str,
+        interpolation: str = 'nearest') -> tuple:
+    """
+    Brings the stored securities and per-year interest up to date with the
+    raw data, rebuilding from scratch if there is no state for these
+    parameters yet.
+
+    Params:
+    raw_data_path: Path to the MSPD .csv.
+    security_types: Values of 'Security Class 1 Description' to keep.
+    interest_rates: As passed to reissue_securities.
+    reissue_end_date: No security is reissued after this date.
+    state_dir: Directory holding the stored state.
+    interpolation: As passed to reissue_securities.
+
+    Returns:
+    (df, max_record_date, yearly) where df and max_record_date are as
+    returned by load_securities and yearly is as returned by
+    summarize_interest, for existing and reissued securities.
+    """
+    state_key = get_state_key(security_types, interest_rates, reissue_end_date, interpolation)
+    securities_path = os.path.join(state_dir, 'securities.feather')
+    yearly_path = os.path.join(state_dir, 'yearly_interest.feather')
+
+    metadata = None
+    if os.path.exists(securities_path) and os.path.exists(yearly_path):
+        df, metadata = read_feather(securities_path)
+        if metadata.get('state_key') != state_key:
+            print("Incremental state was built with different parameters; rebuilding.")
+            metadata = None
+
+    if metadata is None:
+        print("Building incremental state from scratch...")
+        df, max_record_date = load_securities(raw_data_path, security_types)
+        yearly = simulate_interest(df, max_record_date, interest_rates, reissue_end_date, interpolation)
+    else:
+        old_max_record_date = pd.Timestamp(metadata['max_record_date'])
+        yearly, _ = read_feather(yearly_path)
+        yearly = yearly.set_index('year')
+        print(f"Loaded incremental state with max record date {old_max_record_date}")
+
+        new_df, max_record_date = read_securities(
+            raw_data_path, security_types, after_record_date=old_max_record_date, validate_security_types=False)
+        print(f"Securities with records newer than {old_max_record_date}: {len(new_df)}")
+        if len(new_df) == 0:
+            return df, old_max_record_date, yearly
+
+        # Securities that were already stored keep their stored record.
+        key = ['Security Class 2 Description', 'Issue Date']
+        is_stored = pd.MultiIndex.from_frame(new_df[key]).isin(pd.MultiIndex.from_frame(df[key]))
+        new_df = new_df[~is_stored]
+        print(f"New securities: {len(new_df)}")
+
+        # Stored securities whose reissuance is now captured by the data.
+        no_longer_reissued = df[
+            (df['Maturity Date'] >= old_max_record_date) & (df['Maturity Date'] < max_record_date)
+        ].reset_index(drop=True)
+        print(f"Securities no longer reissued: {len(no_longer_reissued)}")
+        removed = summarize_interest(
+            reissue_securities(no_longer_reissued, interest_rates, reissue_end_date, interpolation))
+        added = simulate_interest(new_df, max_record_date, interest_rates, reissue_end_date, interpolation)
+
+        yearly = yearly.add(added, fill_value=0).sub(removed, fill_value=0)
+        yearly['live_securities'] = yearly['live_securities'].astype(np.int64)
+        yearly = yearly[yearly['live_securities'] > 0]
+        # Categories differ between the two, so recompact the combined frame.
+        df = compact_securities(pd.concat([df, new_df], axis=0, ignore_index=True))
+
+    write_feather(df, securities_path, {
+        'state_key': state_key,
+        'max_record_date': max_record_date.isoformat()
+    })
+    write_feather(yearly.reset_index(), yearly_path, {'state_key': state_key})
+    print(f"Saved incremental state to {state_dir}")
+
+    return df, max_record_date, yearly
@@ -1,12 +1,21 @@
 import os
 import sys
 import json
+import numpy as np
 import pandas as pd
 import pyarrow
 import argparse
-from typing import Dict
-from utils import load_config
-from simulation import calculate_interest_payments, reissue_security, issue_new_debt, compute_future_gdps
+from typing import Dict, Union
+from utils import load_config, load_rate_path, parse_terms
+from data import load_securities
+from exposure import load_rate_exposure, evaluate_rate_exposure
+from incremental import update_incremental
+from shards import simulate_sharded
+from accrual import calculate_exact_interest
+from curves import INTERPOLATIONS
+from periods import PERIODS, calculate_interest_by_period, get_label_years, get_label_dates
+from profiling import stage, start_profiling, stop_profiling, get_report_path
+from simulation import calculate_interest_payments, calculate_interest_matrix, calculate_interest_totals, get_term_buckets, add_up_buckets, reissue_security, reissue_securities, issue_new_debt, issue_new_debt_cohorts, compute_future_gdps, compute_new_debt_amounts, calculate_outstanding_totals, calculate_outstanding_debt, calculate_new_debt_outstanding
 
 def main(
         raw_data_path: str,
@@ -16,207 +25,615 @@ def main(
         new_debt: bool, 
         security_types: list,
         fiscal_calendar: bool, 
-        interest_rates: Dict[int, float],
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
         gdp_millions: int,
         gdp_growth_rate: float,
         new_debt_pct_gdp: float,
-        new_debt_interest_rate: float,
-        multiplier: float
+        new_debt_interest_rate: Union[float, pd.Series],
+        multiplier: float,
+        new_debt_maturity_mix: dict = None,
+        legacy_new_debt: bool = False,
+        initial_debt_millions: float = None,
+        cache_dir: str = None,
+        legacy_reissue: bool = False,
+        legacy_accrual: bool = False,
+        use_rate_exposure: bool = False,
+        incremental_dir: str = None,
+        profile: bool = False,
+        trace_memory: bool = False,
+        by_security: bool = False,
+        period: str = None,
+        exact_accrual: bool = False,
+        cash_basis: bool = False,
+        rate_interpolation: str = 'nearest',
+        num_shards: int = None
 ) -> None:
-    # Read the .csv containing securities data.
-    usecols = [
-        'Record Date',
-        #'Security Type Description', # Marketable or Non-Marketable
-        'Security Class 1 Description', # Type of security
-        'Security Class 2 Description', # CUSIP ID number (unique for each security)
-        'Interest Rate',
-        'Yield',
-        'Issue Date',
-        'Maturity Date',
-        'Issued Amount (in Millions)', # Read as non-numeric due to *
-        #'Outstanding Amount (in Millions)', # Read as non-numeric due to *
-    ]
-    df = pd.read_csv(raw_data_path, usecols=usecols)
-    print(df.dtypes)
-    print(f"Shape: {df.shape}")
+    profiler = start_profiling(trace_memory) if profile or trace_memory else None
+    try:
+        ################################################################################
+        # Load and preprocess securities.
+        ################################################################################
 
-    ################################################################################
-    # Preprocessing.
-    ################################################################################
+        if fiscal_calendar:
+            # Shorthand for summing interest by fiscal year.
+            period = period or 'fiscal_year'
 
-    # TODO: add fiscal calendar capability
+        securities_interest = None
+        with stage('load') as info:
+            if incremental_dir is not None:
+                # Patch stored per-year interest with only the records added since the last run.
+                df, max_record_date, yearly = update_incremental(
+                    raw_data_path, security_types, interest_rates, reissue_end_date, incremental_dir, rate_interpolation)
+                securities_interest = yearly['interest_payment'].rename(index=str)
+            else:
+                df, max_record_date = load_securities(raw_data_path, security_types, cache_dir)
+            info['rows'] = len(df)
 
-    """
-    Security types: As of writing, only interested in non-TIPS, non-FSN marketable securities.
+        # Load historical GDPs
+        with stage('load_gdps'):
+            historical_gdps = load_historical_gdps(historical_gdps_path)
 
-    Yes: 'Notes', 'Bonds', 'Bills Maturity Value'
-    No: 'Inflation-Protected Securities', 'Floating Rate Notes'
-    """
-    # Ensure valid security types were passed
-    class_1_descriptions_to_keep = security_types
-    valid_class_1_descriptions = df['Security Class 1 Description'].unique()
-    invalid_security_passed = any(x not in valid_class_1_descriptions for x in class_1_descriptions_to_keep)
-    if invalid_security_passed:
-        raise ValueError("An invalid security type was passed. Ensure all security types are included in raw data.")
-    # Filter data
-    df = df[df['Security Class 1 Description'].isin(class_1_descriptions_to_keep)]
-    print(f"Filtered to specified security types: {class_1_descriptions_to_keep}")
-    print(f"Shape: {df.shape}")
+        rate_exposure = None
+        if use_rate_exposure:
+            with stage('rate_exposure'):
+                rate_exposure = load_rate_exposure(
+                    df, max_record_date, list(interest_rates.keys()), reissue_end_date, cache_dir, rate_interpolation)
 
+        pivot_table = run_scenario(
+            df=df,
+            max_record_date=max_record_date,
+            historical_gdps=historical_gdps,
+            reissue_end_date=reissue_end_date,
+            new_debt=new_debt,
+            interest_rates=interest_rates,
+            gdp_millions=gdp_millions,
+            gdp_growth_rate=gdp_growth_rate,
+            new_debt_pct_gdp=new_debt_pct_gdp,
+            new_debt_interest_rate=new_debt_interest_rate,
+            multiplier=multiplier,
+            new_debt_maturity_mix=new_debt_maturity_mix,
+            legacy_new_debt=legacy_new_debt,
+            initial_debt_millions=initial_debt_millions,
+            legacy_reissue=legacy_reissue,
+            legacy_accrual=legacy_accrual,
+            rate_exposure=rate_exposure,
+            securities_interest=securities_interest,
+            by_security=by_security,
+            period=period,
+            exact_accrual=exact_accrual,
+            cash_basis=cash_basis,
+            rate_interpolation=rate_interpolation,
+            num_shards=num_shards
+        )
+
+        # Save output
+        with stage('write') as info:
+            pivot_table.to_csv(output_path)
+            info['rows'] = len(pivot_table)
+
+        if profiler is not None:
+            profiler.write_report(
+                get_report_path(output_path),
+                raw_data_path=raw_data_path,
+                output_path=output_path,
+                max_record_date=max_record_date,
+                reissue_end_date=reissue_end_date,
+                new_debt=new_debt,
+                legacy_new_debt=legacy_new_debt,
+                security_types=security_types,
+                num_securities=len(df),
+                legacy_reissue=legacy_reissue,
+                legacy_accrual=legacy_accrual,
+                by_security=by_security,
+                period=period,
+                exact_accrual=exact_accrual,
+                cash_basis=cash_basis,
+                rate_interpolation=rate_interpolation,
+                num_shards=num_shards,
+                use_rate_exposure=use_rate_exposure,
+                incremental=incremental_dir is not None
+            )
+    finally:
+        if profiler is not None:
+            stop_profiling()
+
+################################################################################
+#
+################################################################################
+
+def load_historical_gdps(historical_gdps_path: str) -> pd.DataFrame:
+    """Historical end of year GDPs indexed by year (as a string)."""
+    historical_gdps = pd.read_csv(historical_gdps_path, index_col='year')
+    historical_gdps.index = historical_gdps.index.astype(str)
+    print(f"Historical gpds:\n{historical_gdps.head()}")
+    return historical_gdps
+
+################################################################################
+#
+################################################################################
+
+def reissue_maturing_securities(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        reissue_end_date: pd.Timestamp,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        legacy_reissue: bool = False,
+        rate_interpolation: str = 'nearest'
+) -> pd.DataFrame:
     """
-    Duplicates: Raw data is append-only, so there can be multiple lines for
-    the same security with different record dates. 
-    
-    Note this is different than adding onto a security, which will have a 
-    different issue date, so we drop on both ID and issue date.
-    """
-    subset = ['Security Class 2 Description', 'Issue Date']
-    df.drop_duplicates(subset=subset, keep='first', inplace=True)
-    print("Duplicates dropped.")
-    print(f"Shape: {df.shape}")
-
-    # Some records represent totals; we only want individual securities.
-    # These all contain the string 'Total' in their descriptions.
-    df = df[~df['Security Class 2 Description'].str.contains('Total')]
-    print("Totals records removed.")
-    print(f"Shape: {df.shape}")
-
-    # Change columns to numeric.
-    df['Issued Amount (in Millions)'] = pd.to_numeric(df['Issued Amount (in Millions)'])
-
-    # Change columns to datetime after dropping nulls.
-    df.dropna(subset=['Issue Date', 'Maturity Date'], inplace=True) # (1)
-    df['Issue Date'] = pd.to_datetime(df['Issue Date'])
-    df['Maturity Date'] = pd.to_datetime(df['Maturity Date'])
-    df['Record Date'] = pd.to_datetime(df['Record Date'])
-
-    # Max record date; don't need to reissue anything that matures before this.
-    max_record_date = df['Record Date'].max()
-    print(f"Max record date: {max_record_date}")
-    df.drop('Record Date', axis=1, inplace=True)
-
-    # Safety: ensures the reissue function doesn't run forever due to error in raw data.
-    df['term_days'] = (df['Maturity Date'] - df['Issue Date']).dt.days
-    df = df[df['term_days'] > 0]
-    print("Negative term records removed.")
-    print(f"Shape: {df.shape}")
-    
-    ################################################################################
-    # Simulate reissuance of debts.
-    ################################################################################
+    Reissues securities maturing on or after max_record_date.
 
+    Returns:
+    The securities in df followed by the reissued securities.
+    """
     # Only reissue debt that expires after max record date. 
     # Any debt issued before it is already captured in the data.
     reissue_df = df[df['Maturity Date'] >= max_record_date].reset_index(drop=True)
     print(f"Number of securities in original data to be reissued: {len(reissue_df)}")
     print("Simulating reissuance...")
-    ## Apply function
-    reissue_list = reissue_df.apply(
-        func=reissue_security,
-        axis=1,
-        args=(interest_rates, reissue_end_date,)).tolist()
-    print("Complete. Concatenating results...")
-    reissue_result = pd.concat(reissue_list, axis=0, ignore_index=True)
+    with stage('reissue') as info:
+        if legacy_reissue:
+            # Original row-by-row path; kept for parity checks.
+            if isinstance(interest_rates, pd.DataFrame):
+                raise ValueError("Rate paths are not supported by the legacy reissuance.")
+            if rate_interpolation != 'nearest':
+                raise ValueError("The legacy reissuance only supports nearest rate interpolation.")
+            reissue_list = reissue_df.apply(
+                func=reissue_security,
+                axis=1,
+                args=(interest_rates, reissue_end_date,)).tolist()
+            print("Complete. Concatenating results...")
+            # Securities maturing after reissue_end_date give empty, untyped frames,
+            # which would turn every column into object.
+            reissue_list = [result for result in reissue_list if len(result)] or reissue_list[:1]
+            reissue_result = pd.concat(reissue_list, axis=0, ignore_index=True)
+        else:
+            reissue_result = reissue_securities(reissue_df, interest_rates, reissue_end_date, rate_interpolation)
+        info['rows'] = len(reissue_result)
     print("Complete.")
     print(f"Number of reissued securities in data: {len(reissue_result)}")
 
     # Concatenate the new dataframes with the original one.
-    df = pd.concat([df, reissue_result], axis=0, ignore_index=True)
+    with stage('combine') as info:
+        df = pd.concat([df, reissue_result], axis=0, ignore_index=True)
+        info['rows'] = len(df)
     print(f"Number of rows after combining: {len(df)}")
 
+    return df
+
+def simulate_securities(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        reissue_end_date: pd.Timestamp,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        legacy_reissue: bool = False,
+        legacy_accrual: bool = False,
+        rate_interpolation: str = 'nearest'
+) -> pd.DataFrame:
+    """
+    Reissues maturing securities and calculates yearly interest payments.
+
+    Returns:
+    DataFrame with one row per id and security type and one column per year.
+    """
+    ################################################################################
+    # Simulate reissuance of debts.
+    ################################################################################
+
+    df = reissue_maturing_securities(
+        df, max_record_date, reissue_end_date, interest_rates, legacy_reissue, rate_interpolation)
+
     ################################################################################
     # Calculate yearly interest payments.
     ################################################################################
 
-    # Add year, month, day columns for interest payment calculation.
-    df['year_issued'] = df['Issue Date'].dt.year
-    df['month_issued'] = df['Issue Date'].dt.month
-    df['day_issued'] = df['Issue Date'].dt.day
-    df['year_matured'] = df['Maturity Date'].dt.year
-    df['month_matured'] = df['Maturity Date'].dt.month
-    df['day_matured'] = df['Maturity Date'].dt.day
-
-    # Calculate interest payments on each security then recombine into time series.
-    processed_rows = df.apply(calculate_interest_payments, axis=1)
-    df_yearly = pd.DataFrame(processed_rows.tolist())
-
-    # Reorder year columns.
-    year_columns = [col for col in df_yearly.columns if col.isdigit() and 1900 <= int(col) <= 2100]
-    non_year_columns = [col for col in df_yearly.columns if col not in year_columns]
-    sorted_year_columns = sorted(year_columns, key=lambda x: int(x))
-    df_yearly_sorted = df_yearly[non_year_columns + sorted_year_columns]
-    
+    with stage('accrual') as info:
+        if legacy_accrual:
+            # Original dict-per-row path; kept for parity checks.
+            # Add year, month, day columns for interest payment calculation.
+            df['year_issued'] = df['Issue Date'].dt.year
+            df['month_issued'] = df['Issue Date'].dt.month
+            df['day_issued'] = df['Issue Date'].dt.day
+            df['year_matured'] = df['Maturity Date'].dt.year
+            df['month_matured'] = df['Maturity Date'].dt.month
+            df['day_matured'] = df['Maturity Date'].dt.day
+
+            # Calculate interest payments on each security then recombine into time series.
+            processed_rows = df.apply(calculate_interest_payments, axis=1)
+            df_yearly = pd.DataFrame(processed_rows.tolist())
+
+            # Reorder year columns.
+            year_columns = [col for col in df_yearly.columns if col.isdigit() and 1900 <= int(col) <= 2100]
+            non_year_columns = [col for col in df_yearly.columns if col not in year_columns]
+            sorted_year_columns = sorted(year_columns, key=lambda x: int(x))
+            df_yearly_sorted = df_yearly[non_year_columns + sorted_year_columns]
+        else:
+            # Securities x years matrix of interest payments; years are already sorted.
+            interest_matrix, years = calculate_interest_matrix(df)
+            df_yearly_sorted = pd.DataFrame(interest_matrix, columns=years.astype(str))
+            df_yearly_sorted.insert(0, 'id', df['Security Class 2 Description'].array)
+            df_yearly_sorted.insert(1, 'security_type', df['Security Class 1 Description'].array)
+            df_yearly_sorted.insert(2, 'issue_date', df['Issue Date'].to_numpy())
+            df_yearly_sorted.insert(3, 'maturity_date', df['Maturity Date'].to_numpy())
+        info['rows'] = len(df_yearly_sorted)
+
     # Sum yearly interest payments by id and security type.
-    df_yearly_sorted.drop(['issue_date', 'maturity_date'], axis=1, inplace=True)
-    id_grouped_df = df_yearly_sorted.groupby(['id', 'security_type'], as_index=False).sum()
+    with stage('groupby') as info:
+        df_yearly_sorted.drop(['issue_date', 'maturity_date'], axis=1, inplace=True)
+        id_grouped_df = df_yearly_sorted.groupby(['id', 'security_type'], as_index=False, observed=True).sum()
+        info['rows'] = len(id_grouped_df)
+
+    return id_grouped_df
+
+def simulate_security_types(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        reissue_end_date: pd.Timestamp,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        period: str = None,
+        exact_accrual: bool = False,
+        cash_basis: bool = False,
+        rate_interpolation: str = 'nearest'
+) -> pd.DataFrame:
+    """
+    Reissues maturing securities and sums yearly interest payments by
+    security type, without a per-security breakdown.
+
+    Params:
+    period: Sum interest into these periods (see periods.PERIODS) instead of
+        calendar years.
+    exact_accrual: Accrue coupons and bill discounts on actual days (see
+        accrual.calculate_exact_interest).
+    cash_basis: With exact_accrual, count interest when paid.
+    rate_interpolation: How rollovers' rates are found between the terms of
+        interest_rates (see curves.INTERPOLATIONS).
+
+    Returns:
+    DataFrame indexed by security type with one column per year (as a
+    string), or per period label if period is given. Summed over security
+    types, it equals simulate_securities summed over ids. By calendar year,
+    it is bit-identical to shards.simulate_sharded.
+    """
+    df = reissue_maturing_securities(
+        df, max_record_date, reissue_end_date, interest_rates, rate_interpolation=rate_interpolation)
+    with stage('accrual') as info:
+        # Accumulate straight into security type x year totals.
+        groups, security_types = pd.factorize(df['Security Class 1 Description'], sort=True)
+        num_types = len(security_types)
+        if exact_accrual:
+            totals, years = calculate_exact_interest(df, period or 'year', groups, cash_basis=cash_basis)
+        elif period is None:
+            # Summed by security type and term bucket, then over buckets in order, as the shards are.
+            terms = list(interest_rates.keys())
+            buckets = get_term_buckets(df['Issue Date'].to_numpy(), df['Maturity Date'].to_numpy(), terms)
+            bucket_totals, years = calculate_interest_totals(
+                df, groups * len(terms) + buckets, num_types * len(terms))
+            totals = add_up_buckets(bucket_totals.reshape(num_types, len(terms), len(years)))
+        else:
+            totals, years = calculate_interest_by_period(df, period, groups)
+        info['rows'] = len(df)
+    return pd.DataFrame(
+        totals,
+        index=pd.Index(np.asarray(security_types), name='security_type'),
+        columns=years.astype(str))
+
+################################################################################
+#
+################################################################################
+
+def run_scenario(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        historical_gdps: pd.DataFrame,
+        reissue_end_date: pd.Timestamp,
+        new_debt: bool,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        gdp_millions: int,
+        gdp_growth_rate: float,
+        new_debt_pct_gdp: float,
+        new_debt_interest_rate: Union[float, pd.Series],
+        multiplier: float,
+        new_debt_maturity_mix: dict = None,
+        legacy_new_debt: bool = False,
+        initial_debt_millions: float = None,
+        legacy_reissue: bool = False,
+        legacy_accrual: bool = False,
+        write_intermediates: bool = True,
+        rate_exposure: dict = None,
+        securities_interest: pd.Series = None,
+        by_security: bool = False,
+        period: str = None,
+        exact_accrual: bool = False,
+        cash_basis: bool = False,
+        new_debt_exposure: dict = None,
+        rate_interpolation: str = 'nearest',
+        num_shards: int = None
+) -> pd.DataFrame:
+    """
+    Runs one scenario against preprocessed securities.
+
+    Params:
+    df: Preprocessed securities, as returned by load_securities. Not modified.
+    max_record_date: Max record date in the raw data.
+    historical_gdps: As returned by load_historical_gdps.
+    new_debt_maturity_mix: Share of new debt issued at each term, in the form
+        {term_years: share}. Each year's new debt is issued across these
+        terms and rolled over at interest_rates (see issue_new_debt_cohorts).
+    legacy_new_debt: Use the original model of new debt as a single pool at
+        new_debt_interest_rate (see issue_new_debt). new_debt_interest_rate
+        is only used by this model.
+    initial_debt_millions: Total debt at max_record_date. If given, principal
+        outstanding is scaled by its ratio to the principal of the securities
+        in df outstanding at max_record_date; otherwise by multiplier, like
+        interest.
+    write_intermediates: Write gdps.csv, pivot_table_initial.csv,
+        outstanding.csv and, with by_security, id_grouped.csv to the working
+        directory for debugging.
+    rate_exposure: As returned by load_rate_exposure. If given, interest on
+        existing and reissued securities comes from the exposure instead of
+        simulating each security.
+    securities_interest: Per-year interest on existing and reissued
+        securities indexed by year (as a string), e.g. from
+        update_incremental. If given, securities are not simulated.
+    by_security: Also break interest down by security (see
+        simulate_securities). Slower and uses far more memory than summing
+        straight into security types.
+    period: Sum interest into these periods (see periods.PERIODS) instead of
+        calendar years. Each period is compared with the GDP of the calendar
+        year it ends in. Not supported with rate_exposure,
+        securities_interest, by_security or the legacy options.
+    exact_accrual: Accrue coupons and bill discounts on actual days (see
+        accrual.calculate_exact_interest). New debt accrues as coupon
+        securities. Not supported with the same options as period.
+    cash_basis: With exact_accrual, count interest when paid.
+    new_debt_exposure: As returned by build_new_debt_exposure for the same
+        new_debt_maturity_mix, dates, period and exact_accrual, to reuse
+        across scenarios. Built if None.
+    rate_interpolation: How reissued securities and new debt get rates
+        between the terms of interest_rates (see curves.INTERPOLATIONS).
+        rate_exposure must have been built with the same interpolation.
+    num_shards: Reissue and accrue securities in this many shards across
+        worker processes (see shards.simulate_sharded). The result is
+        bit-identical to a serial run. Only supported for interest by
+        calendar year, without the options that skip or replace the
+        simulation.
+    Other params are the scenario parameters passed to main.
+
+    Returns:
+    DataFrame indexed by year with interest_payment, debt_millions (principal
+    outstanding at the end of the year), effective_rate (yearly interest as a
+    percentage of the average of the principal outstanding at the start and
+    end of the year, before scaling), gdp_millions_end_of_year, pct_gdp and
+    debt_pct_gdp columns. If period is given, it is indexed by period label
+    with the year each period ends in as an extra year column, and debt is
+    measured at the start and end of each period.
+    """
+    if cash_basis and not exact_accrual:
+        raise ValueError("cash_basis requires exact_accrual.")
+    if period is not None or exact_accrual:
+        unsupported = {
+            'rate_exposure': rate_exposure is not None,
+            'securities_interest': securities_interest is not None,
+            'by_security': by_security,
+            'legacy_reissue': legacy_reissue,
+            'legacy_accrual': legacy_accrual,
+            'legacy_new_debt': new_debt and legacy_new_debt
+        }
+        unsupported = [name for name, is_set in unsupported.items() if is_set]
+        if unsupported:
+            raise ValueError(f"Interest by period or exact accrual is not supported with {', '.join(unsupported)}.")
+    if num_shards is not None and num_shards > 1:
+        unsupported = {
+            'period': period is not None,
+            'exact_accrual': exact_accrual,
+            'rate_exposure': rate_exposure is not None,
+            'securities_interest': securities_interest is not None,
+            'by_security': by_security,
+            'legacy_reissue': legacy_reissue,
+            'legacy_accrual': legacy_accrual
+        }
+        unsupported = [name for name, is_set in unsupported.items() if is_set]
+        if unsupported:
+            raise ValueError(f"Sharding is not supported with {', '.join(unsupported)}.")
+    if rate_exposure is not None and str(rate_exposure.get('interpolation', 'nearest')) != rate_interpolation:
+        raise ValueError(
+            f"rate_exposure was built with {rate_exposure.get('interpolation', 'nearest')} interpolation, "
+            f"not {rate_interpolation}.")
+
+    with stage('simulate'):
+        if securities_interest is not None:
+            type_totals = pd.DataFrame([securities_interest], index=pd.Index(['All'], name='security_type'))
+        elif rate_exposure is not None:
+            # Evaluate the precomputed rate exposure instead of simulating each security.
+            yearly_interest = evaluate_rate_exposure(rate_exposure, interest_rates)
+            type_totals = pd.DataFrame([yearly_interest], index=pd.Index(['All'], name='security_type'))
+        elif by_security or legacy_reissue or legacy_accrual:
+            id_grouped_df = simulate_securities(
+                df=df,
+                max_record_date=max_record_date,
+                reissue_end_date=reissue_end_date,
+                interest_rates=interest_rates,
+                legacy_reissue=legacy_reissue,
+                legacy_accrual=legacy_accrual,
+                rate_interpolation=rate_interpolation
+            )
+            if write_intermediates:
+                with stage('write_intermediates'):
+                    id_grouped_df.to_csv('id_grouped.csv')
+            with stage('type_groupby') as info:
+                type_totals = id_grouped_df.drop('id', axis=1).groupby('security_type', observed=True).sum()
+                info['rows'] = len(type_totals)
+        elif num_shards is not None and num_shards > 1:
+            type_totals = simulate_sharded(
+                df=df,
+                max_record_date=max_record_date,
+                reissue_end_date=reissue_end_date,
+                interest_rates=interest_rates,
+                num_shards=num_shards,
+                interpolation=rate_interpolation
+            )
+        else:
+            type_totals = simulate_security_types(
+                df=df,
+                max_record_date=max_record_date,
+                reissue_end_date=reissue_end_date,
+                interest_rates=interest_rates,
+                period=period,
+                exact_accrual=exact_accrual,
+                cash_basis=cash_basis,
+                rate_interpolation=rate_interpolation
+            )
+    print(f"Interest payments by security type:\n{type_totals}")
+    interest_payments = type_totals.sum(axis=0)
 
     # Simulate new debt if argument was passed.
     if new_debt:
-        print(f"Issuing new debt with parameters:")
-        print(f"GDP in millions: {gdp_millions}")
-        print(f"GDP growth rate: {gdp_growth_rate}")
-        print(f"Yearly debt to issue as a percentage of GDP: {new_debt_pct_gdp}")
-        print(f"Interest rate for new debt: {new_debt_interest_rate}")
-        new_debt_payments = issue_new_debt(
+        with stage('new_debt'):
+            print(f"Issuing new debt with parameters:")
+            print(f"GDP in millions: {gdp_millions}")
+            print(f"GDP growth rate: {gdp_growth_rate}")
+            print(f"Yearly debt to issue as a percentage of GDP: {new_debt_pct_gdp}")
+            if legacy_new_debt:
+                print(f"Interest rate for new debt: {new_debt_interest_rate}")
+                new_debt_payments = pd.Series(issue_new_debt(
+                    gdp_millions=gdp_millions, 
+                    gdp_growth_rate=gdp_growth_rate, 
+                    new_debt_pct_gdp=new_debt_pct_gdp, 
+                    interest_rate=new_debt_interest_rate,
+                    start_date=max_record_date, 
+                    end_date=reissue_end_date
+                ))
+                # Add new debts, in the years securities pay interest.
+                new_debt_payments = new_debt_payments.reindex(interest_payments.index, fill_value=0)
+            else:
+                if new_debt_maturity_mix is None:
+                    raise ValueError("new_debt_maturity_mix is required unless legacy_new_debt is set.")
+                print(f"New debt maturity mix: {new_debt_maturity_mix}")
+                new_debt_interest, new_debt_years = issue_new_debt_cohorts(
+                    gdp_millions=gdp_millions,
+                    gdp_growth_rate=gdp_growth_rate,
+                    new_debt_pct_gdp=new_debt_pct_gdp,
+                    interest_rates=interest_rates,
+                    maturity_mix=new_debt_maturity_mix,
+                    start_date=max_record_date,
+                    end_date=reissue_end_date,
+                    new_debt_exposure=new_debt_exposure,
+                    period=period,
+                    exact_accrual=exact_accrual,
+                    interpolation=rate_interpolation
+                )
+                new_debt_payments = pd.Series(new_debt_interest.sum(axis=(1, 2)), index=new_debt_years.astype(str))
+            print(f"New debt payments: {new_debt_payments.to_dict()}")
+            interest_payments = interest_payments.add(new_debt_payments, fill_value=0)
+
+    with stage('outstanding') as info:
+        # Principal outstanding at the start and end of every period, by source and term bucket.
+        interest_payments = interest_payments.sort_index()
+        first_days, last_days = get_label_dates(period or 'year', interest_payments.index)
+        record_day = np.datetime64(max_record_date.date())
+        dates = np.unique(np.concatenate([first_days - 1, last_days, [record_day]]))
+        outstanding_dates = None if rate_exposure is None else rate_exposure['outstanding_dates']
+        terms = list(interest_rates.keys() if rate_exposure is None else rate_exposure['terms'])
+        outstanding = np.zeros((3, len(terms), len(dates)))
+        if outstanding_dates is not None and np.isin(dates, outstanding_dates).all():
+            outstanding[:2] = rate_exposure['outstanding'][:, :, np.searchsorted(outstanding_dates, dates)]
+        else:
+            outstanding[:2] = calculate_outstanding_debt(df, max_record_date, reissue_end_date, terms, dates)
+        new_debt_pool = np.zeros(len(dates))
+        if new_debt and legacy_new_debt:
+            # The pool never matures and has no term.
+            cohort_years = np.arange(max_record_date.year, reissue_end_date.year + 1)
+            issue_dates = (cohort_years - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+            issue_dates[0] = record_day + 1
+            new_debt_pool = calculate_outstanding_totals(
+                issue_dates,
+                np.full(len(cohort_years), dates[-1] + 1),
+                compute_new_debt_amounts(gdp_millions, gdp_growth_rate, new_debt_pct_gdp, len(cohort_years)),
+                dates)[0]
+        elif new_debt:
+            outstanding[2] = calculate_new_debt_outstanding(
+                gdp_millions=gdp_millions,
+                gdp_growth_rate=gdp_growth_rate,
+                new_debt_pct_gdp=new_debt_pct_gdp,
+                maturity_mix=new_debt_maturity_mix,
+                start_date=max_record_date,
+                end_date=reissue_end_date,
+                terms=terms,
+                dates=dates
+            )
+        total_outstanding = outstanding.sum(axis=(0, 1)) + new_debt_pool
+        opening = total_outstanding[np.searchsorted(dates, first_days - 1)]
+        closing = total_outstanding[np.searchsorted(dates, last_days)]
+
+        if initial_debt_millions is not None:
+            debt_multiplier = initial_debt_millions / outstanding[0, :, np.searchsorted(dates, record_day)].sum()
+        else:
+            debt_multiplier = multiplier
+        print(f"Debt multiplier: {debt_multiplier}")
+        if write_intermediates:
+            closing_index = np.searchsorted(dates, last_days)
+            by_term = pd.DataFrame(
+                outstanding[:, :, closing_index].transpose(2, 0, 1).reshape(-1, len(terms)) * debt_multiplier,
+                index=pd.MultiIndex.from_product(
+                    [interest_payments.index, ['existing', 'reissued', 'new_debt']],
+                    names=['year' if period is None else 'period', 'source']),
+                columns=[str(term) for term in terms])
+            by_term['total'] = by_term.sum(axis=1)
+            by_term.loc[(slice(None), 'new_debt'), 'total'] += new_debt_pool[closing_index] * debt_multiplier
+            by_term.round(2).to_csv('outstanding.csv')
+        info['rows'] = len(dates)
+
+    with stage('gdp'):
+        # Compute end of year GDPs by year
+        future_gdps = compute_future_gdps(
             gdp_millions=gdp_millions, 
             gdp_growth_rate=gdp_growth_rate, 
-            new_debt_pct_gdp=new_debt_pct_gdp, 
-            interest_rate=new_debt_interest_rate,
             start_date=max_record_date, 
             end_date=reissue_end_date
         )
-        print(f"New debt payments: {new_debt_payments}")
-        # Add new debts to id_grouped_df
-        new_row = {col: new_debt_payments.get(col, 0) for col in id_grouped_df.columns}
-        new_row['id'] = 'Simulated new debt payments'
-        new_row['security_type'] = 'All'
-        id_grouped_df.loc[len(id_grouped_df)] = new_row
-        print("Tail:")
-        print(id_grouped_df[['id', 'security_type', '2024', '2025', '2026']].tail())
-        id_grouped_df.to_csv('id_grouped.csv')
-
-    # Load historical GDPs
-    historical_gdps = pd.read_csv(historical_gdps_path, index_col='year')
-    historical_gdps.index = historical_gdps.index.astype(str)
-    print(f"Historical gpds:\n{historical_gdps.head()}")
-    # Compute end of year GDPs by year
-    future_gdps = compute_future_gdps(
-        gdp_millions=gdp_millions, 
-        gdp_growth_rate=gdp_growth_rate, 
-        start_date=max_record_date, 
-        end_date=reissue_end_date
-    )
-    future_gdps_df = pd.DataFrame.from_dict(
-        future_gdps, 
-        orient='index',
-        columns=['gdp_millions_end_of_year'])
-    future_gdps_df.index = future_gdps_df.index.astype(str)
-    gdps_df = pd.concat([historical_gdps, future_gdps_df], axis=0)
-    gdps_df['gdp_millions_end_of_year'] = gdps_df['gdp_millions_end_of_year'].astype(int)
-    gdps_df.to_csv('gdps.csv')
-
-    # Melt and pivot sum of interest payments on year.
-    # NOTE: if desired, you can group by both security type and year.
-    print("Tail:")
-    print(id_grouped_df[['id', 'security_type', '2024', '2025', '2026']].tail())
-    id_grouped_df.drop('id', axis=1, inplace=True)
-    df_melted = id_grouped_df.melt(id_vars=["security_type"], var_name="year", value_name="interest_payment")
-    pivot_table = pd.pivot_table(df_melted, values="interest_payment", index=["year"], aggfunc='sum')
-    # Apply multiplier
-    # NOTE: this accounts for Bills, Bonds, and Notes only making up
-    # about 84% of the public debt. Functionality for TIPS etc. not implemented
-    # yet.
-    pivot_table['interest_payment'] = pivot_table['interest_payment'] * multiplier
-    pivot_table['interest_payment'] = pivot_table['interest_payment'].round(2)
-    pivot_table.to_csv('pivot_table_initial.csv')
+        future_gdps_df = pd.DataFrame.from_dict(
+            future_gdps, 
+            orient='index',
+            columns=['gdp_millions_end_of_year'])
+        future_gdps_df.index = future_gdps_df.index.astype(str)
+        gdps_df = pd.concat([historical_gdps, future_gdps_df], axis=0)
+        gdps_df['gdp_millions_end_of_year'] = gdps_df['gdp_millions_end_of_year'].astype(int)
+        if write_intermediates:
+            gdps_df.to_csv('gdps.csv')
+
+    with stage('aggregate') as info:
+        # NOTE: type_totals has the payments by both security type and year, if desired.
+        pivot_table = interest_payments.rename_axis('year' if period is None else 'period').to_frame(
+            'interest_payment').sort_index()
+        # Apply multiplier
+        # NOTE: this accounts for Bills, Bonds, and Notes only making up
+        # about 84% of the public debt. Functionality for TIPS etc. not implemented
+        # yet.
+        pivot_table['interest_payment'] = pivot_table['interest_payment'] * multiplier
+        pivot_table['interest_payment'] = pivot_table['interest_payment'].round(2)
+        pivot_table['debt_millions'] = (closing * debt_multiplier).round(2)
+        # Yearly rate, before either multiplier, so it is the rate of the modelled securities.
+        years_per_period = PERIODS[period or 'year'][0] / 12
+        pivot_table['effective_rate'] = (
+            100 * interest_payments.to_numpy() / years_per_period / ((opening + closing) / 2)).round(4)
+        if write_intermediates:
+            pivot_table.to_csv('pivot_table_initial.csv')
+        info['rows'] = len(pivot_table)
+
     # Join w/ GDP numbers
-    pivot_table = pivot_table.join(gdps_df, how='inner')
-    pivot_table['pct_gdp'] = (pivot_table['interest_payment'] / pivot_table['gdp_millions_end_of_year']).round(5)
+    with stage('gdp_join') as info:
+        if period is None:
+            pivot_table = pivot_table.join(gdps_df, how='inner')
+        else:
+            pivot_table.insert(0, 'year', get_label_years(pivot_table.index).astype(str))
+            pivot_table = pivot_table.join(gdps_df, on='year', how='inner')
+        pivot_table['pct_gdp'] = (pivot_table['interest_payment'] / pivot_table['gdp_millions_end_of_year']).round(5)
+        pivot_table['debt_pct_gdp'] = (pivot_table['debt_millions'] / pivot_table['gdp_millions_end_of_year']).round(5)
+        info['rows'] = len(pivot_table)
     print(pivot_table.head())
     print(f"Pivot table dtypes:\n{pivot_table.dtypes}")
 
-    # Save output
-    pivot_table.to_csv(output_path)
+    return pivot_table
 
 if __name__ == "__main__":
     """
@@ -226,6 +643,8 @@ if __name__ == "__main__":
 
     Assumptions:
     * All debts get reissued immediately when they mature.
+    * New debt is issued every year across new_debt_maturity_mix and
+      reissued the same way.
 
     Simulation config parameters:
     * Interest rates when debt gets created or reissued.
@@ -240,9 +659,22 @@ if __name__ == "__main__":
     # Initialize argument parser and add arguments.
     parser = argparse.ArgumentParser(description='Process the arguments for debt management.')
     parser.add_argument('--new-debt', action='store_true', help='Flag to issue new debt (default: false)')
-    parser.add_argument('--fiscal-calendar', action='store_true', help='Flag to use fiscal calendar (default: false)')
+    parser.add_argument('--fiscal-calendar', action='store_true', help='Flag to use fiscal calendar (default: false); same as --period fiscal_year')
+    parser.add_argument('--period', choices=list(PERIODS), default=None,
+                        help='Sum interest by calendar year, fiscal year (Oct-Sep), quarter or month, counting actual days. '
+                             'By default interest is summed by calendar year with 365 day years.')
+    parser.add_argument('--exact-accrual', action='store_true',
+                        help='Accrue semiannual coupons and bill discounts on actual days instead of a yearly rate on face value.')
+    parser.add_argument('--cash-basis', action='store_true',
+                        help='With --exact-accrual, count coupons when paid and bill discounts at maturity.')
     parser.add_argument('--interest-rates', type=json.loads, default=config['simulation']['interest_rates_default'],
                         help='Dictionary of interest rates with term as key and rate as value (default is 5 percent for all securities).')
+    parser.add_argument('--interest-rate-path', default=None,
+                        help='Path to a .csv of interest rates by year and term; overrides --interest-rates. '
+                             'An optional new_debt column overrides --new-debt-interest-rate (with --legacy-new-debt).')
+    parser.add_argument('--rate-interpolation', choices=INTERPOLATIONS, default='nearest',
+                        help='How securities get rates between the terms of --interest-rates: the closest term '
+                             '(default, as originally modelled), linear, or monotone cubic (not with --rate-exposure).')
     parser.add_argument('--gdp-millions', type=int, default=config['simulation']['gdp_millions'],
                         help='Current US GDP in millions of dollars.')
     parser.add_argument('--gdp-growth-rate', type=float, default=config['simulation']['gdp_growth_rate'],
@@ -250,12 +682,87 @@ if __name__ == "__main__":
     parser.add_argument('--new-debt-pct-gdp', type=float, default=config['simulation']['new_debt_pct_gdp'],
                         help='Estimated budget deficit.')
     parser.add_argument('--new-debt-interest-rate', type=float, default=config['simulation']['new_debt_interest_rate'],
-                        help='Estimated average Fed Funds rate.')
+                        help='Estimated average Fed Funds rate; only used with --legacy-new-debt.')
+    parser.add_argument('--new-debt-maturity-mix', type=json.loads, default=config['simulation']['new_debt_maturity_mix'],
+                        help='Dictionary of the share of new debt issued at each term, with term in years as key.')
+    parser.add_argument('--legacy-new-debt', action='store_true',
+                        help='Issue new debt as a single pool at --new-debt-interest-rate, as originally modelled.')
+    parser.add_argument('--initial-debt-millions', type=float, default=config['simulation'].get('initial_debt_millions'),
+                        help='Total debt at the max record date, which outstanding debt is scaled to '
+                             '(default: scale by the multiplier in config).')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always parse the raw .csv instead of using the preprocessed snapshot in cache_dir.')
+    parser.add_argument('--rate-exposure', action='store_true',
+                        help='Evaluate interest rates against a cached rate exposure matrix instead of simulating each security.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only process records added since the last incremental run; state is kept under cache_dir.')
+    parser.add_argument('--legacy-reissue', action='store_true',
+                        help='Use the original row-by-row reissuance (slow; for parity checks).')
+    parser.add_argument('--legacy-accrual', action='store_true',
+                        help='Use the original dict-per-row interest accrual (slow; for parity checks).')
+    parser.add_argument('--by-security', action='store_true',
+                        help='Also break interest down by security and write it to id_grouped.csv (slower; uses more memory).')
+    parser.add_argument('--shards', type=int, default=None,
+                        help='Reissue and accrue securities in this many shards across worker processes, '
+                             'at most one per security type and term bucket; the result is identical to a serial run.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Record time and peak RSS per stage and write a JSON run report next to output_path.')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Also trace allocations per stage with tracemalloc (implies --profile; slows the run down).')
+    parser.add_argument('--serve', action='store_true',
+                        help='Load the data once and answer scenarios over HTTP instead of running one; '
+                             'the other flags set the default scenario (see server.py).')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to serve on, with --serve.')
+    parser.add_argument('--port', type=int, default=8000, help='Port to serve on, with --serve.')
 
     args = parser.parse_args()
+    if args.shards is not None and args.shards < 1:
+        parser.error('--shards must be at least 1.')
+    cache_dir = None if args.no_cache else config['io'].get('cache_dir')
+    if args.incremental and cache_dir is None:
+        parser.error('--incremental keeps its state under cache_dir; set it in the config and drop --no-cache.')
+
+    # Convert interest rates keys from str to years.
+    interest_rates_converted = parse_terms(args.interest_rates)
+    new_debt_maturity_mix = parse_terms(args.new_debt_maturity_mix)
+    new_debt_interest_rate = args.new_debt_interest_rate
+    if args.interest_rate_path:
+        interest_rates_converted = load_rate_path(args.interest_rate_path)
+        if 'new_debt' in interest_rates_converted.columns:
+            new_debt_interest_rate = interest_rates_converted.pop('new_debt')
+    # Shards hold whole security type and term bucket groups (see shards.py).
+    max_shards = len(config['simulation']['security_types']) * len(interest_rates_converted.keys())
+    if args.shards is not None and args.shards > max_shards:
+        parser.error(f'--shards must be at most {max_shards}, one per security type and interest rate term.')
 
-    # Convert interest rates keys from str to int.
-    interest_rates_converted = {int(k): v for k, v in args.interest_rates.items()}
+    if args.serve:
+        from server import ModelServer, serve
+        model = ModelServer(
+            raw_data_path=config['io']['raw_data_path'],
+            historical_gdps_path=config['io']['historical_gdps_path'],
+            security_types=config['simulation']['security_types'],
+            reissue_end_date=pd.to_datetime(config['simulation']['reissue_end_date']),
+            defaults={
+                'new_debt': args.new_debt,
+                'interest_rates': args.interest_rates,
+                'interest_rate_path': args.interest_rate_path,
+                'gdp_millions': args.gdp_millions,
+                'gdp_growth_rate': args.gdp_growth_rate,
+                'new_debt_pct_gdp': args.new_debt_pct_gdp,
+                'new_debt_interest_rate': args.new_debt_interest_rate,
+                'new_debt_maturity_mix': args.new_debt_maturity_mix,
+                'legacy_new_debt': args.legacy_new_debt,
+                'initial_debt_millions': args.initial_debt_millions,
+                'multiplier': config['simulation']['multiplier'],
+                'fiscal_calendar': args.fiscal_calendar,
+                'period': args.period,
+                'exact_accrual': args.exact_accrual,
+                'cash_basis': args.cash_basis,
+                'rate_interpolation': args.rate_interpolation
+            },
+            cache_dir=cache_dir)
+        serve(model, args.host, args.port)
+        sys.exit(0)
 
     main(
         raw_data_path=config['io']['raw_data_path'],
@@ -269,6 +776,22 @@ if __name__ == "__main__":
         gdp_millions=args.gdp_millions,
         gdp_growth_rate=args.gdp_growth_rate,
         new_debt_pct_gdp=args.new_debt_pct_gdp,
-        new_debt_interest_rate=args.new_debt_interest_rate,
-        multiplier=config['simulation']['multiplier']
+        new_debt_interest_rate=new_debt_interest_rate,
+        multiplier=config['simulation']['multiplier'],
+        new_debt_maturity_mix=new_debt_maturity_mix,
+        legacy_new_debt=args.legacy_new_debt,
+        initial_debt_millions=args.initial_debt_millions,
+        cache_dir=cache_dir,
+        legacy_reissue=args.legacy_reissue,
+        legacy_accrual=args.legacy_accrual,
+        use_rate_exposure=args.rate_exposure,
+        incremental_dir=os.path.join(cache_dir, 'incremental') if args.incremental else None,
+        profile=args.profile,
+        trace_memory=args.trace_memory,
+        by_security=args.by_security,
+        period=args.period,
+        exact_accrual=args.exact_accrual,
+        cash_basis=args.cash_basis,
+        rate_interpolation=args.rate_interpolation,
+        num_shards=args.shards
     )
\ No newline at end of file
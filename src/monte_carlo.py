@@ -0,0 +1,199 @@
+"""
+Monte Carlo over interest rate paths.
+
+The short rate follows a discrete, yearly mean-reverting (Vasicek) model:
+
+    r[t+1] = r[t] + speed * (long_run_rate - r[t]) + volatility * N(0, 1)
+
+and every term on the curve moves with it, keeping its spread over the
+shortest term of the base curve. New debt is issued across a maturity mix
+and rolled over at the rates of the path, like reissued securities. Each
+path is evaluated against precomputed rate exposures, so the cost per path
+is a matrix-vector product rather than a full simulation.
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from utils import load_config, parse_terms, find_closest_value_indices
+from data import load_securities
+from exposure import load_rate_exposure, evaluate_rate_paths
+from simulation import (
+    build_new_debt_exposure, compute_new_debt_amounts, evaluate_new_debt_paths, compute_future_gdps)
+from main import load_historical_gdps
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+def simulate_short_rate_paths(
+        num_paths: int,
+        num_years: int,
+        initial_rate: float,
+        long_run_rate: float,
+        speed: float,
+        volatility: float,
+        rate_floor: float,
+        rng: np.random.Generator) -> np.ndarray:
+    """
+    Params:
+    num_paths: Number of paths to simulate.
+    num_years: Number of yearly steps; the first year is initial_rate.
+    initial_rate: Short rate in the first year, in percent.
+    long_run_rate: Rate the short rate reverts to, in percent.
+    speed: Fraction of the gap to long_run_rate closed each year.
+    volatility: Standard deviation of the yearly shock, in percentage points.
+    rate_floor: Short rates are not allowed below this, in percent.
+    rng: Random number generator.
+
+    Returns:
+    Array of shape (num_paths, num_years).
+    """
+    short_rates = np.empty((num_paths, num_years))
+    short_rates[:, 0] = initial_rate
+    shocks = rng.standard_normal((num_paths, num_years - 1)) * volatility
+    for t in range(1, num_years):
+        previous = short_rates[:, t - 1]
+        short_rates[:, t] = np.maximum(previous + speed * (long_run_rate - previous) + shocks[:, t - 1], rate_floor)
+    return short_rates
+
+def run_monte_carlo(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        historical_gdps: pd.DataFrame,
+        reissue_end_date: pd.Timestamp,
+        new_debt: bool,
+        interest_rates: dict,
+        gdp_millions: int,
+        gdp_growth_rate: float,
+        new_debt_pct_gdp: float,
+        multiplier: float,
+        new_debt_maturity_mix: dict,
+        num_paths: int,
+        long_run_rate: float,
+        speed: float,
+        volatility: float,
+        rate_floor: float = 0.0,
+        seed: int = None,
+        batch_size: int = 10000,
+        cache_dir: str = None) -> pd.DataFrame:
+    """
+    Simulates interest payments over num_paths stochastic rate paths.
+
+    Params:
+    interest_rates: Base curve in the form {term_years: interest_rate}. Its
+        shortest term sets the initial short rate and the spreads of the
+        other terms.
+    new_debt_maturity_mix: See main.run_scenario. Each term pays the rate of
+        the closest term of interest_rates.
+    num_paths: Number of rate paths.
+    long_run_rate, speed, volatility, rate_floor: See simulate_short_rate_paths.
+    seed: Random seed, for reproducible runs.
+    batch_size: Number of paths evaluated at once; bounds memory.
+    Other params are the same as main.run_scenario.
+
+    Returns:
+    DataFrame indexed by year with a column per percentile of
+    interest_payment and pct_gdp, e.g. interest_payment_p50.
+    """
+    terms = sorted(interest_rates.keys())
+    base_curve = np.array([interest_rates[term] for term in terms], dtype=np.float64)
+    term_spreads = base_curve - base_curve[0]
+
+    rate_exposure = load_rate_exposure(df, max_record_date, terms, reissue_end_date, cache_dir)
+    years = rate_exposure['years']
+    issue_years = rate_exposure['issue_years']
+
+    if new_debt:
+        new_debt_exposure = build_new_debt_exposure(new_debt_maturity_mix, max_record_date, reissue_end_date)
+        new_debt_amounts = compute_new_debt_amounts(
+            gdp_millions, gdp_growth_rate, new_debt_pct_gdp, len(new_debt_exposure['cohort_years']))
+        new_debt_terms = find_closest_value_indices(new_debt_exposure['terms'], terms)
+        new_debt_columns = np.searchsorted(years, new_debt_exposure['years'])
+        has_year = np.isin(new_debt_exposure['years'], years)
+
+    # End of year GDPs, historical then projected, on the exposure's year axis.
+    future_gdps = compute_future_gdps(gdp_millions, gdp_growth_rate, max_record_date, reissue_end_date)
+    gdps = pd.concat([
+        historical_gdps['gdp_millions_end_of_year'],
+        pd.Series(future_gdps)]).astype(int)
+    gdps = gdps[~gdps.index.duplicated()]
+    gdps = gdps.reindex(years.astype(str))
+    has_gdp = gdps.notna().to_numpy()
+    gdps = gdps.to_numpy(dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    interest_payments = np.empty((num_paths, len(years)))
+    print(f"Simulating {num_paths} rate paths...")
+    for start in range(0, num_paths, batch_size):
+        stop = min(start + batch_size, num_paths)
+        short_rates = simulate_short_rate_paths(
+            stop - start, len(issue_years), base_curve[0], long_run_rate, speed, volatility, rate_floor, rng)
+        rate_paths = short_rates[:, :, None] + term_spreads
+        batch = evaluate_rate_paths(rate_exposure, rate_paths)
+        if new_debt:
+            new_debt_payments = evaluate_new_debt_paths(
+                new_debt_exposure, new_debt_amounts, rate_paths[:, :, new_debt_terms])
+            batch[:, new_debt_columns[has_year]] += new_debt_payments[:, has_year]
+        interest_payments[start:stop] = batch * multiplier
+    print("Complete.")
+
+    pct_gdp = interest_payments[:, has_gdp] / gdps[has_gdp]
+    result = pd.DataFrame(index=pd.Index(years[has_gdp].astype(str), name='year'))
+    for percentile in PERCENTILES:
+        result[f'interest_payment_p{percentile}'] = np.percentile(
+            interest_payments[:, has_gdp], percentile, axis=0).round(2)
+    for percentile in PERCENTILES:
+        result[f'pct_gdp_p{percentile}'] = np.percentile(pct_gdp, percentile, axis=0).round(5)
+    return result
+
+if __name__ == "__main__":
+    # Load config.
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(current_dir, 'config_old.yml')
+    config = load_config(config_path)
+
+    parser = argparse.ArgumentParser(description='Monte Carlo simulation of interest expense over stochastic rate paths.')
+    parser.add_argument('--new-debt', action='store_true', help='Flag to issue new debt (default: false)')
+    parser.add_argument('--paths', type=int, default=10000, help='Number of rate paths.')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed.')
+    parser.add_argument('--long-run-rate', type=float, default=config['simulation']['new_debt_interest_rate'],
+                        help='Short rate that paths revert to (default: new_debt_interest_rate from config).')
+    parser.add_argument('--speed', type=float, default=0.2,
+                        help='Fraction of the gap to the long run rate closed each year.')
+    parser.add_argument('--volatility', type=float, default=1.0,
+                        help='Standard deviation of yearly short rate shocks, in percentage points.')
+    parser.add_argument('--rate-floor', type=float, default=0.0, help='Lowest allowed short rate.')
+    parser.add_argument('--output', default=None,
+                        help='Output .csv path (default: output_path from config with a _monte_carlo suffix).')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always parse the raw .csv instead of using the preprocessed snapshot in cache_dir.')
+    args = parser.parse_args()
+
+    cache_dir = None if args.no_cache else config['io'].get('cache_dir')
+    reissue_end_date = pd.to_datetime(config['simulation']['reissue_end_date'])
+    df, max_record_date = load_securities(
+        config['io']['raw_data_path'], config['simulation']['security_types'], cache_dir)
+
+    result = run_monte_carlo(
+        df=df,
+        max_record_date=max_record_date,
+        historical_gdps=load_historical_gdps(config['io']['historical_gdps_path']),
+        reissue_end_date=reissue_end_date,
+        new_debt=args.new_debt,
+        interest_rates=parse_terms(config['simulation']['interest_rates_default']),
+        gdp_millions=config['simulation']['gdp_millions'],
+        gdp_growth_rate=config['simulation']['gdp_growth_rate'],
+        new_debt_pct_gdp=config['simulation']['new_debt_pct_gdp'],
+        multiplier=config['simulation']['multiplier'],
+        new_debt_maturity_mix=parse_terms(config['simulation']['new_debt_maturity_mix']),
+        num_paths=args.paths,
+        long_run_rate=args.long_run_rate,
+        speed=args.speed,
+        volatility=args.volatility,
+        rate_floor=args.rate_floor,
+        seed=args.seed,
+        cache_dir=cache_dir
+    )
+    print(result)
+
+    output_path = args.output or '{}_monte_carlo.csv'.format(os.path.splitext(config['io']['output_path'])[0])
+    result.to_csv(output_path)
@@ -0,0 +1,241 @@
+"""
+Period grids for bucketing interest: calendar years, US fiscal years
+(October to September), quarters and months.
+
+A security accrues interest on each day after its issue date up to and
+including its maturity date, as in simulation.calculate_interest_totals.
+Each day pays 1/365 or 1/366 of the annual interest, depending on the
+calendar year it falls in, so a full calendar year pays exactly the annual
+interest and finer periods add up to coarser ones.
+
+Overlaps are day counts computed with datetime64 arithmetic over all
+securities at once: a security pays a partial amount in its first and last
+periods and a full period's interest in between, so partial periods are
+summed with bincount and full periods as a running sum of start and end
+markers, scaled by each period's share of its year.
+"""
+import numpy as np
+import pandas as pd
+
+# Period: (months per period, month of the year periods start from, 0 = January)
+PERIODS = {
+    'year': (12, 0),
+    'fiscal_year': (12, 9),
+    'quarter': (3, 0),
+    'month': (1, 0),
+}
+
+def get_period_starts(period: str, first_day: np.datetime64, last_day: np.datetime64) -> np.ndarray:
+    """
+    Start dates of the periods covering first_day to last_day, followed by
+    the start of the period after last_day.
+
+    Returns:
+    datetime64[D] array of period boundaries.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}; expected one of {list(PERIODS)}.")
+    months_per_period, start_month = PERIODS[period]
+    first_month = np.datetime64(first_day, 'M').astype(np.int64)
+    last_month = np.datetime64(last_day, 'M').astype(np.int64)
+    first_month -= (first_month - start_month) % months_per_period
+    months = np.arange(first_month, last_month + months_per_period + 1, months_per_period)
+    return months.astype('datetime64[M]').astype('datetime64[D]')
+
+def get_period_labels(period: str, starts: np.ndarray) -> np.ndarray:
+    """
+    Labels of the periods starting at starts, e.g. '2025' for a year,
+    'FY2025' for October 2024 to September 2025, '2025Q1' or '2025-01'.
+    """
+    months = starts.astype('datetime64[M]').astype(np.int64)
+    years = (months // 12 + 1970).astype(str)
+    if period == 'year':
+        return years
+    if period == 'fiscal_year':
+        return np.char.add('FY', (months // 12 + 1971).astype(str))
+    if period == 'quarter':
+        return np.char.add(np.char.add(years, 'Q'), (months % 12 // 3 + 1).astype(str))
+    return np.datetime_as_string(starts, unit='M')
+
+def add_months(dates: np.ndarray, months: np.ndarray, end_of_month: np.ndarray = False) -> np.ndarray:
+    """
+    Adds months to datetime64[D] dates, clipping to the end of the month
+    (e.g. Aug 31 - 6 months is Feb 28 or 29). Where end_of_month is set the
+    result is always the last day of its month.
+    """
+    month = dates.astype('datetime64[M]')
+    day = (dates - month.astype('datetime64[D]')).astype(np.int64)
+    new_month = month + months
+    days_in_month = ((new_month + 1).astype('datetime64[D]') - new_month.astype('datetime64[D]')).astype(np.int64)
+    return new_month.astype('datetime64[D]') + np.where(end_of_month, days_in_month - 1, np.minimum(day, days_in_month - 1))
+
+def get_label_years(labels: np.ndarray) -> np.ndarray:
+    """Calendar year in which each labelled period ends, e.g. 2025 for 'FY2025' or '2025Q1'."""
+    return np.array([int(label.lstrip('FY')[:4]) for label in labels], dtype=np.int64)
+
+def get_label_dates(period: str, labels: np.ndarray) -> tuple:
+    """
+    First and last day of each labelled period, e.g. 2024-10-01 and
+    2025-09-30 for 'FY2025'.
+
+    Returns:
+    (first_days, last_days) as datetime64[D] arrays.
+    """
+    years = get_label_years(labels)
+    starts = get_period_starts(
+        period, np.datetime64(f"{years.min() - 1}-01-01"), np.datetime64(f"{years.max()}-12-31"))
+    index = pd.Index(get_period_labels(period, starts[:-1])).get_indexer(labels)
+    return starts[index], starts[index + 1] - 1
+
+def calculate_year_fractions(first_day: np.datetime64, last_day: np.datetime64) -> np.ndarray:
+    """
+    Running sum of the fraction of its calendar year each day from first_day
+    to last_day is, starting at 0.
+
+    Returns:
+    Array of length (last_day - first_day) + 1 days, where element i is the
+    accrual, in years, of the days before first_day + i.
+    """
+    days = np.arange(first_day, last_day, dtype='datetime64[D]')
+    years = days.astype('datetime64[Y]')
+    days_in_year = ((years + 1).astype('datetime64[D]') - years.astype('datetime64[D]')).astype(np.int64)
+    return np.concatenate([[0.0], np.cumsum(1 / days_in_year)])
+
+def calculate_interest_by_period(
+        df: pd.DataFrame,
+        period: str,
+        groups: np.ndarray = None,
+        num_groups: int = None) -> tuple:
+    """
+    Interest of the securities in each group summed into periods.
+
+    Parameters:
+    df: As for simulation.calculate_interest_totals.
+    period: One of PERIODS.
+    groups: Group index (0, 1, ...) of each security. All securities are in
+        one group if None.
+    num_groups: Number of groups, including any without securities.
+        Defaults to the highest group index plus one.
+
+    Returns:
+    (totals, labels) where totals is a float64 array of shape
+    (number of groups, len(labels)) and labels are as returned by
+    get_period_labels. Periods in which no security accrues interest are dropped.
+    """
+    if groups is None:
+        groups = np.zeros(len(df), dtype=np.int64)
+    if num_groups is None:
+        num_groups = int(groups.max()) + 1 if len(df) else 1
+    if len(df) == 0:
+        return np.zeros((num_groups, 0)), np.zeros(0, dtype=str)
+
+    # Accrual runs from the day after issue to the day after maturity, exclusive.
+    accrual_start = df['Issue Date'].to_numpy().astype('datetime64[D]') + 1
+    accrual_end = df['Maturity Date'].to_numpy().astype('datetime64[D]') + 1
+    accrual_end = np.maximum(accrual_end, accrual_start)
+    issue_amount = df['Issued Amount (in Millions)'].to_numpy(dtype=np.float64)
+    ## Bonds and Notes use interest rate. Bills don't have one; use yield.
+    interest_rate = df['Interest Rate'].to_numpy(dtype=np.float64)
+    if 'Yield' in df.columns:
+        interest_rate = np.where(np.isnan(interest_rate), df['Yield'].to_numpy(dtype=np.float64), interest_rate)
+    yearly_interest = issue_amount * interest_rate / 100
+
+    starts = get_period_starts(period, accrual_start.min(), accrual_end.max() - 1)
+    num_periods = len(starts) - 1
+    year_fractions = calculate_year_fractions(starts[0], starts[-1])
+    period_fractions = np.diff(year_fractions[(starts - starts[0]).astype(np.int64)])
+
+    def accrued(dates):
+        # Accrual in years from the first period start to dates.
+        return year_fractions[(dates - starts[0]).astype(np.int64)]
+
+    # Period of the first and last accruing day.
+    first_period = np.searchsorted(starts, accrual_start, side='right') - 1
+    last_period = np.maximum(np.searchsorted(starts, accrual_end - 1, side='right') - 1, first_period)
+    first_index = groups * num_periods + first_period
+    last_index = groups * num_periods + last_period
+    size = num_groups * num_periods
+
+    # Full periods strictly between the first and last periods.
+    is_multi_period = first_period != last_period
+    full_periods = (
+        np.bincount(first_index[is_multi_period] + 1, yearly_interest[is_multi_period], minlength=size)
+        - np.bincount(last_index[is_multi_period], yearly_interest[is_multi_period], minlength=size))
+    totals = np.cumsum(full_periods.reshape(num_groups, num_periods), axis=1) * period_fractions
+
+    # Partial first and last periods, and securities within a single period.
+    first_end = np.where(is_multi_period, starts[np.minimum(first_period + 1, num_periods)], accrual_end)
+    partial = np.bincount(
+        first_index, yearly_interest * (accrued(first_end) - accrued(accrual_start)), minlength=size)
+    partial += np.bincount(
+        last_index[is_multi_period],
+        (yearly_interest * (accrued(accrual_end) - accrued(starts[last_period])))[is_multi_period],
+        minlength=size)
+    totals += partial.reshape(num_groups, num_periods)
+
+    # Drop periods in which no security accrues.
+    live_securities = np.cumsum(
+        np.bincount(first_period, minlength=num_periods + 1)
+        - np.bincount(last_period + 1, minlength=num_periods + 1))[:-1]
+    has_live_security = live_securities > 0
+
+    labels = get_period_labels(period, starts[:-1])
+    return totals[:, has_live_security], labels[has_live_security]
+
+def spread_by_period(
+        accrual_start: np.ndarray,
+        accrual_end: np.ndarray,
+        amounts: np.ndarray,
+        starts: np.ndarray,
+        groups: np.ndarray,
+        num_groups: int) -> np.ndarray:
+    """
+    Spreads each amount evenly over the days from accrual_start to
+    accrual_end (exclusive) and sums the days falling in each period.
+
+    Parameters:
+    accrual_start, accrual_end: datetime64[D] arrays within the periods.
+    amounts: Amount accrued over each range.
+    starts: Period boundaries, as returned by get_period_starts.
+    groups: Group index of each range.
+    num_groups: Number of groups.
+
+    Returns:
+    Array of shape (num_groups, len(starts) - 1).
+    """
+    num_periods = len(starts) - 1
+    days = (accrual_end - accrual_start).astype(np.int64)
+    daily_amounts = amounts / np.maximum(days, 1)
+    period_days = np.diff(starts).astype(np.int64)
+
+    first_period = np.searchsorted(starts, accrual_start, side='right') - 1
+    last_period = np.maximum(np.searchsorted(starts, accrual_end - 1, side='right') - 1, first_period)
+    first_index = groups * num_periods + first_period
+    last_index = groups * num_periods + last_period
+    size = num_groups * num_periods
+
+    # Full periods strictly between the first and last periods.
+    is_multi_period = first_period != last_period
+    full_periods = (
+        np.bincount(first_index[is_multi_period] + 1, daily_amounts[is_multi_period], minlength=size)
+        - np.bincount(last_index[is_multi_period], daily_amounts[is_multi_period], minlength=size))
+    totals = np.cumsum(full_periods.reshape(num_groups, num_periods), axis=1) * period_days
+
+    # Partial first and last periods, and ranges within a single period.
+    first_end = np.where(is_multi_period, starts[np.minimum(first_period + 1, num_periods)], accrual_end)
+    partial = np.bincount(
+        first_index, daily_amounts * (first_end - accrual_start).astype(np.int64), minlength=size)
+    partial += np.bincount(
+        last_index[is_multi_period],
+        (daily_amounts * (accrual_end - starts[last_period]).astype(np.int64))[is_multi_period],
+        minlength=size)
+    return totals + partial.reshape(num_groups, num_periods)
+
+def get_live_periods(accrual_start: np.ndarray, accrual_end: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Whether any of the ranges from accrual_start to accrual_end (exclusive) overlaps each period."""
+    num_periods = len(starts) - 1
+    first_period = np.searchsorted(starts, accrual_start, side='right') - 1
+    last_period = np.maximum(np.searchsorted(starts, accrual_end - 1, side='right') - 1, first_period)
+    return np.cumsum(
+        np.bincount(first_period, minlength=num_periods + 1)
+        - np.bincount(last_period + 1, minlength=num_periods + 1))[:-1] > 0
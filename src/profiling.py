@@ -0,0 +1,195 @@
+"""
+Per-stage timing and memory instrumentation.
+
+Code marks its stages with
+
+    with stage('reissue') as info:
+        ...
+        info['rows'] = len(result)
+
+Nothing is recorded unless a Profiler has been started with
+start_profiling, so marked stages cost next to nothing on normal runs.
+Stages nest, and a stage entered more than once (e.g. once per chunk) is
+accumulated into a single record.
+
+For each stage the report holds:
+* wall_s, cpu_s: Wall clock and CPU time of this process.
+* traced_peak_mb: Peak memory allocated through Python and numpy during the
+  stage, including memory already held when it started. Only recorded
+  when tracing memory with tracemalloc.
+* traced_delta_mb: Memory still allocated at the end of the stage less
+  that at the start. Only recorded when tracing memory.
+* max_rss_mb: High-water mark of the process' resident memory at the end of
+  the stage. It never decreases, so the stage where it jumps is the one
+  that set it.
+* rows: Rows produced, where the stage reports them.
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import contextlib
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; max_rss_mb is reported as None.
+    resource = None
+
+MB = 2**20
+
+def get_max_rss_mb() -> float:
+    """High-water mark of the process' resident memory in MB, or None."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return max_rss / MB if sys.platform == 'darwin' else max_rss / 1024
+
+class Profiler:
+    def __init__(self, trace_memory: bool = False):
+        """
+        Params:
+        trace_memory: Trace allocations with tracemalloc. This is the only
+            per-stage measure of memory, but makes code that allocates many
+            small objects (e.g. writing a .csv) several times slower.
+        """
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._names = []
+        self._peaks = []
+        self._started_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def close(self) -> None:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        path = '/'.join(self._names + [name])
+        record = self.stages.setdefault(path, {
+            'stage': path,
+            'calls': 0,
+            'wall_s': 0.0,
+            'cpu_s': 0.0,
+            'traced_peak_mb': None,
+            'traced_delta_mb': None,
+            'max_rss_mb': None,
+            'rows': None
+        })
+        info = {}
+        if self.trace_memory:
+            traced_start, traced_peak = tracemalloc.get_traced_memory()
+            # Fold the peak so far into the enclosing stage before resetting it.
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], traced_peak)
+            tracemalloc.reset_peak()
+        self._names.append(name)
+        self._peaks.append(0)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield info
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self._names.pop()
+            peak = self._peaks.pop()
+
+            record['calls'] += 1
+            record['wall_s'] += wall
+            record['cpu_s'] += cpu
+            if self.trace_memory:
+                traced_end, traced_peak = tracemalloc.get_traced_memory()
+                peak = max(peak, traced_peak)
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                tracemalloc.reset_peak()
+                record['traced_peak_mb'] = max(record['traced_peak_mb'] or 0, peak / MB)
+                record['traced_delta_mb'] = (record['traced_delta_mb'] or 0) + (traced_end - traced_start) / MB
+            record['max_rss_mb'] = get_max_rss_mb()
+            if 'rows' in info:
+                record['rows'] = (record['rows'] or 0) + int(info['rows'])
+
+    def report(self, **context) -> dict:
+        """
+        Run report with every stage in the order first entered.
+
+        Params:
+        context: Extra JSON serializable fields, e.g. run parameters.
+        """
+        stages = []
+        for record in self.stages.values():
+            record = dict(record)
+            for key in ['wall_s', 'cpu_s', 'traced_peak_mb', 'traced_delta_mb', 'max_rss_mb']:
+                if record[key] is not None:
+                    record[key] = round(record[key], 4)
+            stages.append(record)
+        return {
+            'started_at': self._started_at,
+            'wall_s': round(time.perf_counter() - self._wall_start, 4),
+            'cpu_s': round(time.process_time() - self._cpu_start, 4),
+            'max_rss_mb': get_max_rss_mb(),
+            **context,
+            'stages': stages
+        }
+
+    def write_report(self, path: str, **context) -> dict:
+        report = self.report(**context)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Wrote profile report to {path}")
+        return report
+
+################################################################################
+#
+################################################################################
+
+_profiler = None
+
+def start_profiling(trace_memory: bool = False) -> Profiler:
+    """Starts recording marked stages until stop_profiling."""
+    global _profiler
+    stop_profiling()
+    _profiler = Profiler(trace_memory)
+    return _profiler
+
+def stop_profiling() -> None:
+    global _profiler
+    if _profiler is not None:
+        _profiler.close()
+        _profiler = None
+
+def stage(name: str):
+    """
+    Context manager marking a stage, yielding a dict in which the stage can
+    report 'rows'. A no-op unless profiling was started.
+    """
+    if _profiler is None:
+        return contextlib.nullcontext({})
+    return _profiler.stage(name)
+
+def stage_iter(name: str, iterable):
+    """Yields from iterable, marking each step (e.g. reading a chunk) as a stage."""
+    iterator = iter(iterable)
+    while True:
+        with stage(name) as info:
+            item = next(iterator, None)
+            if item is not None:
+                info['rows'] = len(item)
+        if item is None:
+            return
+        yield item
+
+def get_report_path(output_path: str) -> str:
+    """Run report path next to output_path, e.g. out.csv -> out_profile.json."""
+    return '{}_profile.json'.format(os.path.splitext(output_path)[0])
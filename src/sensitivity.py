@@ -0,0 +1,264 @@
+"""
+Sensitivity of interest payments and interest / GDP to every scenario input.
+
+Rather than bump each input and rerun the model, the year x parameter
+Jacobian comes out of one pass over cached arrays:
+* Interest rates: Interest on existing, reissued and new debt is linear in
+  the rates of the curve (see exposure.py and
+  simulation.build_new_debt_exposure), so the derivative with respect to
+  each term is its column of the rate exposure, plus the new debt
+  exposure weighted by how much each maturity of the mix takes from that
+  term (see curves.get_term_weights). For a rate path, a term is shifted
+  in every year of the path.
+* new_debt_pct_gdp: New debt interest is linear in it, so the derivative
+  is new debt interest at a value of one.
+* multiplier: Interest before the multiplier.
+* gdp_growth_rate: GDP compounds, so its derivative is a central finite
+  difference, with GDP (see simulation.compute_future_gdps) and new debt
+  interest evaluated at both bumped growth rates, the cohorts at once from
+  the cached new debt exposure.
+* new_debt_interest_rate: Only moves the legacy new debt model
+  (simulation.issue_new_debt), which pays interest on its past interest,
+  so its derivative is a central finite difference too.
+
+Derivatives are scaled to the change for a small bump of each input (see
+BUMPS), e.g. the change in 2040 interest / GDP per basis point on the 2
+year rate. They are first order changes, taken before the rounding of
+main.run_scenario's output and of GDP to whole millions.
+"""
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, Union
+from utils import load_config, load_rate_path, parse_terms
+from data import load_securities
+from curves import INTERPOLATIONS, get_term_weights
+from exposure import load_rate_exposure, evaluate_rate_exposure
+from simulation import (
+    build_new_debt_exposure, compute_new_debt_amounts, get_new_debt_rates, issue_new_debt, compute_future_gdps)
+from main import load_historical_gdps
+
+# Size of the bump each input's sensitivity is reported for, in the input's units.
+BUMPS = {
+    'interest_rates': 0.01,
+    'gdp_growth_rate': 0.1,
+    'new_debt_pct_gdp': 0.1,
+    'new_debt_interest_rate': 0.01,
+    'multiplier': 0.01,
+}
+
+def compute_sensitivities(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        historical_gdps: pd.DataFrame,
+        reissue_end_date: pd.Timestamp,
+        new_debt: bool,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        gdp_millions: int,
+        gdp_growth_rate: float,
+        new_debt_pct_gdp: float,
+        new_debt_interest_rate: Union[float, pd.Series],
+        multiplier: float,
+        new_debt_maturity_mix: dict = None,
+        legacy_new_debt: bool = False,
+        rate_interpolation: str = 'nearest',
+        bumps: dict = None,
+        step: float = 1e-3,
+        rate_exposure: dict = None,
+        new_debt_exposure: dict = None,
+        cache_dir: str = None) -> pd.DataFrame:
+    """
+    Change in interest payments and interest / GDP by year for a bump of
+    each scenario input.
+
+    Params:
+    bumps: Bump sizes by input, overriding BUMPS.
+    step: Step of the central differences, in percentage points.
+    rate_exposure: As returned by load_rate_exposure for the terms of
+        interest_rates and rate_interpolation. Loaded if None.
+    new_debt_exposure: As returned by build_new_debt_exposure for
+        new_debt_maturity_mix. Built if None.
+    Other params are the same as main.run_scenario. Interest is by
+    calendar year, and rate_interpolation must be linear in rates (nearest
+    or linear).
+
+    Returns:
+    DataFrame indexed by metric (interest_payment, pct_gdp) and year, with
+    a column per input: interest_rate_<term> for each term of
+    interest_rates, gdp_growth_rate, new_debt_pct_gdp,
+    new_debt_interest_rate and multiplier.
+    """
+    bumps = {**BUMPS, **(bumps or {})}
+    terms = list(interest_rates.keys())
+    if rate_exposure is None:
+        rate_exposure = load_rate_exposure(
+            df, max_record_date, terms, reissue_end_date, cache_dir, rate_interpolation)
+    if str(rate_exposure.get('interpolation', 'nearest')) != rate_interpolation:
+        raise ValueError(
+            f"rate_exposure was built with {rate_exposure.get('interpolation', 'nearest')} interpolation, "
+            f"not {rate_interpolation}.")
+
+    # Existing and reissued securities, on the exposure's years.
+    existing = evaluate_rate_exposure(rate_exposure, interest_rates).to_numpy()
+    exposure_terms = list(rate_exposure['terms'])
+    existing_by_term = rate_exposure['exposure'][:, [exposure_terms.index(term) for term in terms]] / 100
+    years = rate_exposure['years']
+
+    # New debt, per unit of each input it is linear in, and at both bumped growth rates.
+    growth_rates = gdp_growth_rate + np.array([-step, step])
+    new_debt_years = np.zeros(0, dtype=np.int64)
+    new_debt_base = new_debt_by_term = new_debt_per_pct = new_debt_per_rate = new_debt_bumped = None
+    if new_debt and legacy_new_debt:
+        def legacy_new_debt_interest(**params):
+            return pd.Series(issue_new_debt(**{
+                'gdp_millions': gdp_millions,
+                'gdp_growth_rate': gdp_growth_rate,
+                'new_debt_pct_gdp': new_debt_pct_gdp,
+                'interest_rate': new_debt_interest_rate,
+                'start_date': max_record_date,
+                'end_date': reissue_end_date,
+                **params
+            })).reindex(years.astype(str), fill_value=0).to_numpy()
+        # As in run_scenario, new debt only counts in the years securities pay interest.
+        new_debt_years = years
+        new_debt_base = legacy_new_debt_interest()
+        new_debt_by_term = np.zeros((len(years), len(terms)))
+        new_debt_per_pct = legacy_new_debt_interest(new_debt_pct_gdp=1.0)
+        # A rate path is shifted in every year alike.
+        new_debt_per_rate = (
+            legacy_new_debt_interest(interest_rate=new_debt_interest_rate + step)
+            - legacy_new_debt_interest(interest_rate=new_debt_interest_rate - step)) / (2 * step)
+        new_debt_bumped = np.array([
+            legacy_new_debt_interest(gdp_growth_rate=growth_rate) for growth_rate in growth_rates])
+    elif new_debt:
+        if new_debt_maturity_mix is None:
+            raise ValueError("new_debt_maturity_mix is required unless legacy_new_debt is set.")
+        if new_debt_exposure is None:
+            new_debt_exposure = build_new_debt_exposure(new_debt_maturity_mix, max_record_date, reissue_end_date)
+        num_cohorts = len(new_debt_exposure['cohort_years'])
+        rates = get_new_debt_rates(interest_rates, new_debt_exposure, rate_interpolation) / 100
+        term_weights = get_term_weights(new_debt_exposure['terms'], terms, rate_interpolation)
+        exposure = new_debt_exposure['exposure']
+        new_debt_years = new_debt_exposure['years']
+        per_pct_amounts = compute_new_debt_amounts(gdp_millions, gdp_growth_rate, 1.0, num_cohorts)
+        amounts = per_pct_amounts * new_debt_pct_gdp
+        new_debt_base = np.einsum('ycim,c,im->y', exposure, amounts, rates)
+        new_debt_by_term = np.einsum('ycim,c,mt->yt', exposure, amounts, term_weights) / 100
+        new_debt_per_pct = np.einsum('ycim,c,im->y', exposure, per_pct_amounts, rates)
+        new_debt_per_rate = np.zeros(len(new_debt_years))
+        bumped_amounts = compute_new_debt_amounts(gdp_millions, growth_rates[:, None], new_debt_pct_gdp, num_cohorts)
+        new_debt_bumped = np.einsum('ycim,bc,im->by', exposure, bumped_amounts, rates)
+
+    # Interest before the multiplier, on the years of either.
+    all_years = np.union1d(years, new_debt_years)
+    existing_index = np.searchsorted(all_years, years)
+    new_debt_index = np.searchsorted(all_years, new_debt_years)
+    interest = np.zeros(len(all_years))
+    interest[existing_index] += existing
+    by_input = {f'interest_rate_{term}': np.zeros(len(all_years)) for term in terms}
+    for i, term in enumerate(terms):
+        by_input[f'interest_rate_{term}'][existing_index] += existing_by_term[:, i]
+    by_input['gdp_growth_rate'] = np.zeros(len(all_years))
+    by_input['new_debt_pct_gdp'] = np.zeros(len(all_years))
+    by_input['new_debt_interest_rate'] = np.zeros(len(all_years))
+    bumped_interest = np.broadcast_to(interest, (2, len(all_years))).copy()
+    if new_debt:
+        interest[new_debt_index] += new_debt_base
+        for i, term in enumerate(terms):
+            by_input[f'interest_rate_{term}'][new_debt_index] += new_debt_by_term[:, i]
+        by_input['new_debt_pct_gdp'][new_debt_index] = new_debt_per_pct
+        by_input['new_debt_interest_rate'][new_debt_index] = new_debt_per_rate
+        bumped_interest[:, new_debt_index] += new_debt_bumped
+        by_input['gdp_growth_rate'] = (bumped_interest[1] - bumped_interest[0]) / (2 * step)
+
+    # End of year GDPs, historical then projected, unrounded.
+    def get_gdps(growth_rate):
+        gdps = pd.concat([
+            historical_gdps['gdp_millions_end_of_year'].astype(np.float64),
+            pd.Series(compute_future_gdps(gdp_millions, growth_rate, max_record_date, reissue_end_date))])
+        return gdps[~gdps.index.duplicated()].reindex(all_years.astype(str)).to_numpy()
+    gdps = get_gdps(gdp_growth_rate)
+    bumped_gdps = np.array([get_gdps(growth_rate) for growth_rate in growth_rates])
+    has_gdp = ~np.isnan(gdps)
+
+    # Derivatives of interest payments and interest / GDP, times each bump.
+    interest_sensitivities = {}
+    pct_gdp_sensitivities = {}
+    for name, derivative in by_input.items():
+        bump = bumps['interest_rates'] if name.startswith('interest_rate_') else bumps[name]
+        interest_sensitivities[name] = multiplier * derivative * bump
+        pct_gdp_sensitivities[name] = multiplier * derivative / gdps * bump
+    interest_sensitivities['multiplier'] = interest * bumps['multiplier']
+    pct_gdp_sensitivities['multiplier'] = interest / gdps * bumps['multiplier']
+    bumped_pct_gdp = multiplier * bumped_interest / bumped_gdps
+    pct_gdp_sensitivities['gdp_growth_rate'] = (
+        (bumped_pct_gdp[1] - bumped_pct_gdp[0]) / (2 * step) * bumps['gdp_growth_rate'])
+
+    index = pd.Index(all_years[has_gdp].astype(str), name='year')
+    return pd.concat({
+        'interest_payment': pd.DataFrame(interest_sensitivities, index=all_years.astype(str))[has_gdp].set_axis(index),
+        'pct_gdp': pd.DataFrame(pct_gdp_sensitivities, index=all_years.astype(str))[has_gdp].set_axis(index),
+    }, names=['metric'])
+
+if __name__ == "__main__":
+    # Load config.
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(current_dir, 'config_old.yml')
+    config = load_config(config_path)
+
+    parser = argparse.ArgumentParser(
+        description='Change in interest and interest / GDP by year for a small bump of each scenario input.')
+    parser.add_argument('--new-debt', action='store_true', help='Flag to issue new debt (default: false)')
+    parser.add_argument('--legacy-new-debt', action='store_true',
+                        help='Issue new debt as a single pool at new_debt_interest_rate, as originally modelled.')
+    parser.add_argument('--interest-rates', type=json.loads, default=config['simulation']['interest_rates_default'],
+                        help='Dictionary of interest rates with term as key and rate as value.')
+    parser.add_argument('--interest-rate-path', default=None,
+                        help='Path to a .csv of interest rates by year and term; overrides --interest-rates.')
+    parser.add_argument('--rate-interpolation', choices=INTERPOLATIONS[:2], default='nearest',
+                        help='How securities get rates between the terms of the curve.')
+    parser.add_argument('--year', type=int, action='append', default=None,
+                        help='Year to print the sensitivities of; may be repeated (default: every tenth year).')
+    parser.add_argument('--output', default=None,
+                        help='Output .csv path (default: output_path from config with a _sensitivity suffix).')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always parse the raw .csv instead of using the preprocessed snapshot in cache_dir.')
+    args = parser.parse_args()
+
+    cache_dir = None if args.no_cache else config['io'].get('cache_dir')
+    interest_rates = parse_terms(args.interest_rates)
+    new_debt_interest_rate = config['simulation']['new_debt_interest_rate']
+    if args.interest_rate_path:
+        interest_rates = load_rate_path(args.interest_rate_path)
+        if 'new_debt' in interest_rates.columns:
+            new_debt_interest_rate = interest_rates.pop('new_debt')
+    df, max_record_date = load_securities(
+        config['io']['raw_data_path'], config['simulation']['security_types'], cache_dir)
+
+    result = compute_sensitivities(
+        df=df,
+        max_record_date=max_record_date,
+        historical_gdps=load_historical_gdps(config['io']['historical_gdps_path']),
+        reissue_end_date=pd.to_datetime(config['simulation']['reissue_end_date']),
+        new_debt=args.new_debt,
+        interest_rates=interest_rates,
+        gdp_millions=config['simulation']['gdp_millions'],
+        gdp_growth_rate=config['simulation']['gdp_growth_rate'],
+        new_debt_pct_gdp=config['simulation']['new_debt_pct_gdp'],
+        new_debt_interest_rate=new_debt_interest_rate,
+        multiplier=config['simulation']['multiplier'],
+        new_debt_maturity_mix=parse_terms(config['simulation']['new_debt_maturity_mix']),
+        legacy_new_debt=args.legacy_new_debt,
+        rate_interpolation=args.rate_interpolation,
+        cache_dir=cache_dir
+    )
+    years = [str(year) for year in args.year] if args.year else list(result.loc['pct_gdp'].index[::10])
+    print(f"Change in interest / GDP per bump of each input (bumps: {BUMPS}):")
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(result.loc['pct_gdp'].loc[years].T)
+
+    output_path = args.output or '{}_sensitivity.csv'.format(os.path.splitext(config['io']['output_path'])[0])
+    result.to_csv(output_path)
+    print(f"Wrote sensitivities to {output_path}")
@@ -0,0 +1,301 @@
+"""
+Local JSON server that answers scenarios from warm in-memory state.
+
+A CLI run spends most of its time importing pandas, parsing the MSPD data
+and reissuing securities before it answers a single scenario. The server
+does that once: securities are loaded and preprocessed at startup, and the
+rate exposure of existing and reissued securities (see exposure.py) and the
+new debt exposure (see simulation.build_new_debt_exposure) are built once
+per set of curve terms or maturity mix and kept in memory. A scenario by
+calendar year is then a few small array products.
+
+Endpoints:
+* GET /health: The data the server has loaded.
+* POST /scenario: A JSON object of scenario parameters, named like the
+  main.py flags (e.g. "interest_rates" or "--interest-rates"). Parameters
+  not given take the values the server was started with. Returns the
+  per-year table as {"max_record_date", "columns", "data"}.
+* POST /reload: Loads the raw data again, or a new file given as
+  {"raw_data_path": ...}, and swaps it in once it is ready.
+
+Requests are served on threads. The loaded state is never modified once
+built: a reload builds new state and swaps it in, so requests already
+running finish against the state they started with. Exposures are added to
+the state the first time a scenario needs them: the state's lock is only
+held to look up or add an entry, while the exposure is built outside it,
+so a request needing a new exposure only holds up others needing the same
+one. Only the most recently used exposures of each kind are kept.
+"""
+import os
+import sys
+import json
+import datetime
+import threading
+import contextlib
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from utils import load_rate_path, parse_terms
+from curves import INTERPOLATIONS
+from data import load_securities
+from exposure import load_rate_exposure
+from simulation import build_new_debt_exposure
+from main import load_historical_gdps, run_scenario
+
+# Parameters a request can set, as named in run_scenario.
+SCENARIO_PARAMETERS = [
+    'new_debt',
+    'interest_rates',
+    'interest_rate_path',
+    'gdp_millions',
+    'gdp_growth_rate',
+    'new_debt_pct_gdp',
+    'new_debt_interest_rate',
+    'new_debt_maturity_mix',
+    'legacy_new_debt',
+    'initial_debt_millions',
+    'multiplier',
+    'fiscal_calendar',
+    'period',
+    'exact_accrual',
+    'cash_basis',
+    'rate_interpolation',
+]
+
+# Number of rate exposures, and of new debt exposures, kept in memory.
+EXPOSURE_CACHE_SIZE = 8
+
+class ModelServer:
+    def __init__(
+            self,
+            raw_data_path: str,
+            historical_gdps_path: str,
+            security_types: list,
+            reissue_end_date: pd.Timestamp,
+            defaults: dict,
+            cache_dir: str = None):
+        """
+        Loads the securities and warms the exposures of the default scenario.
+
+        Params:
+        defaults: Value of every parameter in SCENARIO_PARAMETERS, used for
+            any a request leaves out.
+        Other params are the same as main.
+        """
+        self.historical_gdps_path = historical_gdps_path
+        self.security_types = security_types
+        self.reissue_end_date = reissue_end_date
+        self.defaults = defaults
+        self.cache_dir = cache_dir
+        self._reload_lock = threading.Lock()
+        self.state = self.load(raw_data_path)
+
+    def load(self, raw_data_path: str) -> dict:
+        """Loads raw_data_path into new state, with the default scenario's exposures built."""
+        df, max_record_date = load_securities(raw_data_path, self.security_types, self.cache_dir)
+        state = {
+            'raw_data_path': raw_data_path,
+            'loaded_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'df': df,
+            'max_record_date': max_record_date,
+            'historical_gdps': load_historical_gdps(self.historical_gdps_path),
+            'rate_exposures': OrderedDict(),
+            'new_debt_exposures': OrderedDict(),
+            'lock': threading.Lock()
+        }
+        scenario = self.parse_scenario({})
+        if scenario['rate_interpolation'] != 'monotone_cubic':
+            self.get_rate_exposure(state, scenario['interest_rates'], scenario['rate_interpolation'])
+        if scenario['new_debt'] and not scenario['legacy_new_debt']:
+            self.get_new_debt_exposure(state, scenario)
+        return state
+
+    def reload(self, raw_data_path: str = None) -> dict:
+        """
+        Loads raw_data_path (by default the current file again) and swaps it
+        in. Only one reload runs at a time.
+
+        Returns:
+        The new state.
+        """
+        with self._reload_lock:
+            state = self.load(raw_data_path or self.state['raw_data_path'])
+            self.state = state
+        return state
+
+    def parse_scenario(self, params: dict) -> dict:
+        """
+        Complete run_scenario parameters from request params, converted as
+        main.py converts its flags.
+        """
+        params = {name.lstrip('-').replace('-', '_'): value for name, value in params.items()}
+        unknown = set(params) - set(SCENARIO_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown scenario parameters: {sorted(unknown)}")
+        scenario = {**self.defaults, **params}
+        if scenario['rate_interpolation'] not in INTERPOLATIONS:
+            raise ValueError(
+                f"Unknown rate_interpolation {scenario['rate_interpolation']!r}; expected one of {INTERPOLATIONS}.")
+
+        # JSON only has string keys.
+        scenario['interest_rates'] = parse_terms(scenario['interest_rates'])
+        scenario['new_debt_maturity_mix'] = parse_terms(scenario['new_debt_maturity_mix'])
+        interest_rate_path = scenario.pop('interest_rate_path')
+        if interest_rate_path:
+            scenario['interest_rates'] = load_rate_path(interest_rate_path)
+            if 'new_debt' in scenario['interest_rates'].columns:
+                scenario['new_debt_interest_rate'] = scenario['interest_rates'].pop('new_debt')
+        if scenario.pop('fiscal_calendar'):
+            # Shorthand for summing interest by fiscal year.
+            scenario['period'] = scenario['period'] or 'fiscal_year'
+        return scenario
+
+    def get_exposure(self, state: dict, kind: str, key: tuple, build) -> dict:
+        """
+        Exposure of kind ('rate_exposures' or 'new_debt_exposures') for key,
+        built with build() the first time it is asked for.
+
+        The first request for a key adds a future for it and builds the
+        exposure without holding the state's lock; later requests for the
+        same key wait on the future. If the build fails, the entry is
+        dropped so a later request tries again.
+        """
+        exposures = state[kind]
+        with state['lock']:
+            future = exposures.get(key)
+            is_builder = future is None
+            if is_builder:
+                future = exposures[key] = Future()
+                # Requests already waiting on an evicted exposure still get it.
+                while len(exposures) > EXPOSURE_CACHE_SIZE:
+                    exposures.popitem(last=False)
+            else:
+                exposures.move_to_end(key)
+        if is_builder:
+            try:
+                future.set_result(build())
+            except Exception as e:
+                with state['lock']:
+                    if exposures.get(key) is future:
+                        del exposures[key]
+                future.set_exception(e)
+        return future.result()
+
+    def get_rate_exposure(self, state: dict, interest_rates, interpolation: str = 'nearest') -> dict:
+        """Rate exposure for the terms of interest_rates, built the first time they are asked for."""
+        terms = tuple(sorted(interest_rates.keys()))
+        return self.get_exposure(state, 'rate_exposures', (terms, interpolation), lambda: load_rate_exposure(
+            state['df'], state['max_record_date'], list(terms), self.reissue_end_date, self.cache_dir,
+            interpolation))
+
+    def get_new_debt_exposure(self, state: dict, scenario: dict) -> dict:
+        """New debt exposure for the maturity mix, period and accrual of scenario."""
+        key = (tuple(sorted(scenario['new_debt_maturity_mix'].items())), scenario['period'], scenario['exact_accrual'])
+        return self.get_exposure(state, 'new_debt_exposures', key, lambda: build_new_debt_exposure(
+            scenario['new_debt_maturity_mix'],
+            state['max_record_date'],
+            self.reissue_end_date,
+            scenario['period'],
+            scenario['exact_accrual']))
+
+    def run(self, params: dict) -> tuple:
+        """
+        Runs one scenario against the current state.
+
+        Returns:
+        (pivot_table, max_record_date) as returned by run_scenario and of
+        the state it ran against.
+        """
+        state = self.state
+        scenario = self.parse_scenario(params)
+        rate_exposure = None
+        # The rate exposure only sums interest by calendar year, and monotone
+        # cubic rates are not linear in the curve.
+        if (scenario['period'] is None and not scenario['exact_accrual']
+                and scenario['rate_interpolation'] != 'monotone_cubic'):
+            rate_exposure = self.get_rate_exposure(
+                state, scenario['interest_rates'], scenario['rate_interpolation'])
+        new_debt_exposure = None
+        if scenario['new_debt'] and not scenario['legacy_new_debt']:
+            new_debt_exposure = self.get_new_debt_exposure(state, scenario)
+        pivot_table = run_scenario(
+            df=state['df'],
+            max_record_date=state['max_record_date'],
+            historical_gdps=state['historical_gdps'],
+            reissue_end_date=self.reissue_end_date,
+            write_intermediates=False,
+            rate_exposure=rate_exposure,
+            new_debt_exposure=new_debt_exposure,
+            **scenario)
+        return pivot_table, state['max_record_date']
+
+################################################################################
+#
+################################################################################
+
+class RequestHandler(BaseHTTPRequestHandler):
+    def send_json(self, status: int, body: dict) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object.")
+        return body
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self.send_json(404, {'error': f"Unknown path {self.path}"})
+        state = self.server.model.state
+        self.send_json(200, describe_state(state))
+
+    def do_POST(self):
+        model = self.server.model
+        try:
+            if self.path == '/scenario':
+                pivot_table, max_record_date = model.run(self.read_json())
+                table = pivot_table.reset_index()
+                self.send_json(200, {
+                    'max_record_date': max_record_date.isoformat(),
+                    'columns': list(table.columns),
+                    'data': json.loads(table.to_json(orient='values'))
+                })
+            elif self.path == '/reload':
+                state = model.reload(self.read_json().get('raw_data_path'))
+                self.send_json(200, describe_state(state))
+            else:
+                self.send_json(404, {'error': f"Unknown path {self.path}"})
+        except (ValueError, KeyError, TypeError, FileNotFoundError) as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            self.send_json(500, {'error': repr(e)})
+
+def describe_state(state: dict) -> dict:
+    return {
+        'raw_data_path': state['raw_data_path'],
+        'loaded_at': state['loaded_at'],
+        'max_record_date': state['max_record_date'].isoformat(),
+        'securities': len(state['df'])
+    }
+
+def serve(model: ModelServer, host: str = '127.0.0.1', port: int = 8000) -> None:
+    """Serves model over HTTP until interrupted."""
+    httpd = ThreadingHTTPServer((host, port), RequestHandler)
+    httpd.daemon_threads = True
+    httpd.model = model
+    print(f"Serving scenarios on http://{host}:{httpd.server_address[1]}", file=sys.stderr)
+    # Each scenario prints its progress; with concurrent requests it would only interleave.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
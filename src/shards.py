@@ -0,0 +1,180 @@
+"""
+Reissuance and accrual split into shards run in worker processes.
+
+Securities are partitioned by security type and term bucket (the closest
+of the interest rate terms; see simulation.get_term_buckets). A rollover
+keeps its security's term, so each group's securities and all their
+rollovers are in one shard. Groups are spread over the shards by their
+work, counting each security and each of its rollovers.
+
+Each worker reissues its shard's maturing securities, computes what every
+security and rollover adds to the yearly totals (see
+simulation.calculate_interest_contributions) and sums them into totals by
+group and year. Shards get plain arrays rather than DataFrames and return
+only those partial sums, so neither the parent's memory nor its work grows
+with the number of rollovers. Floating point sums depend on their order,
+but a group's securities and rollovers are summed in the same order in a
+shard as in a serial run, and the parent adds up the term buckets of each
+security type in order (see simulation.add_up_buckets) as a serial run
+does. The totals are bit-identical to simulate_security_types for any
+number of shards.
+"""
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Union
+from concurrent.futures import ProcessPoolExecutor
+from curves import RateCurve
+from profiling import stage
+from simulation import (
+    count_reissues, get_term_buckets, add_up_buckets, compute_reissue_schedule,
+    calculate_interest_contributions, sum_interest_contributions)
+
+# Columns a shard needs, as arrays.
+SHARD_COLUMNS = ['Issue Date', 'Maturity Date', 'Issued Amount (in Millions)', 'Interest Rate', 'term_days']
+
+def partition_securities(groups: np.ndarray, work: np.ndarray, num_shards: int) -> list:
+    """
+    Splits securities into up to num_shards shards of whole groups. Groups
+    are taken from the most work to the least, each into the shard with the
+    least work so far.
+
+    Params:
+    groups: Group of each security.
+    work: Work of each security.
+
+    Returns:
+    List of the positions of the securities of each non-empty shard, in
+    order.
+    """
+    group_ids, group_index = np.unique(groups, return_inverse=True)
+    group_work = np.bincount(group_index, weights=work, minlength=len(group_ids))
+    shard_work = np.zeros(num_shards)
+    shard_of_group = np.empty(len(group_ids), dtype=np.int64)
+    for group in np.argsort(-group_work, kind='stable'):
+        shard = int(shard_work.argmin())
+        shard_of_group[group] = shard
+        shard_work[shard] += group_work[group]
+    shards = shard_of_group[group_index]
+    return [positions for positions in (np.flatnonzero(shards == shard) for shard in range(num_shards)) if len(positions)]
+
+def simulate_shard(
+        arrays: dict,
+        max_record_date: pd.Timestamp,
+        reissue_end_date: pd.Timestamp,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        interpolation: str = 'nearest') -> dict:
+    """
+    Reissues the maturing securities of one shard and sums the interest of
+    its securities and their rollovers by group and year.
+
+    Params:
+    arrays: SHARD_COLUMNS of the shard's securities, with bills' yields in
+        'Interest Rate', plus 'group' (security type x term bucket).
+
+    Returns:
+    {
+        'groups': Sorted groups of the shard's securities,
+        'totals': groups x years array,
+        'years': int array of years,
+        'num_reissued': Number of rollovers
+    }
+    """
+    reissue_index = np.flatnonzero(arrays['Maturity Date'] >= np.datetime64(max_record_date))
+    row_index, issue_dates, maturity_dates = compute_reissue_schedule(pd.DataFrame({
+        'Maturity Date': arrays['Maturity Date'][reissue_index],
+        'term_days': arrays['term_days'][reissue_index]
+    }), reissue_end_date)
+    curve = RateCurve(interest_rates, interpolation)
+    issue_years = issue_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    interest_rate = curve.lookup(arrays['term_days'][reissue_index], issue_years, row_index)
+    source = reissue_index[row_index]
+
+    # Securities, then their rollovers, as in simulate_security_types.
+    securities = calculate_interest_contributions(
+        arrays['Issue Date'], arrays['Maturity Date'],
+        arrays['Issued Amount (in Millions)'], arrays['Interest Rate'])
+    reissued = calculate_interest_contributions(
+        issue_dates, maturity_dates, arrays['Issued Amount (in Millions)'][source], interest_rate)
+    contributions = {name: np.concatenate([values, reissued[name]]) for name, values in securities.items()}
+    groups, group_index = np.unique(arrays['group'], return_inverse=True)
+    totals, years = sum_interest_contributions(
+        contributions, np.concatenate([group_index, group_index[source]]), len(groups))
+    return {
+        'groups': groups,
+        'totals': totals,
+        'years': years,
+        'num_reissued': len(source)
+    }
+
+def simulate_sharded(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        reissue_end_date: pd.Timestamp,
+        interest_rates: Union[Dict[int, float], pd.DataFrame],
+        num_shards: int,
+        interpolation: str = 'nearest',
+        max_workers: int = None) -> pd.DataFrame:
+    """
+    simulate_security_types with reissuance and accrual run in num_shards
+    shards across worker processes. Shards hold whole security type and
+    term bucket groups, so there are no more shards than there are groups
+    with securities.
+
+    Params:
+    max_workers: Number of worker processes. Defaults to the smaller of
+        num_shards and the number of CPUs.
+
+    Returns:
+    DataFrame indexed by security type with one column per year (as a
+    string), bit-identical to simulate_security_types.
+    """
+    with stage('partition') as info:
+        terms = list(interest_rates.keys())
+        security_types, type_names = pd.factorize(df['Security Class 1 Description'], sort=True)
+        groups = security_types * len(terms) + get_term_buckets(
+            df['Issue Date'].to_numpy(), df['Maturity Date'].to_numpy(), terms)
+        num_reissues = np.where(
+            (df['Maturity Date'] >= max_record_date).to_numpy(), count_reissues(df, reissue_end_date), 0)
+        shards = partition_securities(groups, 1 + num_reissues, num_shards)
+        arrays = {name: df[name].to_numpy() for name in SHARD_COLUMNS}
+        ## Bonds and Notes use interest rate. Bills don't have one; use yield.
+        interest_rate = df['Interest Rate'].to_numpy(dtype=np.float64)
+        if 'Yield' in df.columns:
+            interest_rate = np.where(np.isnan(interest_rate), df['Yield'].to_numpy(dtype=np.float64), interest_rate)
+        arrays['Interest Rate'] = interest_rate
+        arrays['Issued Amount (in Millions)'] = arrays['Issued Amount (in Millions)'].astype(np.float64)
+        arrays['group'] = groups
+        info['rows'] = len(shards)
+
+    if len(shards) < num_shards:
+        print(f"Only {len(shards)} security type and term bucket groups have securities.")
+    print(f"Simulating reissuance and accrual in {len(shards)} shards...")
+    with stage('shards') as info:
+        with ProcessPoolExecutor(max_workers=max_workers or min(len(shards), os.cpu_count() or 1) or 1) as executor:
+            futures = [
+                executor.submit(
+                    simulate_shard,
+                    {name: values[positions] for name, values in arrays.items()},
+                    max_record_date,
+                    reissue_end_date,
+                    interest_rates,
+                    interpolation)
+                for positions in shards]
+            results = [future.result() for future in futures]
+        info['rows'] = sum(result['num_reissued'] for result in results)
+    print("Complete.")
+    print(f"Number of reissued securities in data: {sum(result['num_reissued'] for result in results)}")
+
+    with stage('merge') as info:
+        # Each shard's groups on the years of every shard, zero where a shard has no live security.
+        years = np.unique(np.concatenate([result['years'] for result in results]))
+        bucket_totals = np.zeros((len(type_names) * len(terms), len(years)))
+        for result in results:
+            bucket_totals[np.ix_(result['groups'], np.searchsorted(years, result['years']))] = result['totals']
+        totals = add_up_buckets(bucket_totals.reshape(len(type_names), len(terms), len(years)))
+        info['rows'] = len(years)
+    return pd.DataFrame(
+        totals,
+        index=pd.Index(np.asarray(type_names), name='security_type'),
+        columns=years.astype(str))
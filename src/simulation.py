@@ -1,6 +1,10 @@
 import numpy as np
 import pandas as pd
-from utils import find_closest_value_index, calculate_fraction_of_year_remaining, calculate_fraction_of_year_elapsed, calculate_fraction_of_year_between_issue_and_maturity
+from typing import Union
+from periods import calculate_interest_by_period
+from accrual import calculate_exact_interest
+from curves import RateCurve
+from utils import get_rates_by_year, find_closest_value_index, find_closest_value_indices, calculate_fraction_of_year_remaining, calculate_fraction_of_year_elapsed, calculate_fraction_of_year_between_issue_and_maturity, calculate_fractions_of_year_between_issue_and_maturity
 
 def compute_future_gdps(
     gdp_millions: int,
@@ -23,7 +27,7 @@ def issue_new_debt(
     gdp_millions: int,
     gdp_growth_rate: float,
     new_debt_pct_gdp: float,
-    interest_rate: float,
+    interest_rate: Union[float, pd.Series],
     start_date: pd.Timestamp,
     end_date: pd.Timestamp
 ) -> dict:
@@ -33,11 +37,15 @@ def issue_new_debt(
     Note: The interest payments are added cumulatively year by year; new debt issued
     each year stays on the books. 
 
+    Note: This is the original model of new debt as a single pool at a
+    single rate, kept for comparison. See issue_new_debt_cohorts.
+
     Params:
     gdp_millions: US GDP in millions of dollars.
     gdp_growth_rate: The yearly rate of GDP growth to use.
     new_debt_pct_gdp: The amount of new debt every year as a percentage of GDP.
-    interest_rate: The yearly interest rate to be paid on new debt.
+    interest_rate: The yearly interest rate to be paid on new debt, or a Series
+        of rates indexed by year (see utils.get_rates_by_year).
     start_date: Start date.
     end_date: End date.
 
@@ -50,8 +58,17 @@ def issue_new_debt(
     end_year = end_date.year
     current_gdp = gdp_millions
 
+    if isinstance(interest_rate, pd.Series):
+        interest_rate_by_year = dict(zip(
+            range(start_year, end_year + 1),
+            get_rates_by_year(interest_rate, np.arange(start_year, end_year + 1))))
+    else:
+        interest_rate_by_year = dict.fromkeys(range(start_year, end_year + 1), interest_rate)
+
     cumulative_debt = 0
     for year in range(start_year, end_year + 1):
+        interest_rate = interest_rate_by_year[year]
+
         # Freshly issued debt and associated interest payment
         new_debt = (current_gdp * new_debt_pct_gdp) / 100
         new_debt_interest_payment = (new_debt * interest_rate) / 100
@@ -78,6 +95,223 @@ def issue_new_debt(
 
     return interest_payments
 
+def schedule_new_debt(
+    maturity_mix: dict,
+    start_date: pd.Timestamp,
+    end_date: pd.Timestamp
+) -> dict:
+    """
+    Issue and maturity dates of every tranche of new debt and its rollovers.
+
+    Each year from start_date to end_date issues a cohort of new debt,
+    split across the terms of maturity_mix: the first cohort the day after
+    start_date, later ones on January 1st. Each tranche is rolled over when
+    it matures until end_date (see compute_reissue_schedule).
+
+    Params:
+    maturity_mix: Share of each cohort issued at each term, in the form
+        {term_years: share}. Shares must add up to 1.
+    start_date: Start date.
+    end_date: No new debt is issued or rolled over after this date.
+
+    Returns:
+    {
+        'cohort_years': int array of years in which cohorts are issued,
+        'terms': array of terms in years,
+        'shares': share of each term,
+        'cohort', 'term': cohort and term index of each tranche or rollover,
+        'issue_dates', 'maturity_dates': datetime64 arrays of each tranche
+            or rollover, tranches first
+    }
+    """
+    terms = np.array(sorted(maturity_mix), dtype=np.float64)
+    shares = np.array([maturity_mix[term] for term in sorted(maturity_mix)], dtype=np.float64)
+    if not np.isclose(shares.sum(), 1):
+        raise ValueError(f"New debt maturity mix shares must add up to 1, not {shares.sum()}.")
+    cohort_years = np.arange(start_date.year, end_date.year + 1)
+    num_cohorts = len(cohort_years)
+    num_terms = len(terms)
+
+    # One tranche per cohort and term.
+    first_issue_dates = (cohort_years - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+    first_issue_dates[0] = np.datetime64(start_date.date()) + np.timedelta64(1, 'D')
+    tranche_cohort = np.repeat(np.arange(num_cohorts), num_terms)
+    tranche_term = np.tile(np.arange(num_terms), num_cohorts)
+    term_days = np.round(terms * 365).astype(np.int64)[tranche_term]
+    tranche_issue_dates = first_issue_dates[tranche_cohort]
+    tranche_maturity_dates = tranche_issue_dates + term_days * np.timedelta64(1, 'D')
+
+    # Tranches followed by their rollovers.
+    row_index, issue_dates, maturity_dates = compute_reissue_schedule(pd.DataFrame({
+        'Maturity Date': tranche_maturity_dates,
+        'term_days': term_days
+    }), end_date)
+    row_index = np.concatenate([np.arange(len(tranche_cohort)), row_index])
+
+    return {
+        'cohort_years': cohort_years,
+        'terms': terms,
+        'shares': shares,
+        'cohort': tranche_cohort[row_index],
+        'term': tranche_term[row_index],
+        'issue_dates': np.concatenate([tranche_issue_dates, issue_dates]),
+        'maturity_dates': np.concatenate([tranche_maturity_dates, maturity_dates])
+    }
+
+def build_new_debt_exposure(
+    maturity_mix: dict,
+    start_date: pd.Timestamp,
+    end_date: pd.Timestamp,
+    period: str = None,
+    exact_accrual: bool = False
+) -> dict:
+    """
+    Interest paid on one unit of new debt, by cohort, term and the year
+    each rollover is issued, at a rate of 100 percent.
+
+    New debt is issued in yearly cohorts across the terms of maturity_mix
+    and rolled over until end_date (see schedule_new_debt). Each tranche
+    accrues like any other security (see calculate_interest_totals).
+    Interest is then linear in the size of each cohort and in the rate of
+    each term in the year each rollover is issued.
+
+    Params:
+    maturity_mix, start_date, end_date: See schedule_new_debt.
+    period: Sum interest into these periods (see periods.PERIODS) instead
+        of calendar years.
+    exact_accrual: Accrue semiannual coupons on actual days (see
+        accrual.calculate_exact_interest). Every term pays coupons, as bill
+        discounts are not linear in rates.
+
+    Returns:
+    {
+        'cohort_years': int array of years in which cohorts are issued,
+        'terms': array of terms in years,
+        'years': int array of years in which interest is paid, or period
+            labels if period is given,
+        'exposure': years x cohorts x issue years x terms array, where
+            issue years are cohort_years
+    }
+    """
+    schedule = schedule_new_debt(maturity_mix, start_date, end_date)
+    cohort_years = schedule['cohort_years']
+    num_cohorts = len(cohort_years)
+    num_terms = len(schedule['terms'])
+    issue_dates = schedule['issue_dates']
+    issue_year_index = issue_dates.astype('datetime64[Y]').astype(np.int64) + 1970 - cohort_years[0]
+
+    groups = (schedule['cohort'] * num_cohorts + issue_year_index) * num_terms + schedule['term']
+    units = pd.DataFrame({
+        'Interest Rate': 100.0,
+        'Issue Date': issue_dates,
+        'Maturity Date': schedule['maturity_dates'],
+        'Issued Amount (in Millions)': schedule['shares'][schedule['term']]
+    })
+    if exact_accrual:
+        totals, years = calculate_exact_interest(units, period or 'year', groups, num_cohorts * num_cohorts * num_terms)
+    elif period is None:
+        totals, years = calculate_interest_totals(units, groups, num_cohorts * num_cohorts * num_terms)
+    else:
+        totals, years = calculate_interest_by_period(units, period, groups, num_cohorts * num_cohorts * num_terms)
+
+    return {
+        'cohort_years': cohort_years,
+        'terms': schedule['terms'],
+        'years': years,
+        'exposure': totals.T.reshape(len(years), num_cohorts, num_cohorts, num_terms)
+    }
+
+def compute_new_debt_amounts(
+    gdp_millions: int,
+    gdp_growth_rate: float,
+    new_debt_pct_gdp: float,
+    num_years: int
+) -> np.ndarray:
+    """New debt issued in each of num_years years, in millions, as in issue_new_debt."""
+    gdps = gdp_millions * (1 + (gdp_growth_rate / 100)) ** np.arange(num_years)
+    return (gdps * new_debt_pct_gdp) / 100
+
+def get_new_debt_rates(
+    interest_rates: Union[dict, pd.DataFrame],
+    new_debt_exposure: dict,
+    interpolation: str = 'nearest'
+) -> np.ndarray:
+    """
+    Rate of each term of the maturity mix in each issue year, interpolated
+    from interest_rates as for reissued securities (see curves.RateCurve).
+
+    Returns:
+    Array of shape (issue years, terms), in percent.
+    """
+    curve = RateCurve(interest_rates, interpolation)
+    rates = curve.get_rates(new_debt_exposure['terms'], new_debt_exposure['cohort_years'])
+    return np.broadcast_to(rates, (len(new_debt_exposure['cohort_years']), len(new_debt_exposure['terms'])))
+
+def issue_new_debt_cohorts(
+    gdp_millions: int,
+    gdp_growth_rate: float,
+    new_debt_pct_gdp: float,
+    interest_rates: Union[dict, pd.DataFrame],
+    maturity_mix: dict,
+    start_date: pd.Timestamp,
+    end_date: pd.Timestamp,
+    new_debt_exposure: dict = None,
+    period: str = None,
+    exact_accrual: bool = False,
+    interpolation: str = 'nearest'
+) -> tuple:
+    """
+    Cohort model of new debt: every year's new debt is issued across the
+    terms of maturity_mix and rolled over at the rates of that year, like
+    reissued securities (see build_new_debt_exposure).
+
+    Params:
+    interest_rates: Dictionary in the form {term_years: interest_rate}, or a
+        rate path (see utils.load_rate_path). Each term of maturity_mix pays
+        the rate interpolated at its term.
+    maturity_mix: Share of new debt issued at each term, in the form
+        {term_years: share}.
+    new_debt_exposure: As returned by build_new_debt_exposure for the same
+        maturity_mix and dates, to reuse across scenarios. Built if None.
+    period, exact_accrual: See build_new_debt_exposure.
+    interpolation: One of curves.INTERPOLATIONS.
+    Other params are the same as issue_new_debt.
+
+    Returns:
+    (interest, years) where interest is an array of shape (len(years),
+    cohorts, terms) holding the interest each cohort pays on each term in
+    each year (or period).
+    """
+    if new_debt_exposure is None:
+        new_debt_exposure = build_new_debt_exposure(maturity_mix, start_date, end_date, period, exact_accrual)
+    new_debt_amounts = compute_new_debt_amounts(
+        gdp_millions, gdp_growth_rate, new_debt_pct_gdp, len(new_debt_exposure['cohort_years']))
+    rates = get_new_debt_rates(interest_rates, new_debt_exposure, interpolation)
+    interest = np.einsum('ycit,c,it->yct', new_debt_exposure['exposure'], new_debt_amounts, rates / 100)
+    return interest, new_debt_exposure['years']
+
+def evaluate_new_debt_paths(
+    new_debt_exposure: dict,
+    new_debt_amounts: np.ndarray,
+    rate_paths: np.ndarray
+) -> np.ndarray:
+    """
+    issue_new_debt_cohorts summed over cohorts and terms, for many rate
+    paths at once.
+
+    Params:
+    new_debt_exposure: As returned by build_new_debt_exposure.
+    new_debt_amounts: New debt issued in each cohort year (see
+        compute_new_debt_amounts).
+    rate_paths: Array of shape (paths, issue years, terms), in percent,
+        with the terms of the exposure.
+
+    Returns:
+    Array of shape (paths, years).
+    """
+    exposure = np.einsum('ycit,c->yit', new_debt_exposure['exposure'], new_debt_amounts)
+    return (rate_paths.reshape(len(rate_paths), -1) / 100) @ exposure.reshape(len(exposure), -1).T
+
 ################################################################################
 #
 ################################################################################
@@ -130,9 +364,97 @@ def reissue_security(
             'Issued Amount (in Millions)': issued_amount
         }
         current_issue_date += pd.Timedelta(days=term_days)
-    
+
     return df
 
+def compute_reissue_schedule(df: pd.DataFrame, reissue_end_date: pd.Timestamp) -> tuple:
+    """
+    Issue and maturity dates of every rollover of the securities in df,
+    as produced by reissue_security.
+
+    Each security is first reissued the day after it matures, then rolled
+    over every term_days until the issue date passes reissue_end_date. The
+    number of rollovers is computed in closed form, so the dates come out
+    of a single datetime64 pass instead of a per-row loop.
+
+    Params:
+    df: Securities to reissue, with 'Maturity Date' and 'term_days' columns.
+    reissue_end_date: No security is reissued after this date.
+
+    Returns:
+    (row_index, issue_dates, maturity_dates) with one entry per rollover,
+    grouped by security in the order of df. row_index gives the position
+    in df of the security each rollover came from.
+    """
+    term_days = df['term_days'].to_numpy(dtype=np.int64)
+    one_day = np.timedelta64(1, 'D')
+    first_issue_dates = df['Maturity Date'].to_numpy() + one_day
+    num_reissues = count_reissues(df, reissue_end_date)
+
+    row_index = np.repeat(np.arange(len(df)), num_reissues)
+    group_start = np.repeat(np.cumsum(num_reissues) - num_reissues, num_reissues)
+    rollover = np.arange(len(row_index)) - group_start
+    offset_days = rollover * term_days[row_index]
+    issue_dates = first_issue_dates[row_index] + offset_days * one_day
+    maturity_dates = issue_dates + term_days[row_index] * one_day
+
+    return row_index, issue_dates, maturity_dates
+
+def count_reissues(df: pd.DataFrame, reissue_end_date: pd.Timestamp) -> np.ndarray:
+    """Number of rollovers of each security in df (see compute_reissue_schedule)."""
+    one_day = np.timedelta64(1, 'D')
+    # Rollover k is issued on maturity + 1 day + k * term_days, so the number of
+    # rollovers is the number of whole terms that fit before reissue_end_date.
+    days_until_end = (np.datetime64(reissue_end_date) - (df['Maturity Date'].to_numpy() + one_day)) / one_day
+    return np.where(
+        days_until_end >= 0,
+        np.floor_divide(days_until_end, df['term_days'].to_numpy(dtype=np.int64)) + 1,
+        0).astype(np.int64)
+
+def reissue_securities(
+        df: pd.DataFrame,
+        interest_rates: Union[dict, pd.DataFrame],
+        reissue_end_date: pd.Timestamp,
+        interpolation: str = 'nearest') -> pd.DataFrame:
+    """
+    Vectorized equivalent of applying reissue_security to every row of df.
+
+    Params:
+    df: Securities to reissue. Needs the same columns as reissue_security.
+    interest_rates: Dictionary in the form {term_years: interest_rate}, or a
+        rate path (see utils.load_rate_path), in which case each rollover
+        gets the rates of the year it is issued.
+    reissue_end_date: No security is reissued after this date.
+    interpolation: How rates are found between the terms of interest_rates
+        (see curves.INTERPOLATIONS). With 'nearest', the default, the
+        result is the same as reissue_security's.
+
+    Returns:
+    DataFrame with the same rows, in the same order, as concatenating the
+    results of reissue_security.
+    """
+    row_index, issue_dates, maturity_dates = compute_reissue_schedule(df, reissue_end_date)
+
+    # Rate of each rollover's term, looked up from a table of distinct terms.
+    curve = RateCurve(interest_rates, interpolation)
+    issue_years = issue_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    interest_rate = curve.lookup(df['term_days'].to_numpy(), issue_years, row_index)
+
+    reissued = pd.DataFrame({
+        # Take from the arrays so categorical columns stay categorical.
+        'Security Class 1 Description': df['Security Class 1 Description'].array.take(row_index),
+        'Security Class 2 Description': df['Security Class 2 Description'].array.take(row_index),
+        'Interest Rate': interest_rate,
+        'Yield': interest_rate,
+        'Issue Date': issue_dates,
+        'Maturity Date': maturity_dates,
+        'Issued Amount (in Millions)': df['Issued Amount (in Millions)'].to_numpy()[row_index]
+    })
+    # Compact securities (see data.compact_securities) have already resolved Yield into Interest Rate.
+    if 'Yield' not in df.columns:
+        reissued = reissued.drop(columns='Yield')
+    return reissued
+
 ################################################################################
 #
 ################################################################################
@@ -210,4 +532,383 @@ def calculate_interest_payments(row: pd.Series) -> dict:
             # Update dictionary
             result[str(_year)] = interest_payment
     
-    return result
\ No newline at end of file
+    return result
+
+################################################################################
+#
+################################################################################
+
+def calculate_interest_matrix(df: pd.DataFrame) -> tuple:
+    """
+    Vectorized equivalent of applying calculate_interest_payments to every
+    row of df. Uses the same first-year, last-year and full-year proration
+    rules, computed for all securities at once.
+
+    Parameters:
+    df: Securities with 'Issue Date', 'Maturity Date', 'Interest Rate' and
+        'Issued Amount (in Millions)' columns, and 'Yield' unless the Bills
+        fallback has already been resolved (see data.compact_securities).
+
+    Returns:
+    (matrix, years) where matrix is a dense float64 array of shape
+    (len(df), len(years)) holding the interest paid by each security in
+    each year, and years is a sorted int array of every calendar year in
+    which at least one security is live.
+    """
+    issue_dates = df['Issue Date'].to_numpy()
+    maturity_dates = df['Maturity Date'].to_numpy()
+    year_issued = df['Issue Date'].dt.year.to_numpy()
+    year_matured = df['Maturity Date'].dt.year.to_numpy()
+    issue_amount = df['Issued Amount (in Millions)'].to_numpy(dtype=np.float64)
+    ## Bonds and Notes use interest rate. Bills don't have one; use yield.
+    interest_rate = df['Interest Rate'].to_numpy(dtype=np.float64)
+    if 'Yield' in df.columns:
+        interest_rate = np.where(np.isnan(interest_rate), df['Yield'].to_numpy(dtype=np.float64), interest_rate)
+    interest_rate = interest_rate / 100
+
+    if len(df) == 0:
+        return np.zeros((0, 0)), np.zeros(0, dtype=np.int64)
+
+    # Full-year payments for every year the security is live.
+    first_year = year_issued.min()
+    all_years = np.arange(first_year, year_matured.max() + 1)
+    is_live = (all_years >= year_issued[:, None]) & (all_years <= year_matured[:, None])
+    matrix = np.where(is_live, (issue_amount * interest_rate)[:, None], 0.0)
+
+    # Prorate the issuing and maturing years of multi-year securities.
+    rows = np.arange(len(df))
+    is_multi_year = year_issued != year_matured
+    fraction_of_year_remaining_after_issue = calculate_fraction_of_year_remaining(
+        df['Issue Date'].dt.month.to_numpy(), df['Issue Date'].dt.day.to_numpy())
+    fraction_of_year_elapsed_before_maturity = calculate_fraction_of_year_elapsed(
+        df['Maturity Date'].dt.month.to_numpy(), df['Maturity Date'].dt.day.to_numpy())
+    multi = rows[is_multi_year]
+    matrix[multi, year_issued[multi] - first_year] = (
+        fraction_of_year_remaining_after_issue[multi] * issue_amount[multi] * interest_rate[multi])
+    matrix[multi, year_matured[multi] - first_year] = (
+        fraction_of_year_elapsed_before_maturity[multi] * issue_amount[multi] * interest_rate[multi])
+
+    # Same-year securities only pay for the days between issue and maturity.
+    single = rows[~is_multi_year]
+    fraction_of_year_between_issue_and_maturity = calculate_fractions_of_year_between_issue_and_maturity(
+        issue_dates[single], maturity_dates[single])
+    matrix[single, year_issued[single] - first_year] = (
+        fraction_of_year_between_issue_and_maturity * issue_amount[single] * interest_rate[single])
+
+    # Drop years in which no security is live.
+    has_live_security = is_live.any(axis=0)
+
+    return matrix[:, has_live_security], all_years[has_live_security]
+
+def calculate_interest_totals(df: pd.DataFrame, groups: np.ndarray = None, num_groups: int = None) -> tuple:
+    """
+    calculate_interest_matrix summed over the securities in each group,
+    accumulated straight into per-year totals without the dense matrix.
+
+    A security pays a prorated amount in its issuing and maturing years and
+    a full year's interest in between, so the prorated years are summed
+    with bincount on year indices and the full years as a running sum of
+    start and end markers. Time and memory are proportional to the number
+    of securities plus the number of years rather than their product.
+
+    Parameters:
+    df: As for calculate_interest_matrix.
+    groups: Group index (0, 1, ...) of each security, e.g. factorized
+        security types. All securities are in one group if None.
+    num_groups: Number of groups, including any without securities.
+        Defaults to the highest group index plus one.
+
+    Returns:
+    (totals, years) where totals is a float64 array of shape
+    (number of groups, len(years)) and years is as returned by
+    calculate_interest_matrix.
+    """
+    ## Bonds and Notes use interest rate. Bills don't have one; use yield.
+    interest_rate = df['Interest Rate'].to_numpy(dtype=np.float64)
+    if 'Yield' in df.columns:
+        interest_rate = np.where(np.isnan(interest_rate), df['Yield'].to_numpy(dtype=np.float64), interest_rate)
+    contributions = calculate_interest_contributions(
+        df['Issue Date'].to_numpy(),
+        df['Maturity Date'].to_numpy(),
+        df['Issued Amount (in Millions)'].to_numpy(dtype=np.float64),
+        interest_rate)
+    return sum_interest_contributions(contributions, groups, num_groups)
+
+def calculate_interest_contributions(
+        issue_dates: np.ndarray,
+        maturity_dates: np.ndarray,
+        issue_amount: np.ndarray,
+        interest_rate: np.ndarray) -> dict:
+    """
+    What each security adds to the yearly totals of
+    calculate_interest_totals. Every value depends only on its own
+    security, so securities can be split up, their contributions computed
+    separately and put back together in any order before summing.
+
+    Parameters:
+    issue_dates, maturity_dates: datetime64 arrays.
+    issue_amount: Issued amount in millions.
+    interest_rate: Interest rate in percent, with bills' yields filled in.
+
+    Returns:
+    {
+        'year_issued', 'year_matured': int arrays of calendar years,
+        'yearly_interest': Interest for a full year,
+        'issue_year_interest': Interest in the issuing year, or between
+            issue and maturity for securities maturing in the year issued,
+        'maturity_year_interest': Interest in the maturing year
+    }
+    """
+    year_issued = issue_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    year_matured = maturity_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    interest_rate = interest_rate / 100
+    yearly_interest = issue_amount * interest_rate
+
+    # Prorate the issuing and maturing years of multi-year securities.
+    fraction_of_year_remaining_after_issue = calculate_fraction_of_year_remaining(*get_months_and_days(issue_dates))
+    fraction_of_year_elapsed_before_maturity = calculate_fraction_of_year_elapsed(*get_months_and_days(maturity_dates))
+    # Same-year securities only pay for the days between issue and maturity.
+    fraction_of_year_between_issue_and_maturity = calculate_fractions_of_year_between_issue_and_maturity(
+        issue_dates, maturity_dates)
+
+    is_multi_year = year_issued != year_matured
+    return {
+        'year_issued': year_issued,
+        'year_matured': year_matured,
+        'yearly_interest': yearly_interest,
+        'issue_year_interest': np.where(
+            is_multi_year,
+            fraction_of_year_remaining_after_issue * issue_amount * interest_rate,
+            fraction_of_year_between_issue_and_maturity * issue_amount * interest_rate),
+        'maturity_year_interest': fraction_of_year_elapsed_before_maturity * issue_amount * interest_rate
+    }
+
+def get_months_and_days(dates: np.ndarray) -> tuple:
+    """Month (1-12) and day of the month of each of datetime64 dates."""
+    months = dates.astype('datetime64[M]')
+    return months.astype(np.int64) % 12 + 1, (dates - months) // np.timedelta64(1, 'D') + 1
+
+def sum_interest_contributions(contributions: dict, groups: np.ndarray = None, num_groups: int = None) -> tuple:
+    """
+    Sums contributions, as returned by calculate_interest_contributions,
+    into per-year totals by group. Sums are taken in the order of the
+    securities, so the same securities in the same order always give the
+    same totals to the last bit. A group's totals are zero in years in
+    which none of its securities is live, however many years other groups
+    add to the year axis.
+
+    Returns:
+    (totals, years) as returned by calculate_interest_totals.
+    """
+    year_issued = contributions['year_issued']
+    year_matured = contributions['year_matured']
+    yearly_interest = contributions['yearly_interest']
+    if groups is None:
+        groups = np.zeros(len(year_issued), dtype=np.int64)
+    if num_groups is None:
+        num_groups = int(groups.max()) + 1 if len(year_issued) else 1
+    if len(year_issued) == 0:
+        return np.zeros((num_groups, 0)), np.zeros(0, dtype=np.int64)
+
+    first_year = year_issued.min()
+    all_years = np.arange(first_year, year_matured.max() + 1)
+    num_years = len(all_years)
+    issue_index = groups * num_years + (year_issued - first_year)
+    maturity_index = groups * num_years + (year_matured - first_year)
+    size = num_groups * num_years
+
+    # Full years strictly between the issuing and maturing years.
+    is_multi_year = year_issued != year_matured
+    full_years = (
+        np.bincount(issue_index[is_multi_year] + 1, yearly_interest[is_multi_year], minlength=size)
+        - np.bincount(maturity_index[is_multi_year], yearly_interest[is_multi_year], minlength=size))
+    totals = np.cumsum(full_years.reshape(num_groups, num_years), axis=1)
+
+    # Prorated issuing and maturing years, and same-year securities.
+    prorated = np.bincount(
+        issue_index[is_multi_year],
+        contributions['issue_year_interest'][is_multi_year],
+        minlength=size)
+    prorated += np.bincount(
+        maturity_index[is_multi_year],
+        contributions['maturity_year_interest'][is_multi_year],
+        minlength=size)
+    prorated += np.bincount(
+        issue_index[~is_multi_year],
+        contributions['issue_year_interest'][~is_multi_year],
+        minlength=size)
+    totals += prorated.reshape(num_groups, num_years)
+
+    # The running sum of a group need not cancel exactly once all its
+    # securities have matured, so zero it in years the group has none live.
+    live_size = num_groups * (num_years + 1)
+    live_securities = np.cumsum((
+        np.bincount(groups * (num_years + 1) + (year_issued - first_year), minlength=live_size)
+        - np.bincount(groups * (num_years + 1) + (year_matured - first_year + 1), minlength=live_size)
+    ).reshape(num_groups, num_years + 1), axis=1)[:, :-1]
+    totals[live_securities == 0] = 0
+
+    # Drop years in which no security is live.
+    has_live_security = live_securities.sum(axis=0) > 0
+
+    return totals[:, has_live_security], all_years[has_live_security]
+
+def get_term_buckets(issue_dates: np.ndarray, maturity_dates: np.ndarray, terms: list) -> np.ndarray:
+    """
+    Term bucket of each security: the index of the closest of terms (in
+    years) to its term. A rollover is in the same bucket as the security it
+    rolls over.
+    """
+    term_days = (np.asarray(maturity_dates) - np.asarray(issue_dates)) // np.timedelta64(1, 'D')
+    if len(term_days) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Terms span a few thousand days, so look buckets up in a table of every day.
+    first_day = term_days.min()
+    day_buckets = find_closest_value_indices(np.arange(first_day, term_days.max() + 1) / 365, terms)
+    return day_buckets[term_days - first_day]
+
+def add_up_buckets(bucket_totals: np.ndarray) -> np.ndarray:
+    """
+    Sums totals of shape (groups, term buckets, years) over term buckets,
+    one bucket at a time in order. Floating point sums depend on their
+    order, so partial sums by term bucket always add up to the same totals
+    to the last bit, however they were computed (see shards.py).
+    """
+    totals = np.zeros((bucket_totals.shape[0], bucket_totals.shape[2]))
+    for bucket in range(bucket_totals.shape[1]):
+        totals += bucket_totals[:, bucket]
+    return totals
+
+################################################################################
+#
+################################################################################
+
+def calculate_outstanding_totals(
+        issue_dates: np.ndarray,
+        maturity_dates: np.ndarray,
+        amounts: np.ndarray,
+        dates: np.ndarray,
+        groups: np.ndarray = None,
+        num_groups: int = None,
+        rolled_over: np.ndarray = None) -> np.ndarray:
+    """
+    Principal outstanding in each group at the end of each of dates: that of
+    securities issued on or before the date and maturing after it, or on it
+    if they are rolled over.
+
+    Each security is an issue event adding its amount and a maturity event
+    removing it. Events are placed on the sorted dates with searchsorted and
+    summed per group with bincount, and a running sum over dates sweeps
+    them into the principal outstanding, so time is proportional to the
+    number of securities plus the number of dates.
+
+    Parameters:
+    issue_dates, maturity_dates: datetime64 arrays.
+    amounts: Principal of each security.
+    dates: Sorted datetime64[D] dates to measure at, at the end of the day.
+    groups: Group index (0, 1, ...) of each security. All securities are in
+        one group if None.
+    num_groups: Number of groups, including any without securities.
+        Defaults to the highest group index plus one.
+    rolled_over: Boolean array of securities that are rolled over when they
+        mature. Their first rollover is issued the day after they mature
+        (see compute_reissue_schedule), so they stay outstanding through
+        their maturity date and the principal carries over with no gap.
+        Later rollovers are issued on the day the one before matures and
+        need no flag.
+
+    Returns:
+    float64 array of shape (number of groups, len(dates)).
+    """
+    if groups is None:
+        groups = np.zeros(len(amounts), dtype=np.int64)
+    if num_groups is None:
+        num_groups = int(groups.max()) + 1 if len(amounts) else 1
+    num_dates = len(dates)
+    # First date each event counts at; events after the last date drop out.
+    issue_index = np.searchsorted(dates, issue_dates.astype('datetime64[D]'))
+    maturity_index = np.searchsorted(dates, maturity_dates.astype('datetime64[D]'))
+    if rolled_over is not None:
+        maturity_index[rolled_over] = np.searchsorted(
+            dates, maturity_dates[rolled_over].astype('datetime64[D]'), side='right')
+    size = num_groups * (num_dates + 1)
+    events = (
+        np.bincount(groups * (num_dates + 1) + issue_index, amounts, minlength=size)
+        - np.bincount(groups * (num_dates + 1) + maturity_index, amounts, minlength=size))
+    return np.cumsum(events.reshape(num_groups, num_dates + 1), axis=1)[:, :-1]
+
+def calculate_outstanding_debt(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        reissue_end_date: pd.Timestamp,
+        terms: list,
+        dates: np.ndarray) -> np.ndarray:
+    """
+    Principal outstanding at the end of each of dates on the securities in
+    df and their rollovers, as reissued by reissue_maturing_securities in
+    main, without building the reissued securities.
+
+    Params:
+    df: Securities with 'Issue Date', 'Maturity Date', 'term_days' and
+        'Issued Amount (in Millions)' columns.
+    max_record_date: Securities maturing on or after this date are reissued.
+    reissue_end_date: No security is reissued after this date.
+    terms: Term buckets in years; each security is in the closest one.
+    dates: See calculate_outstanding_totals.
+
+    Returns:
+    Array of shape (2, len(terms), len(dates)) with the principal of the
+    securities in df, then of their rollovers, by term bucket.
+    """
+    issue_amount = df['Issued Amount (in Millions)'].to_numpy(dtype=np.float64)
+    bucket = find_closest_value_indices(df['term_days'].to_numpy() / 365, terms)
+    # Securities maturing on or after max_record_date are rolled over if the rollover is issued by reissue_end_date.
+    existing = calculate_outstanding_totals(
+        df['Issue Date'].to_numpy(), df['Maturity Date'].to_numpy(), issue_amount, dates, bucket, len(terms),
+        rolled_over=((df['Maturity Date'] >= max_record_date) & (df['Maturity Date'] < reissue_end_date)).to_numpy())
+
+    reissue_index = np.flatnonzero((df['Maturity Date'] >= max_record_date).to_numpy())
+    row_index, issue_dates, maturity_dates = compute_reissue_schedule(
+        df.iloc[reissue_index][['Maturity Date', 'term_days']], reissue_end_date)
+    row_index = reissue_index[row_index]
+    reissued = calculate_outstanding_totals(
+        issue_dates, maturity_dates, issue_amount[row_index], dates, bucket[row_index], len(terms))
+    return np.stack([existing, reissued])
+
+def calculate_new_debt_outstanding(
+    gdp_millions: int,
+    gdp_growth_rate: float,
+    new_debt_pct_gdp: float,
+    maturity_mix: dict,
+    start_date: pd.Timestamp,
+    end_date: pd.Timestamp,
+    terms: list,
+    dates: np.ndarray
+) -> np.ndarray:
+    """
+    Principal of new debt outstanding at the end of each of dates, in the
+    cohort model of issue_new_debt_cohorts.
+
+    Params:
+    terms: Term buckets in years; each term of maturity_mix is in the
+        closest one.
+    dates: See calculate_outstanding_totals.
+    Other params are the same as issue_new_debt_cohorts.
+
+    Returns:
+    Array of shape (len(terms), len(dates)).
+    """
+    schedule = schedule_new_debt(maturity_mix, start_date, end_date)
+    new_debt_amounts = compute_new_debt_amounts(
+        gdp_millions, gdp_growth_rate, new_debt_pct_gdp, len(schedule['cohort_years']))
+    bucket = find_closest_value_indices(schedule['terms'], terms)
+    # Tranches come first, and are rolled over if the rollover is issued by end_date.
+    is_tranche = np.arange(len(schedule['cohort'])) < len(schedule['cohort_years']) * len(schedule['terms'])
+    return calculate_outstanding_totals(
+        schedule['issue_dates'],
+        schedule['maturity_dates'],
+        new_debt_amounts[schedule['cohort']] * schedule['shares'][schedule['term']],
+        dates,
+        bucket[schedule['term']],
+        len(terms),
+        rolled_over=is_tranche & (schedule['maturity_dates'] < np.datetime64(end_date.date())))
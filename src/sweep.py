@@ -0,0 +1,382 @@
+import os
+import json
+import math
+import argparse
+import itertools
+import contextlib
+import numpy as np
+import pandas as pd
+from typing import Union
+from concurrent.futures import ProcessPoolExecutor
+from utils import load_config, parse_terms
+from data import load_securities
+from exposure import load_rate_exposure
+from simulation import build_new_debt_exposure
+from main import load_historical_gdps, run_scenario
+
+SCENARIO_PARAMETERS = [
+    'interest_rates',
+    'gdp_millions',
+    'gdp_growth_rate',
+    'new_debt_pct_gdp',
+    'new_debt_interest_rate',
+    'new_debt_maturity_mix',
+    'multiplier',
+]
+
+# Most scenarios a worker runs before writing them into a result cube.
+CUBE_BATCH_SIZE = 512
+
+# Columns of main.run_scenario kept in a result cube.
+CUBE_METRICS = [
+    'interest_payment',
+    'debt_millions',
+    'effective_rate',
+    'gdp_millions_end_of_year',
+    'pct_gdp',
+    'debt_pct_gdp',
+]
+
+def build_scenarios(spec: dict, defaults: dict) -> list:
+    """
+    Expands a scenario spec into a list of complete scenarios.
+
+    The spec holds a 'grid' mapping parameter names to lists of values, whose
+    cartesian product is taken, and/or a 'scenarios' list of explicit
+    parameter dicts. Parameters missing from a scenario come from defaults.
+
+    Params:
+    spec: {'grid': {param: [values]}, 'scenarios': [{param: value}]}
+    defaults: Value of every parameter in SCENARIO_PARAMETERS.
+
+    Returns:
+    List of dictionaries with every parameter in SCENARIO_PARAMETERS.
+    """
+    scenarios = []
+    grid = spec.get('grid', {})
+    if grid:
+        names = list(grid.keys())
+        for values in itertools.product(*(grid[name] for name in names)):
+            scenarios.append(dict(zip(names, values)))
+    scenarios.extend(spec.get('scenarios', []))
+
+    complete = []
+    for scenario in scenarios:
+        unknown = set(scenario) - set(SCENARIO_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown scenario parameters: {sorted(unknown)}")
+        scenario = {**defaults, **scenario}
+        # JSON only has string keys.
+        scenario['interest_rates'] = parse_terms(scenario['interest_rates'])
+        scenario['new_debt_maturity_mix'] = parse_terms(scenario['new_debt_maturity_mix'])
+        complete.append(scenario)
+    return complete
+
+################################################################################
+# Worker processes.
+################################################################################
+
+# Read-only inputs shared by every scenario; set once per worker process.
+_shared = {}
+# Result cube the worker writes to, if any (see open_cube).
+_cube = {}
+
+def _init_worker(
+        df: pd.DataFrame,
+        max_record_date: pd.Timestamp,
+        historical_gdps: pd.DataFrame,
+        reissue_end_date: pd.Timestamp,
+        new_debt: bool,
+        rate_exposures: dict,
+        new_debt_exposures: dict,
+        cube_dir: str = None) -> None:
+    _shared.update(
+        df=df,
+        max_record_date=max_record_date,
+        historical_gdps=historical_gdps,
+        reissue_end_date=reissue_end_date,
+        new_debt=new_debt,
+        rate_exposures=rate_exposures,
+        new_debt_exposures=new_debt_exposures
+    )
+    # Each worker maps the cube once and writes its scenarios' slices into it.
+    _cube.clear()
+    if cube_dir is not None:
+        _cube.update(open_cube(cube_dir, mode='r+'))
+
+def _run_scenario(scenario: dict) -> pd.DataFrame:
+    shared = dict(_shared)
+    rate_exposures = shared.pop('rate_exposures')
+    rate_exposure = rate_exposures.get(tuple(sorted(scenario['interest_rates'])))
+    new_debt_exposures = shared.pop('new_debt_exposures')
+    new_debt_exposure = new_debt_exposures.get(tuple(sorted(scenario['new_debt_maturity_mix'].items())))
+    # Per-scenario progress output would interleave across workers.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return run_scenario(
+            **shared, **scenario, write_intermediates=False,
+            rate_exposure=rate_exposure, new_debt_exposure=new_debt_exposure)
+
+def _run_cube_batch(first_scenario_id: int, scenarios: list) -> None:
+    write_cube_slice(_cube, first_scenario_id, [_run_scenario(scenario) for scenario in scenarios])
+
+################################################################################
+# Result cubes.
+################################################################################
+
+def create_cube(cube_dir: str, scenarios: list, years: np.ndarray, metrics: list = CUBE_METRICS) -> dict:
+    """
+    Preallocates an on-disk scenario x year x metric cube of NaNs in
+    cube_dir, for workers to write their results into (see
+    write_cube_slice).
+
+    The cube is stored as values.npy, with scenarios as the fastest-varying
+    axis, so one year and metric across every scenario is a single
+    contiguous read. Workers write batches of consecutive scenarios, so
+    each write is a contiguous run per year and metric rather than a value.
+    Alongside it are scenarios.csv, the parameters of each scenario by
+    scenario_id, and cube.json, the years and metrics.
+
+    Params:
+    scenarios: As returned by build_scenarios.
+    years: Years of the cube's year axis.
+    metrics: Columns of main.run_scenario to keep.
+
+    Returns:
+    The cube, as returned by open_cube.
+    """
+    os.makedirs(cube_dir, exist_ok=True)
+    values = np.lib.format.open_memmap(
+        os.path.join(cube_dir, 'values.npy'), mode='w+', dtype=np.float64,
+        shape=(len(metrics), len(years), len(scenarios)))
+    values[:] = np.nan
+    values.flush()
+    del values
+
+    index = pd.DataFrame(scenarios)[SCENARIO_PARAMETERS]
+    for name in ['interest_rates', 'new_debt_maturity_mix']:
+        index[name] = index[name].map(json.dumps)
+    index.rename_axis('scenario_id').to_csv(os.path.join(cube_dir, 'scenarios.csv'))
+    with open(os.path.join(cube_dir, 'cube.json'), 'w') as f:
+        json.dump({'years': [int(year) for year in years], 'metrics': list(metrics)}, f, indent=2)
+    return open_cube(cube_dir)
+
+def open_cube(cube_dir: str, mode: str = 'r') -> dict:
+    """
+    Maps a result cube without reading it; slices are only read from disk
+    when used, e.g. cube['values'][:, cube['year_index'][2040],
+    cube['metric_index']['pct_gdp']] for every scenario's pct_gdp in 2040.
+
+    Params:
+    mode: 'r' to read, 'r+' to write slices.
+
+    Returns:
+    {
+        'values': scenario x year x metric memmap view,
+        'scenarios': DataFrame of scenario parameters indexed by scenario_id,
+        'years': int array of years,
+        'metrics': list of metrics,
+        'year_index': {year: position on the year axis},
+        'metric_index': {metric: position on the metric axis}
+    }
+    """
+    with open(os.path.join(cube_dir, 'cube.json')) as f:
+        metadata = json.load(f)
+    values = np.load(os.path.join(cube_dir, 'values.npy'), mmap_mode=mode)
+    years = np.array(metadata['years'], dtype=np.int64)
+    return {
+        'values': values.transpose(2, 1, 0),
+        'scenarios': pd.read_csv(os.path.join(cube_dir, 'scenarios.csv'), index_col='scenario_id'),
+        'years': years,
+        'metrics': metadata['metrics'],
+        'year_index': {int(year): i for i, year in enumerate(years)},
+        'metric_index': {metric: i for i, metric in enumerate(metadata['metrics'])}
+    }
+
+def write_cube_slice(cube: dict, first_scenario_id: int, results: list) -> None:
+    """
+    Writes the results of consecutive scenarios from first_scenario_id on,
+    as returned by main.run_scenario, into their slice of a cube opened
+    with mode 'r+', and flushes it. Years outside the cube are dropped.
+    """
+    block = np.full((len(results), len(cube['years']), len(cube['metrics'])), np.nan)
+    for i, result in enumerate(results):
+        years = result.index.astype(int).to_numpy()
+        is_in_cube = np.isin(years, cube['years'])
+        year_index = np.searchsorted(cube['years'], years[is_in_cube])
+        block[i, year_index] = result[cube['metrics']].to_numpy(dtype=np.float64)[is_in_cube]
+    cube['values'][first_scenario_id:first_scenario_id + len(results)] = block
+    cube['values'].base.flush()
+
+def slice_cube(cube: dict, year: int, metric: str) -> pd.Series:
+    """One metric in one year across every scenario, indexed by scenario_id."""
+    values = cube['values'][:, cube['year_index'][year], cube['metric_index'][metric]]
+    return pd.Series(np.array(values), index=cube['scenarios'].index, name=metric)
+
+################################################################################
+#
+################################################################################
+
+def run_sweep(
+        raw_data_path: str,
+        historical_gdps_path: str,
+        output_path: str,
+        reissue_end_date: pd.Timestamp,
+        new_debt: bool,
+        security_types: list,
+        scenarios: list,
+        cache_dir: str = None,
+        max_workers: int = None,
+        use_rate_exposure: bool = False,
+        cube_dir: str = None
+) -> Union[pd.DataFrame, dict]:
+    """
+    Runs many scenarios against one load of the securities data.
+
+    Securities are loaded and preprocessed once, handed to each worker
+    process once, and the scenarios are spread across a process pool. With
+    new_debt, the new debt exposure (see
+    simulation.build_new_debt_exposure) only depends on the maturity mix,
+    so it is built once per distinct mix up front and shared the same way.
+
+    Params:
+    scenarios: As returned by build_scenarios.
+    max_workers: Number of worker processes. Defaults to the number of CPUs.
+    use_rate_exposure: Build one rate exposure per distinct set of interest
+        rate terms up front, so each scenario is a matrix-vector product.
+    cube_dir: Write results into a memory-mapped result cube in this
+        directory instead of output_path (see create_cube). Each worker
+        runs batches of up to CUBE_BATCH_SIZE consecutive scenarios and
+        writes each batch's slice directly, so results are never gathered
+        in the main process.
+    Other params are the same as main.
+
+    Returns:
+    Long-format DataFrame with one row per scenario and year, with the
+    scenario parameters alongside the per-year results, also written to
+    output_path. With cube_dir, the cube as returned by open_cube.
+    """
+    df, max_record_date = load_securities(raw_data_path, security_types, cache_dir)
+    historical_gdps = load_historical_gdps(historical_gdps_path)
+
+    rate_exposures = {}
+    if use_rate_exposure:
+        for scenario in scenarios:
+            terms = tuple(sorted(scenario['interest_rates']))
+            if terms not in rate_exposures:
+                rate_exposures[terms] = load_rate_exposure(
+                    df, max_record_date, list(terms), reissue_end_date, cache_dir)
+
+    new_debt_exposures = {}
+    if new_debt:
+        for scenario in scenarios:
+            maturity_mix = tuple(sorted(scenario['new_debt_maturity_mix'].items()))
+            if maturity_mix not in new_debt_exposures:
+                new_debt_exposures[maturity_mix] = build_new_debt_exposure(
+                    scenario['new_debt_maturity_mix'], max_record_date, reissue_end_date)
+
+    if cube_dir is not None:
+        # Every year a scenario can have GDP for.
+        years = np.union1d(
+            historical_gdps.index.astype(int), np.arange(max_record_date.year, reissue_end_date.year + 1))
+        create_cube(cube_dir, scenarios, years)
+
+    print(f"Running {len(scenarios)} scenarios...")
+    with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(
+                df, max_record_date, historical_gdps, reissue_end_date, new_debt, rate_exposures,
+                new_debt_exposures, cube_dir)) as executor:
+        if cube_dir is None:
+            results = list(executor.map(_run_scenario, scenarios))
+        else:
+            # Enough batches to keep every worker busy to the end.
+            num_workers = max_workers or os.cpu_count() or 1
+            batch_size = max(min(CUBE_BATCH_SIZE, math.ceil(len(scenarios) / (num_workers * 4))), 1)
+            starts = range(0, len(scenarios), batch_size)
+            list(executor.map(
+                _run_cube_batch, starts, [scenarios[start:start + batch_size] for start in starts]))
+    print("Complete.")
+
+    if cube_dir is not None:
+        print(f"Wrote {len(scenarios)} scenarios to {cube_dir}")
+        return open_cube(cube_dir)
+
+    frames = []
+    for scenario_id, (scenario, result) in enumerate(zip(scenarios, results)):
+        result = result.rename_axis('year').reset_index()
+        result.insert(0, 'scenario_id', scenario_id)
+        for i, name in enumerate(SCENARIO_PARAMETERS):
+            value = scenario[name]
+            if name in ['interest_rates', 'new_debt_maturity_mix']:
+                value = json.dumps(value)
+            result.insert(1 + i, name, value)
+        frames.append(result)
+    sweep_df = pd.concat(frames, axis=0, ignore_index=True)
+
+    sweep_df.to_csv(output_path, index=False)
+    print(f"Wrote {len(sweep_df)} rows to {output_path}")
+    return sweep_df
+
+if __name__ == "__main__":
+    """
+    Runs a batch of scenarios from a JSON or YAML spec, e.g.
+
+    {
+        "grid": {
+            "gdp_growth_rate": [4.0, 5.0, 6.0],
+            "new_debt_pct_gdp": [5.0, 7.0]
+        },
+        "scenarios": [
+            {"interest_rates": {"1": 5.0, "10": 4.5, "30": 4.6}}
+        ]
+    }
+
+    Parameters not given in the spec default to the values in the config.
+    """
+    # Load config.
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(current_dir, 'config_old.yml')
+    config = load_config(config_path)
+
+    parser = argparse.ArgumentParser(description='Run a batch of debt management scenarios.')
+    parser.add_argument('scenarios', help='Path to a JSON or YAML scenario spec.')
+    parser.add_argument('--new-debt', action='store_true', help='Flag to issue new debt (default: false)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs).')
+    parser.add_argument('--output', default=None,
+                        help='Output .csv path (default: output_path from config with a _sweep suffix).')
+    parser.add_argument('--rate-exposure', action='store_true',
+                        help='Evaluate interest rates against cached rate exposure matrices instead of simulating each security.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always parse the raw .csv instead of using the preprocessed snapshot in cache_dir.')
+    parser.add_argument('--cube', default=None, metavar='DIR',
+                        help='Write results into a memory-mapped scenario x year x metric cube in DIR instead of a .csv.')
+    args = parser.parse_args()
+
+    defaults = {
+        'interest_rates': config['simulation']['interest_rates_default'],
+        'gdp_millions': config['simulation']['gdp_millions'],
+        'gdp_growth_rate': config['simulation']['gdp_growth_rate'],
+        'new_debt_pct_gdp': config['simulation']['new_debt_pct_gdp'],
+        'new_debt_interest_rate': config['simulation']['new_debt_interest_rate'],
+        'new_debt_maturity_mix': config['simulation']['new_debt_maturity_mix'],
+        'multiplier': config['simulation']['multiplier'],
+    }
+    # YAML is a superset of JSON, so either format loads.
+    scenarios = build_scenarios(load_config(args.scenarios), defaults)
+    output_path = args.output or '{}_sweep.csv'.format(os.path.splitext(config['io']['output_path'])[0])
+
+    run_sweep(
+        raw_data_path=config['io']['raw_data_path'],
+        historical_gdps_path=config['io']['historical_gdps_path'],
+        output_path=output_path,
+        reissue_end_date=pd.to_datetime(config['simulation']['reissue_end_date']),
+        new_debt=args.new_debt,
+        security_types=config['simulation']['security_types'],
+        scenarios=scenarios,
+        cache_dir=None if args.no_cache else config['io'].get('cache_dir'),
+        max_workers=args.workers,
+        use_rate_exposure=args.rate_exposure,
+        cube_dir=args.cube
+    )
@@ -0,0 +1,226 @@
+"""
+Synthetic MSPD-shaped data, so the pipeline can be run and benchmarked
+without the real MSPD_DetailSecty .csv.
+
+The generated file has the columns read by data.USECOLS (plus Security
+Type Description and Outstanding Amount) and the quirks preprocessing
+deals with:
+* Monthly record dates, newest first, with every security listed in each
+  month it is outstanding, so the same security appears many times.
+* Reopenings: Notes, Bonds and TIPS issued again under the same CUSIP
+  with a later issue date.
+* 'Total ...' rows for every security type and record date, with '*'
+  amounts.
+* Bills with no interest rate, only a yield.
+* Security types the simulation filters out (TIPS and FRNs).
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# Class 1 description: (terms, term unit, share of securities)
+SECURITY_TYPES = {
+    'Bills Maturity Value': ([28, 56, 91, 119, 182, 364], 'days', 0.55),
+    'Notes': ([2, 3, 5, 7, 10], 'years', 0.30),
+    'Bonds': ([20, 30], 'years', 0.07),
+    'Inflation-Protected Securities': ([5, 10, 30], 'years', 0.05),
+    'Floating Rate Notes': ([2], 'years', 0.03),
+}
+
+# Rough history of short rates (percent) used to price securities by issue date.
+RATE_HISTORY = {
+    2000: 6.0, 2001: 3.5, 2003: 1.0, 2004: 1.5, 2006: 5.0, 2007: 4.5,
+    2008: 1.5, 2009: 0.1, 2015: 0.2, 2017: 1.2, 2019: 2.2, 2020: 0.1,
+    2022: 1.5, 2023: 5.3, 2024: 5.3
+}
+
+COLUMNS = [
+    'Record Date',
+    'Security Type Description',
+    'Security Class 1 Description',
+    'Security Class 2 Description',
+    'Interest Rate',
+    'Yield',
+    'Issue Date',
+    'Maturity Date',
+    'Issued Amount (in Millions)',
+    'Outstanding Amount (in Millions)'
+]
+
+def add_years(dates: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """Adds whole years to datetime64[D] dates, clipping to the end of the month (e.g. Feb 29)."""
+    months = dates.astype('datetime64[M]')
+    day = (dates - months.astype('datetime64[D]')).astype(np.int64)
+    new_months = months + 12 * years
+    days_in_month = ((new_months + 1).astype('datetime64[D]') - new_months.astype('datetime64[D]')).astype(np.int64)
+    return new_months.astype('datetime64[D]') + np.minimum(day, days_in_month - 1)
+
+def format_dates(dates: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(dates, unit='D')
+
+def generate_mspd(
+        num_securities: int,
+        last_record_date: str = '2024-05-31',
+        first_issue_date: str = '2000-01-01',
+        record_months: int = 12,
+        reopen_fraction: float = 0.1,
+        seed: int = 0) -> pd.DataFrame:
+    """
+    Generates raw MSPD records.
+
+    Params:
+    num_securities: Number of distinct (CUSIP, issue date) securities.
+    last_record_date: Newest record date; the max record date of the data.
+    first_issue_date: Securities are issued uniformly between this and
+        last_record_date.
+    record_months: Number of monthly record dates. Securities outstanding
+        on a record date are listed on it; others are listed once, at the
+        end of the month they were issued in.
+    reopen_fraction: Fraction of securities that are reopenings.
+    seed: Random seed; the same arguments always give the same data.
+
+    Returns:
+    DataFrame with COLUMNS, all as strings as in the raw .csv.
+    """
+    rng = np.random.default_rng(seed)
+    last_record_date = np.datetime64(last_record_date, 'D')
+    first_issue_date = np.datetime64(first_issue_date, 'D')
+    num_reopened = int(num_securities * reopen_fraction)
+    num_original = num_securities - num_reopened
+
+    # Original issues.
+    type_names = np.array(list(SECURITY_TYPES))
+    shares = np.array([share for _, _, share in SECURITY_TYPES.values()])
+    type_index = rng.choice(len(type_names), num_original, p=shares / shares.sum())
+    issue_dates = first_issue_date + rng.integers(0, (last_record_date - first_issue_date).astype(int) + 1, num_original)
+    maturity_dates = np.empty(num_original, dtype='datetime64[D]')
+    term_years = np.zeros(num_original)
+    for i, (terms, unit, _) in enumerate(SECURITY_TYPES.values()):
+        is_type = type_index == i
+        term = rng.choice(terms, is_type.sum())
+        if unit == 'days':
+            maturity_dates[is_type] = issue_dates[is_type] + term
+            term_years[is_type] = term / 365
+        else:
+            maturity_dates[is_type] = add_years(issue_dates[is_type], term)
+            term_years[is_type] = term
+    cusip_numbers = np.arange(num_original)
+
+    # Rates follow the short rate at issue plus a term premium, with coupons in eighths.
+    knot_years = np.array(list(RATE_HISTORY), dtype=np.float64)
+    issue_years = issue_dates.astype('datetime64[D]').astype(np.int64) / 365.25 + 1970
+    short_rate = np.interp(issue_years, knot_years, list(RATE_HISTORY.values()))
+    yields = np.maximum(short_rate + 0.6 * np.log1p(term_years) + rng.normal(0, 0.15, num_original), 0.01).round(3)
+    interest_rates = np.maximum(np.floor(yields * 8) / 8, 0.125)
+    is_bill = type_names[type_index] == 'Bills Maturity Value'
+    interest_rates[is_bill] = np.nan
+    amounts = np.round(rng.lognormal(np.log(np.where(is_bill, 50000, 25000)), 0.5), 2)
+
+    # Reopenings share the CUSIP, coupon and maturity of an earlier coupon security.
+    can_reopen = np.flatnonzero(~is_bill & (issue_dates + 180 < np.minimum(maturity_dates, last_record_date)))
+    parents = rng.choice(can_reopen, num_reopened) if len(can_reopen) else np.zeros(0, dtype=np.int64)
+    reopen_dates = issue_dates[parents] + rng.integers(28, 180, len(parents))
+    securities = pd.DataFrame({
+        'type_index': np.concatenate([type_index, type_index[parents]]),
+        'cusip_number': np.concatenate([cusip_numbers, cusip_numbers[parents]]),
+        'interest_rate': np.concatenate([interest_rates, interest_rates[parents]]),
+        'yield': np.concatenate([yields, yields[parents]]),
+        'issue_date': np.concatenate([issue_dates, reopen_dates]),
+        'maturity_date': np.concatenate([maturity_dates, maturity_dates[parents]]),
+        'amount': np.concatenate([amounts, np.round(amounts[parents] / 2, 2)])
+    })
+
+    # List each security on every record date it is outstanding.
+    record_dates = (np.arange(
+        last_record_date.astype('datetime64[M]') - record_months + 1,
+        last_record_date.astype('datetime64[M]') + 1) + 1).astype('datetime64[D]') - 1
+    record_dates[-1] = last_record_date
+    issue = securities['issue_date'].to_numpy()
+    maturity = securities['maturity_date'].to_numpy()
+    first = np.searchsorted(record_dates, issue, side='left')
+    last = np.searchsorted(record_dates, maturity, side='left')
+    num_listings = np.maximum(last - first, 0)
+    # Not outstanding on any record date: one listing at the end of the month of issue.
+    unlisted = num_listings == 0
+    unlisted_record_date = (issue.astype('datetime64[M]') + 1).astype('datetime64[D]') - 1
+    num_listings[unlisted] = 1
+    row = np.repeat(np.arange(len(securities)), num_listings)
+    offset = np.arange(len(row)) - np.repeat(np.cumsum(num_listings) - num_listings, num_listings)
+    listing_dates = np.where(
+        unlisted[row],
+        unlisted_record_date[row],
+        record_dates[np.minimum(first[row] + offset, len(record_dates) - 1)])
+
+    cusips = np.array(['912' + np.base_repr(n, 36).zfill(6) for n in range(num_original)])
+    listings = securities.iloc[row].reset_index(drop=True)
+    raw = pd.DataFrame({
+        'Record Date': format_dates(listing_dates),
+        'Security Type Description': 'Marketable',
+        'Security Class 1 Description': type_names[listings['type_index'].to_numpy()],
+        'Security Class 2 Description': cusips[listings['cusip_number'].to_numpy()],
+        'Interest Rate': listings['interest_rate'].to_numpy(),
+        'Yield': listings['yield'].to_numpy(),
+        'Issue Date': format_dates(listings['issue_date'].to_numpy()),
+        'Maturity Date': format_dates(listings['maturity_date'].to_numpy()),
+        'Issued Amount (in Millions)': listings['amount'].map('{:.2f}'.format).to_numpy(),
+        'Outstanding Amount (in Millions)': listings['amount'].map('{:.2f}'.format).to_numpy()
+    })
+
+    # Totals per security type and record date.
+    totals = pd.DataFrame(
+        [(date, name) for date in format_dates(record_dates) for name in type_names],
+        columns=['Record Date', 'Security Class 1 Description'])
+    totals['Security Type Description'] = 'Marketable'
+    totals['Security Class 2 Description'] = 'Total ' + totals['Security Class 1 Description']
+    totals['Issued Amount (in Millions)'] = '*'
+    totals['Outstanding Amount (in Millions)'] = '*'
+
+    raw = pd.concat([raw, totals], axis=0, ignore_index=True)[COLUMNS]
+    return raw.sort_values('Record Date', ascending=False, kind='stable').reset_index(drop=True)
+
+def generate_historical_gdps(first_year: int = 1990, last_year: int = 2023) -> pd.DataFrame:
+    """End of year GDPs in the format of historical_gdps_path, growing about 5% a year."""
+    years = np.arange(first_year, last_year + 1)
+    gdps = 27_000_000 * 1.05 ** (years - last_year)
+    return pd.DataFrame({'year': years, 'gdp_millions_end_of_year': gdps.astype(np.int64)})
+
+def write_synthetic_data(num_securities: int, data_dir: str, seed: int = 0) -> tuple:
+    """
+    Writes generate_mspd and generate_historical_gdps output to data_dir,
+    reusing files from earlier calls with the same arguments.
+
+    Returns:
+    (raw_data_path, historical_gdps_path)
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    raw_data_path = os.path.join(data_dir, f"mspd_{num_securities}_{seed}.csv")
+    historical_gdps_path = os.path.join(data_dir, "historical_gdps.csv")
+    if not os.path.exists(raw_data_path):
+        print(f"Generating {num_securities} synthetic securities...")
+        tmp_path = f"{raw_data_path}.tmp"
+        generate_mspd(num_securities, seed=seed).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, raw_data_path)
+    if not os.path.exists(historical_gdps_path):
+        generate_historical_gdps().to_csv(historical_gdps_path, index=False)
+    return raw_data_path, historical_gdps_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a synthetic MSPD .csv.')
+    parser.add_argument('num_securities', type=int, help='Number of distinct securities.')
+    parser.add_argument('output', help='Output .csv path.')
+    parser.add_argument('--record-months', type=int, default=12, help='Number of monthly record dates.')
+    parser.add_argument('--last-record-date', default='2024-05-31', help='Newest record date.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--historical-gdps', default=None, help='Also write historical GDPs to this path.')
+    args = parser.parse_args()
+
+    raw = generate_mspd(
+        args.num_securities,
+        last_record_date=args.last_record_date,
+        record_months=args.record_months,
+        seed=args.seed)
+    raw.to_csv(args.output, index=False)
+    print(f"Wrote {len(raw)} records to {args.output}")
+    if args.historical_gdps:
+        generate_historical_gdps().to_csv(args.historical_gdps, index=False)
@@ -1,4 +1,5 @@
 import yaml
+import numpy as np
 import pandas as pd
 from typing import List, Union
 
@@ -10,6 +11,55 @@ def load_config(config_path: str) -> dict:
 ################################################################################
 #
 ################################################################################
+
+def load_rate_path(rate_path_path: str) -> pd.DataFrame:
+    """
+    Load interest rates that change from year to year from a .csv with a
+    'year' column and one column per term in years, e.g.
+
+    year,1,2,5,10,30
+    2024,4.99,4.60,4.20,4.22,4.35
+    2025,4.50,4.30,4.10,4.15,4.30
+
+    An optional 'new_debt' column holds the rate for new debt each year.
+    """
+    rate_path = pd.read_csv(rate_path_path, index_col='year').sort_index()
+    rate_path.columns = [col if col == 'new_debt' else parse_term(col) for col in rate_path.columns]
+    return rate_path
+
+# Units a term can be given in, as a suffix, and how many make a year.
+TERM_UNITS = {'w': 52, 'm': 12, 'y': 1}
+
+def parse_term(term: Union[str, float]) -> Union[int, float]:
+    """
+    Term in years from a config or JSON key, in years (e.g. 10 or 0.5) or
+    with a unit suffix of weeks, months or years (e.g. '26w', '3m', '10y').
+    Whole years as int, fractions of a year (e.g. 0.5 for 26 week bills) as
+    float.
+    """
+    if isinstance(term, str) and term.strip()[-1:].lower() in TERM_UNITS:
+        term = term.strip()
+        term = float(term[:-1]) / TERM_UNITS[term[-1].lower()]
+    term = float(term)
+    return int(term) if term.is_integer() else term
+
+def parse_terms(interest_rates: dict) -> dict:
+    """interest_rates with its keys converted by parse_term."""
+    return {parse_term(term): rate for term, rate in interest_rates.items()}
+
+def get_rates_by_year(rate_path: Union[pd.Series, pd.DataFrame], years: np.ndarray) -> np.ndarray:
+    """
+    Rows of a rate path (indexed by year) for each of years. Years after the
+    last row use the last row's rates and years before the first row use the
+    first row's, so a path only needs to list the years where rates change.
+    """
+    path_years = rate_path.index.to_numpy()
+    row = np.clip(np.searchsorted(path_years, np.asarray(years), side='right') - 1, 0, len(path_years) - 1)
+    return rate_path.to_numpy(dtype=np.float64)[row]
+
+################################################################################
+#
+################################################################################
     
 def find_closest_value_index(number: float, values: List[Union[int, float]]) -> int:
     """
@@ -20,17 +70,26 @@ def find_closest_value_index(number: float, values: List[Union[int, float]]) ->
     diffs = list(map(lambda x: abs(x - number), values))
     return diffs.index(min(diffs))
 
+def find_closest_value_indices(numbers: np.ndarray, values: List[Union[int, float]]) -> np.ndarray:
+    """
+    Array version of find_closest_value_index. Ties go to the first of the
+    values, as with list.index.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return np.abs(values[None, :] - np.asarray(numbers, dtype=np.float64)[:, None]).argmin(axis=1)
+
 ################################################################################
 #
 ################################################################################
   
 def calculate_fraction_of_year_remaining(_month: int, _day: int) -> float:
-    """Use for issuing year."""
+    """Use for issuing year. Also accepts arrays of months and days."""
     days_in_month = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
     total_days_in_year = 365
 
     # Calculate total number of days that have passed in the year up to the given date.
-    days_passed = sum(days_in_month[:_month - 1]) + _day
+    days_before_month = np.cumsum([0] + days_in_month[:-1])
+    days_passed = days_before_month[np.asarray(_month) - 1] + _day
 
     return (total_days_in_year - days_passed) / total_days_in_year
 
@@ -39,12 +98,13 @@ def calculate_fraction_of_year_remaining(_month: int, _day: int) -> float:
 ################################################################################
 
 def calculate_fraction_of_year_elapsed(_month: int, _day: int) -> float:
-    """Use for maturing year."""
+    """Use for maturing year. Also accepts arrays of months and days."""
     days_in_month = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
     total_days_in_year = 365
 
     # Calculate total number of days that have passed in the year up to the given date.
-    days_passed = sum(days_in_month[:_month - 1]) + _day
+    days_before_month = np.cumsum([0] + days_in_month[:-1])
+    days_passed = days_before_month[np.asarray(_month) - 1] + _day
 
     return days_passed / total_days_in_year
 
@@ -71,3 +131,26 @@ def calculate_fraction_of_year_between_issue_and_maturity(
     total_days_in_year = 365
     
     return days_between / total_days_in_year
+
+################################################################################
+#
+################################################################################
+
+def calculate_fractions_of_year_between_issue_and_maturity(
+        issue_dates: np.ndarray,
+        maturity_dates: np.ndarray) -> np.ndarray:
+    """
+    Array version of calculate_fraction_of_year_between_issue_and_maturity.
+    The caller is responsible for only using the result where issue and
+    maturity dates fall in the same calendar year.
+
+    Parameters:
+    issue_dates: datetime64 array
+    maturity_dates: datetime64 array
+
+    Returns: float array (fractions of a year)
+    """
+    days_between = (maturity_dates - issue_dates) // np.timedelta64(1, 'D')
+    total_days_in_year = 365
+
+    return days_between / total_days_in_year
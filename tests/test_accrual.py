@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from accrual import build_coupon_schedule, calculate_exact_interest
+
+def securities(*rows) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=[
+        'Security Class 1 Description', 'Interest Rate', 'Yield', 'Issue Date', 'Maturity Date',
+        'Issued Amount (in Millions)'])
+    df['Issue Date'] = pd.to_datetime(df['Issue Date'])
+    df['Maturity Date'] = pd.to_datetime(df['Maturity Date'])
+    return df
+
+# A 4% two year note pays coupons of 20 per 1000 on Aug 15 and Feb 15.
+NOTE = ('Notes', 4.0, np.nan, '2023-02-15', '2025-02-15', 1000.0)
+# Reopened three months later, so the first coupon only accrues for 92 of its 181 days.
+REOPENING = ('Notes', 4.0, np.nan, '2023-05-15', '2025-02-15', 1000.0)
+# Month end maturity: the coupon period runs from Aug 31 to Feb 28.
+MONTH_END = ('Notes', 4.0, np.nan, '2024-08-31', '2025-02-28', 1000.0)
+# 13 week bill at a 5.2% investment yield, issued in a leap year.
+BILL = ('Bills Maturity Value', np.nan, 5.2, '2024-01-04', '2024-04-04', 1000.0)
+
+def exact(*rows, **kwargs) -> dict:
+    totals, labels = calculate_exact_interest(securities(*rows), **kwargs)
+    return dict(zip(labels, totals[0]))
+
+def test_coupon_schedule():
+    df = securities(NOTE, MONTH_END)
+    security_index, coupon_dates, previous_coupon_dates = build_coupon_schedule(
+        df['Issue Date'].to_numpy().astype('datetime64[D]'), df['Maturity Date'].to_numpy().astype('datetime64[D]'))
+    np.testing.assert_array_equal(security_index, [0, 0, 0, 0, 1])
+    np.testing.assert_array_equal(np.sort(coupon_dates[security_index == 0]), np.array(
+        ['2023-08-15', '2024-02-15', '2024-08-15', '2025-02-15'], dtype='datetime64[D]'))
+    assert coupon_dates[4] == np.datetime64('2025-02-28')
+    assert previous_coupon_dates[4] == np.datetime64('2024-08-31')
+
+def test_coupons_accrue_actual_actual():
+    # Aug 16 to Dec 31 is 138 of the 184 days from Aug 15 2023 to Feb 15 2024, and again a year later.
+    expected = {'2023': 20 + 20 * 138 / 184, '2024': 20 * 46 / 184 + 20 + 20 * 138 / 184, '2025': 20 * 46 / 184}
+    np.testing.assert_allclose(list(exact(NOTE).values()), list(expected.values()))
+    assert list(exact(NOTE)) == list(expected)
+    assert exact(REOPENING)['2023'] == 20 * 92 / 181 + 20 * 138 / 184
+    np.testing.assert_allclose(list(exact(MONTH_END).values()), [20 * 122 / 181, 20 * 59 / 181])
+
+def test_cash_basis():
+    np.testing.assert_allclose(list(exact(NOTE, cash_basis=True).values()), [20, 40, 20])
+    # The interest accrued before issue is paid back out of the first coupon.
+    np.testing.assert_allclose(exact(REOPENING, cash_basis=True)['2023'], 20 - 20 * 89 / 181)
+
+def test_bill_discount():
+    discount = 1000 * (1 - 1 / (1 + 0.052 * 91 / 366))
+    np.testing.assert_allclose(exact(BILL)['2024'], discount)
+    np.testing.assert_allclose(exact(BILL, cash_basis=True)['2024'], discount)
+    # March has 31 of the bill's 91 days.
+    np.testing.assert_allclose(exact(BILL, period='month')['2024-03'], discount * 31 / 91)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import generate_mspd
+from data import load_securities
+from simulation import reissue_securities, calculate_interest_totals
+from backtest import run_backtest, summarize_backtest
+
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+INTEREST_RATES = {1: 4.2, 2: 3.8, 3: 3.6, 5: 3.4, 7: 3.4, 10: 3.4, 20: 3.4, 30: 3.5}
+
+@pytest.fixture(scope='module')
+def securities(tmp_path_factory):
+    raw_data_path = str(tmp_path_factory.mktemp('synthetic') / 'mspd.csv')
+    generate_mspd(300, record_months=48).to_csv(raw_data_path, index=False)
+    return load_securities(raw_data_path, SECURITY_TYPES, first_record_dates=True)
+
+def test_projections_match_as_of_reruns(securities):
+    df, max_record_date = securities
+    result = run_backtest(df, max_record_date, list(INTEREST_RATES), INTEREST_RATES)
+    reissue_end_date = pd.Timestamp(year=max_record_date.year - 1, month=12, day=31)
+    as_of_dates = result['as_of'].unique()
+    assert len(as_of_dates) > 12
+
+    for as_of in as_of_dates[::7]:
+        # Only what was known on the record date, reissued from it.
+        known = df[df['First Record Date'] <= as_of].reset_index(drop=True)
+        reissued = reissue_securities(
+            known[known['Maturity Date'] >= as_of].reset_index(drop=True), INTEREST_RATES, reissue_end_date)
+        totals, years = calculate_interest_totals(pd.concat([known, reissued], axis=0, ignore_index=True))
+        expected = pd.Series(totals[0], index=years)
+        projected = result[result['as_of'] == as_of].set_index('year')['projected']
+        np.testing.assert_allclose(projected, expected.reindex(projected.index, fill_value=0), rtol=1e-9)
+
+def test_realized_is_latest_data(securities):
+    df, max_record_date = securities
+    result = run_backtest(df, max_record_date, list(INTEREST_RATES))
+    totals, years = calculate_interest_totals(df)
+    realized = result.groupby('year')['realized'].first()
+    np.testing.assert_allclose(realized, pd.Series(totals[0], index=years)[realized.index], rtol=1e-12)
+    assert (result['year'] < max_record_date.year).all()
+    summary = summarize_backtest(result)
+    assert summary['projections'].sum() == len(result)
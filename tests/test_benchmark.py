@@ -0,0 +1,36 @@
+import pandas as pd
+from utils import parse_terms
+from benchmark import compare_results, run_benchmarks
+
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+SCENARIO = {
+    'interest_rates': parse_terms({'1': 4.2, '2': 3.8, '5': 3.4, '10': 3.4, '30': 3.5}),
+    'gdp_millions': 29176000,
+    'gdp_growth_rate': 5.0,
+    'new_debt_pct_gdp': 7.0,
+    'new_debt_interest_rate': 3.7,
+    'new_debt_maturity_mix': {1: 0.5, 10: 0.5},
+    'multiplier': 1.19,
+}
+
+def report(*stages) -> dict:
+    return {'results': [
+        {'securities': 100, 'horizon': None, 'stage': stage, 'seconds': seconds, 'rows': None}
+        for stage, seconds in stages]}
+
+def test_compare_results():
+    comparison = compare_results(
+        report(('parse', 1.0), ('reissue', 1.0), ('accrual', 0.01), ('groupby', 1.0)),
+        report(('parse', 1.5), ('reissue', 0.5), ('accrual', 0.04), ('aggregate', 1.0)))
+    status = comparison.set_index('stage')['status'].to_dict()
+    assert status == {
+        'parse': 'slower', 'reissue': 'faster', 'accrual': '', 'groupby': 'missing', 'aggregate': 'new'}
+
+def test_run_benchmarks(tmp_path):
+    results = run_benchmarks(
+        [200], ['2027-12-31'], SCENARIO, SECURITY_TYPES, repeats=1, legacy_sample=50, data_dir=str(tmp_path))
+    stages = set(pd.DataFrame(results['results'])['stage'])
+    for stage in [
+            'parse', 'simulate/accrual', 'new_debt', 'aggregate', 'by_security/simulate/groupby',
+            'by_security/simulate/type_groupby', 'legacy/simulate/reissue', 'legacy/new_debt', 'legacy/aggregate']:
+        assert stage in stages
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import write_synthetic_data
+from data import load_securities
+from utils import load_rate_path
+from curves import RateCurve
+from exposure import build_rate_exposure, evaluate_rate_exposure
+from main import simulate_security_types
+
+REISSUE_END_DATE = pd.Timestamp('2032-12-31')
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+INTEREST_RATES = {1: 4.2, 2: 3.8, 5: 3.4, 10: 3.4, 30: 3.5}
+
+@pytest.fixture(scope='module')
+def securities(tmp_path_factory):
+    raw_data_path, _ = write_synthetic_data(200, str(tmp_path_factory.mktemp('synthetic')))
+    return load_securities(raw_data_path, SECURITY_TYPES)
+
+@pytest.fixture
+def rate_path_path(tmp_path):
+    path = tmp_path / 'rate_path.csv'
+    rows = [','.join(['year', *map(str, INTEREST_RATES), 'new_debt'])]
+    rows += [','.join([str(year), *map(str, INTEREST_RATES.values()), '3.7']) for year in [2026, 2024, 2028]]
+    path.write_text('\n'.join(rows) + '\n')
+    return str(path)
+
+def test_load_rate_path(rate_path_path):
+    rate_path = load_rate_path(rate_path_path)
+    assert list(rate_path.index) == [2024, 2026, 2028]
+    assert list(rate_path.columns) == [*INTEREST_RATES, 'new_debt']
+
+def test_rate_path_rejects_other_columns(rate_path_path):
+    with pytest.raises(ValueError, match='new_debt'):
+        RateCurve(load_rate_path(rate_path_path))
+
+def test_constant_path_matches_curve(securities, rate_path_path):
+    df, max_record_date = securities
+    rate_path = load_rate_path(rate_path_path)
+    rate_path.pop('new_debt')
+    expected = simulate_security_types(df, max_record_date, REISSUE_END_DATE, INTEREST_RATES)
+    result = simulate_security_types(df, max_record_date, REISSUE_END_DATE, rate_path)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+    rate_exposure = build_rate_exposure(df, max_record_date, list(INTEREST_RATES), REISSUE_END_DATE)
+    np.testing.assert_allclose(
+        evaluate_rate_exposure(rate_exposure, rate_path), evaluate_rate_exposure(rate_exposure, INTEREST_RATES))
+
+def test_interpolations():
+    curve = {1: 4.0, 2: 3.0, 10: 5.0, 30: 5.0}
+    term_years = np.array([0.25, 1.5, 6.0, 10.0, 40.0])
+    np.testing.assert_allclose(RateCurve(curve, 'nearest').get_rates(term_years), [4.0, 4.0, 3.0, 5.0, 5.0])
+    np.testing.assert_allclose(RateCurve(curve, 'linear').get_rates(term_years), [4.0, 3.5, 4.0, 5.0, 5.0])
+    cubic = RateCurve(curve, 'monotone_cubic').get_rates(np.linspace(0, 40, 81))
+    # Never overshoots: flat from 10 years on and monotone between terms.
+    np.testing.assert_allclose(cubic[20:], 5.0)
+    assert (np.diff(cubic[2:5]) <= 0).all() and (np.diff(cubic[4:21]) >= 0).all()
+    assert cubic.min() >= 3.0 - 1e-12
+    with pytest.raises(ValueError):
+        RateCurve(curve, 'cubic')
@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pandas as pd
+from synthetic import write_synthetic_data
+from data import (
+    USECOLS, preprocess_securities, convert_securities, compact_securities, report_memory_usage, read_securities,
+    load_securities, get_cache_path)
+
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+
+def test_cached_snapshot_matches_csv(tmp_path):
+    raw_data_path, _ = write_synthetic_data(200, str(tmp_path / 'synthetic'))
+    cache_dir = str(tmp_path / 'cache')
+    expected, expected_max_record_date = load_securities(raw_data_path, SECURITY_TYPES)
+
+    # The first load writes the snapshot, the second reads it back.
+    for _ in range(2):
+        df, max_record_date = load_securities(raw_data_path, SECURITY_TYPES, cache_dir=cache_dir)
+        pd.testing.assert_frame_equal(df, expected, check_exact=True)
+        assert max_record_date == expected_max_record_date
+    assert os.listdir(cache_dir) == [os.path.basename(get_cache_path(raw_data_path, SECURITY_TYPES, cache_dir))]
+
+def test_cache_key_covers_contents_and_types(tmp_path):
+    raw_data_path, _ = write_synthetic_data(50, str(tmp_path))
+    cache_path = get_cache_path(raw_data_path, SECURITY_TYPES, str(tmp_path))
+    assert get_cache_path(raw_data_path, SECURITY_TYPES[:2], str(tmp_path)) != cache_path
+    with open(raw_data_path, 'a') as file:
+        file.write('\n')
+    assert get_cache_path(raw_data_path, SECURITY_TYPES, str(tmp_path)) != cache_path
+
+def test_streaming_matches_whole_file(tmp_path):
+    raw_data_path, _ = write_synthetic_data(300, str(tmp_path))
+    raw = pd.read_csv(raw_data_path, usecols=USECOLS)
+    expected, expected_max_record_date = preprocess_securities(raw, SECURITY_TYPES)
+    expected = expected.reset_index(drop=True)
+    for chunk_size in [97, 1000, len(raw)]:
+        df, max_record_date = read_securities(raw_data_path, SECURITY_TYPES, chunk_size)
+        pd.testing.assert_frame_equal(df, expected, check_exact=True)
+        assert max_record_date == expected_max_record_date
+
+def test_first_record_dates(tmp_path):
+    raw_data_path, _ = write_synthetic_data(300, str(tmp_path))
+    raw = pd.read_csv(raw_data_path, usecols=USECOLS)
+    first_record_date = raw.groupby(['Security Class 2 Description', 'Issue Date'])['Record Date'].min()
+    expected = None
+    for chunk_size in [97, len(raw)]:
+        df, _ = read_securities(raw_data_path, SECURITY_TYPES, chunk_size, first_record_dates=True)
+        keys = pd.MultiIndex.from_arrays([
+            df['Security Class 2 Description'].astype(str), df['Issue Date'].dt.strftime('%Y-%m-%d')])
+        np.testing.assert_array_equal(df['First Record Date'], pd.to_datetime(first_record_date.loc[keys]))
+        if expected is not None:
+            pd.testing.assert_frame_equal(df, expected, check_exact=True)
+        expected = df
+
+def test_compact_securities(tmp_path):
+    raw_data_path, _ = write_synthetic_data(300, str(tmp_path))
+    raw = pd.read_csv(raw_data_path, usecols=USECOLS, dtype={'Issued Amount (in Millions)': str})
+    raw = raw[~raw['Security Class 2 Description'].str.contains('Total')]
+    converted, _ = convert_securities(raw.drop_duplicates(['Security Class 2 Description', 'Issue Date']))
+    df = compact_securities(converted)
+
+    assert 'Yield' not in df.columns
+    assert df['Security Class 1 Description'].dtype == 'category'
+    assert df['Security Class 2 Description'].dtype == 'category'
+    assert df['term_days'].dtype == np.int32
+    is_bill = converted['Interest Rate'].isna()
+    assert is_bill.any()
+    np.testing.assert_array_equal(df['Interest Rate'][is_bill], converted['Yield'][is_bill])
+    np.testing.assert_array_equal(df['Interest Rate'][~is_bill], converted['Interest Rate'][~is_bill])
+    pd.testing.assert_frame_equal(compact_securities(df), df)
+    assert report_memory_usage(converted, df).loc['Total', 'ratio'] > 1
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import write_synthetic_data
+from data import load_securities
+from main import simulate_security_types
+from exposure import build_rate_exposure, evaluate_rate_exposure
+
+REISSUE_END_DATE = pd.Timestamp('2035-12-31')
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+TERMS = [1, 2, 3, 5, 7, 10, 20, 30]
+
+@pytest.fixture(scope='module')
+def securities(tmp_path_factory):
+    raw_data_path, _ = write_synthetic_data(300, str(tmp_path_factory.mktemp('synthetic')))
+    return load_securities(raw_data_path, SECURITY_TYPES)
+
+def resimulate(securities, interest_rates: dict, **kwargs) -> pd.Series:
+    df, max_record_date = securities
+    return simulate_security_types(df, max_record_date, REISSUE_END_DATE, interest_rates, **kwargs).sum()
+
+@pytest.mark.parametrize('rates', [
+    [4.2, 3.8, 3.6, 3.4, 3.4, 3.4, 3.4, 3.5],
+    [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
+])
+def test_exposure_matches_resimulation(securities, rates):
+    df, max_record_date = securities
+    rate_exposure = build_rate_exposure(df, max_record_date, TERMS, REISSUE_END_DATE)
+    interest_rates = dict(zip(TERMS, rates))
+    expected = resimulate(securities, interest_rates)
+    pd.testing.assert_series_equal(evaluate_rate_exposure(rate_exposure, interest_rates), expected, check_names=False)
+
+def test_exposure_rejects_other_terms(securities):
+    df, max_record_date = securities
+    rate_exposure = build_rate_exposure(df, max_record_date, TERMS, REISSUE_END_DATE)
+    with pytest.raises(ValueError):
+        evaluate_rate_exposure(rate_exposure, {1: 4.0, 10: 4.0})
+
+@pytest.mark.parametrize('terms', [TERMS, [0.25, 2, 10, 30]])
+def test_linear_exposure_matches_resimulation(securities, terms):
+    df, max_record_date = securities
+    rate_exposure = build_rate_exposure(df, max_record_date, terms, REISSUE_END_DATE, interpolation='linear')
+    interest_rates = dict(zip(terms, np.linspace(5.0, 3.0, len(terms))))
+    expected = resimulate(securities, interest_rates, rate_interpolation='linear')
+    pd.testing.assert_series_equal(
+        evaluate_rate_exposure(rate_exposure, interest_rates), expected, check_names=False, rtol=1e-9)
+    # Nearest rates differ wherever a term falls between two of the curve's.
+    nearest = resimulate(securities, interest_rates)
+    assert not np.allclose(nearest, expected, rtol=1e-6)
+
+def test_monotone_cubic_has_no_exposure(securities):
+    df, max_record_date = securities
+    with pytest.raises(ValueError):
+        build_rate_exposure(df, max_record_date, TERMS, REISSUE_END_DATE, interpolation='monotone_cubic')
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from synthetic import generate_mspd
+from data import load_securities
+from incremental import simulate_interest, update_incremental
+
+REISSUE_END_DATE = pd.Timestamp('2035-12-31')
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+INTEREST_RATES = {1: 4.2, 2: 3.8, 3: 3.6, 5: 3.4, 7: 3.4, 10: 3.4, 20: 3.4, 30: 3.5}
+
+def test_appended_month_matches_rebuild(tmp_path):
+    raw = generate_mspd(3000)
+    last_record_date = raw['Record Date'].max()
+    raw_data_path = str(tmp_path / 'mspd.csv')
+    state_dir = str(tmp_path / 'incremental')
+
+    # State as of the month before, then the month's records appended.
+    raw[raw['Record Date'] < last_record_date].to_csv(raw_data_path, index=False)
+    _, old_max_record_date, _ = update_incremental(
+        raw_data_path, SECURITY_TYPES, INTEREST_RATES, REISSUE_END_DATE, state_dir)
+    raw.to_csv(raw_data_path, index=False)
+    df, max_record_date, yearly = update_incremental(
+        raw_data_path, SECURITY_TYPES, INTEREST_RATES, REISSUE_END_DATE, state_dir)
+    assert old_max_record_date < max_record_date
+
+    expected_df, expected_max_record_date = load_securities(raw_data_path, SECURITY_TYPES)
+    expected = simulate_interest(expected_df, expected_max_record_date, INTEREST_RATES, REISSUE_END_DATE)
+    assert max_record_date == expected_max_record_date
+    assert len(df) == len(expected_df)
+    pd.testing.assert_index_equal(yearly.index, expected.index)
+    np.testing.assert_array_equal(yearly['live_securities'], expected['live_securities'])
+    np.testing.assert_allclose(yearly['interest_payment'], expected['interest_payment'], rtol=1e-9)
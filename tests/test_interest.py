@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from simulation import calculate_interest_payments, calculate_interest_matrix, calculate_interest_totals
+
+SECURITIES = pd.DataFrame({
+    'Security Class 1 Description': ['Bills Maturity Value', 'Notes', 'Bonds', 'Notes'],
+    'Security Class 2 Description': ['A', 'B', 'C', 'D'],
+    'Interest Rate': [np.nan, 2.5, 4.0, 1.0],
+    'Yield': [5.1, np.nan, np.nan, np.nan],
+    'Issue Date': pd.to_datetime(['2023-03-02', '2020-02-15', '2001-11-15', '2024-12-31']),
+    'Maturity Date': pd.to_datetime(['2023-06-01', '2025-02-15', '2031-11-15', '2026-12-31']),
+    'Issued Amount (in Millions)': [30000.0, 45000.0, 20000.0, 1000.0]
+})
+
+def test_matrix_matches_rows():
+    matrix, years = calculate_interest_matrix(SECURITIES)
+    rows = SECURITIES.assign(
+        year_issued=SECURITIES['Issue Date'].dt.year,
+        month_issued=SECURITIES['Issue Date'].dt.month,
+        day_issued=SECURITIES['Issue Date'].dt.day,
+        year_matured=SECURITIES['Maturity Date'].dt.year,
+        month_matured=SECURITIES['Maturity Date'].dt.month,
+        day_matured=SECURITIES['Maturity Date'].dt.day)
+    for i, (_, row) in enumerate(rows.iterrows()):
+        payments = calculate_interest_payments(row)
+        expected = np.array([payments.get(str(year), 0.0) for year in years])
+        np.testing.assert_array_equal(matrix[i], expected)
+
+def test_totals_match_matrix_by_group():
+    matrix, years = calculate_interest_matrix(SECURITIES)
+    groups = np.array([0, 1, 2, 1])
+    totals, total_years = calculate_interest_totals(SECURITIES, groups)
+    np.testing.assert_array_equal(total_years, years)
+    for group in range(3):
+        np.testing.assert_allclose(totals[group], matrix[groups == group].sum(axis=0), rtol=1e-12, atol=1e-9)
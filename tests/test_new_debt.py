@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils import parse_term, parse_terms
+from simulation import compute_new_debt_amounts, issue_new_debt_cohorts
+
+START_DATE = pd.Timestamp('2024-05-31')
+END_DATE = pd.Timestamp('2030-12-31')
+
+def test_parse_term():
+    assert [parse_term(term) for term in ['1', '0.5', 30, '26w', '3m', '18M', '10y']] == [1, 0.5, 30, 0.5, 0.25, 1.5, 10]
+    assert isinstance(parse_term('10y'), int)
+    with pytest.raises(ValueError):
+        parse_term('10d')
+
+def issue(maturity_mix: dict, interest_rates: dict) -> tuple:
+    return issue_new_debt_cohorts(
+        gdp_millions=29176000,
+        gdp_growth_rate=5.0,
+        new_debt_pct_gdp=7.0,
+        interest_rates=interest_rates,
+        maturity_mix=parse_terms(maturity_mix),
+        start_date=START_DATE,
+        end_date=END_DATE)
+
+def test_cohorts_roll_over_at_curve_rates():
+    interest, years = issue({'3m': 0.5, '10y': 0.5}, {0.25: 5.0, 2: 3.0, 10: 4.0})
+    assert interest.shape == (len(years), END_DATE.year - START_DATE.year + 1, 2)
+    amounts = compute_new_debt_amounts(29176000, 5.0, 7.0, interest.shape[1])
+
+    # Rollovers follow each other without gaps, so once every cohort to date
+    # is issued, each pays about a year of interest at its term's rate.
+    year = list(years).index(2028)
+    num_cohorts = 2028 - START_DATE.year + 1
+    np.testing.assert_allclose(interest[year, :num_cohorts, 0], amounts[:num_cohorts] * 0.5 * 0.05, rtol=0.01)
+    np.testing.assert_allclose(interest[year, :num_cohorts, 1], amounts[:num_cohorts] * 0.5 * 0.04, rtol=0.01)
+    assert (interest[year, num_cohorts:] == 0).all()
+
+def test_mix_keys_in_units_match_years():
+    interest_rates = {1: 4.2, 2: 3.8, 10: 3.4}
+    in_units, _ = issue({'26w': 0.25, '2y': 0.25, '10y': 0.5}, interest_rates)
+    in_years, _ = issue({'0.5': 0.25, '2': 0.25, '10': 0.5}, interest_rates)
+    np.testing.assert_array_equal(in_units, in_years)
+    with pytest.raises(ValueError):
+        issue({'1': 0.5, '2': 0.25}, interest_rates)
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from simulation import calculate_outstanding_debt, calculate_new_debt_outstanding, compute_new_debt_amounts
+
+MAX_RECORD_DATE = pd.Timestamp('2024-05-31')
+REISSUE_END_DATE = pd.Timestamp('2030-12-31')
+TERMS = [1, 2, 5]
+
+def every_day(start: str, end: str) -> np.ndarray:
+    return np.arange(np.datetime64(start), np.datetime64(end) + 1)
+
+def test_outstanding_is_flat_across_rollovers():
+    # Terms of 91 days, 2 years and 5 years, maturing on, after and right before the record date.
+    df = pd.DataFrame({
+        'Issue Date': pd.to_datetime(['2024-03-01', '2023-06-30', '2019-05-31']),
+        'Maturity Date': pd.to_datetime(['2024-05-31', '2025-06-29', '2024-05-30']),
+        'term_days': [91, 730, 1827],
+        'Issued Amount (in Millions)': [100.0, 250.0, 1000.0]
+    })
+    dates = every_day('2024-05-31', '2030-12-30')
+    outstanding = calculate_outstanding_debt(df, MAX_RECORD_DATE, REISSUE_END_DATE, TERMS, dates).sum(axis=(0, 1))
+    # The 5 year security matured before the record date and is not rolled over.
+    np.testing.assert_array_equal(outstanding, np.full(len(dates), 350.0))
+
+def test_outstanding_runs_off_after_reissue_end_date():
+    df = pd.DataFrame({
+        'Issue Date': pd.to_datetime(['2024-03-01']),
+        'Maturity Date': pd.to_datetime(['2024-05-31']),
+        'term_days': [91],
+        'Issued Amount (in Millions)': [100.0]
+    })
+    dates = every_day('2030-12-31', '2031-12-31')
+    outstanding = calculate_outstanding_debt(df, MAX_RECORD_DATE, REISSUE_END_DATE, TERMS, dates).sum(axis=(0, 1))
+    assert outstanding[0] == 100.0
+    assert outstanding[-1] == 0.0
+
+def test_new_debt_outstanding_only_grows_by_cohort():
+    maturity_mix = {1: 0.5, 2: 0.3, 5: 0.2}
+    dates = every_day('2024-06-01', '2030-12-30')
+    outstanding = calculate_new_debt_outstanding(
+        1000000, 5.0, 7.0, maturity_mix, MAX_RECORD_DATE, REISSUE_END_DATE, TERMS, dates).sum(axis=0)
+    # New debt is only ever rolled over, so outstanding is every cohort issued so far.
+    cohort_totals = np.cumsum(compute_new_debt_amounts(1000000, 5.0, 7.0, 7))
+    cohort = dates.astype('datetime64[Y]').astype(np.int64) + 1970 - 2024
+    np.testing.assert_allclose(outstanding, cohort_totals[cohort], rtol=1e-12)
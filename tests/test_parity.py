@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import write_synthetic_data
+from data import load_securities
+from main import (
+    load_historical_gdps, reissue_maturing_securities, simulate_securities, simulate_security_types, run_scenario)
+
+# Short enough for the row-by-row legacy paths.
+REISSUE_END_DATE = pd.Timestamp('2027-12-31')
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+INTEREST_RATES = {1: 4.2, 2: 3.8, 3: 3.6, 5: 3.4, 7: 3.4, 10: 3.4, 20: 3.4, 30: 3.5}
+
+@pytest.fixture(scope='module')
+def data(tmp_path_factory):
+    raw_data_path, historical_gdps_path = write_synthetic_data(300, str(tmp_path_factory.mktemp('synthetic')))
+    df, max_record_date = load_securities(raw_data_path, SECURITY_TYPES)
+    return df, max_record_date, load_historical_gdps(historical_gdps_path)
+
+def run(data, **kwargs) -> pd.DataFrame:
+    df, max_record_date, historical_gdps = data
+    return run_scenario(
+        df=df,
+        max_record_date=max_record_date,
+        historical_gdps=historical_gdps,
+        reissue_end_date=REISSUE_END_DATE,
+        new_debt=False,
+        interest_rates=INTEREST_RATES,
+        gdp_millions=29176000,
+        gdp_growth_rate=5.0,
+        new_debt_pct_gdp=7.0,
+        new_debt_interest_rate=3.7,
+        multiplier=1.19,
+        write_intermediates=False,
+        **kwargs)
+
+def test_reissue_matches_legacy(data):
+    df, max_record_date, _ = data
+    legacy = reissue_maturing_securities(df, max_record_date, REISSUE_END_DATE, INTEREST_RATES, legacy_reissue=True)
+    vectorized = reissue_maturing_securities(df, max_record_date, REISSUE_END_DATE, INTEREST_RATES)
+    assert len(vectorized) > len(df)
+    for column in ['Issue Date', 'Maturity Date', 'Interest Rate', 'Issued Amount (in Millions)']:
+        np.testing.assert_array_equal(
+            vectorized[column].to_numpy(dtype=legacy[column].dtype), legacy[column].to_numpy(), err_msg=column)
+    np.testing.assert_array_equal(
+        vectorized['Security Class 1 Description'].astype(str), legacy['Security Class 1 Description'].astype(str))
+
+def test_scenario_matches_legacy(data):
+    vectorized = run(data)
+    legacy = run(data, legacy_reissue=True, legacy_accrual=True)
+    pd.testing.assert_frame_equal(vectorized, legacy, check_exact=True)
+
+def test_security_types_match_securities(data):
+    df, max_record_date, _ = data
+    by_security = simulate_securities(df, max_record_date, REISSUE_END_DATE, INTEREST_RATES)
+    expected = by_security.drop('id', axis=1).groupby('security_type', observed=True).sum()
+    type_totals = simulate_security_types(df, max_record_date, REISSUE_END_DATE, INTEREST_RATES)
+    assert list(type_totals.index) == sorted(map(str, expected.index))
+    pd.testing.assert_frame_equal(
+        type_totals, expected.set_axis(expected.index.astype(str)), check_index_type=False, check_names=False)
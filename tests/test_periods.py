@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from periods import calculate_interest_by_period, get_label_years, get_label_dates
+
+SECURITIES = pd.DataFrame({
+    'Interest Rate': [np.nan, 2.5, 4.0, 1.0, 3.0],
+    'Yield': [5.1, np.nan, np.nan, np.nan, np.nan],
+    'Issue Date': pd.to_datetime(['2023-03-02', '2020-02-15', '2001-11-15', '2024-12-31', '2023-10-01']),
+    'Maturity Date': pd.to_datetime(['2023-06-01', '2025-02-15', '2031-11-15', '2026-12-31', '2023-10-20']),
+    'Issued Amount (in Millions)': [30000.0, 45000.0, 20000.0, 1000.0, 500.0]
+})
+GROUPS = np.array([0, 1, 1, 0, 2])
+
+def by_label(period: str) -> pd.DataFrame:
+    totals, labels = calculate_interest_by_period(SECURITIES, period, GROUPS)
+    return pd.DataFrame(totals, columns=labels)
+
+@pytest.mark.parametrize('period', ['quarter', 'month'])
+def test_periods_add_up_to_years(period):
+    years = by_label('year')
+    totals = by_label(period)
+    summed = totals.T.groupby(get_label_years(totals.columns).astype(str)).sum().T
+    pd.testing.assert_frame_equal(summed, years, rtol=1e-12)
+
+def test_months_add_up_to_fiscal_years():
+    fiscal_years = by_label('fiscal_year')
+    months = by_label('month')
+    first_days, last_days = get_label_dates('fiscal_year', fiscal_years.columns)
+    month_days = get_label_dates('month', months.columns)[0]
+    fiscal_year = np.searchsorted(last_days, month_days)
+    assert (month_days >= first_days[fiscal_year]).all()
+    summed = months.T.groupby(fiscal_years.columns[fiscal_year]).sum().T
+    pd.testing.assert_frame_equal(summed, fiscal_years, rtol=1e-12)
+    np.testing.assert_allclose(fiscal_years.sum(axis=1), by_label('year').sum(axis=1), rtol=1e-12)
+
+def test_full_calendar_year_pays_annual_interest():
+    years = by_label('year')
+    # Only the 2.5% and 4% notes are outstanding through 2021, a 365 day year, and 2024, a leap year.
+    np.testing.assert_allclose(years.loc[1, ['2021', '2024']], 45000 * 0.025 + 20000 * 0.04)
+    # 19 days of 3% in October 2023.
+    assert by_label('month').loc[2, '2023-10'] == pytest.approx(500 * 0.03 * 19 / 365)
+    assert 'FY2024' in by_label('fiscal_year').columns
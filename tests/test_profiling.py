@@ -0,0 +1,35 @@
+import json
+import numpy as np
+from profiling import stage, stage_iter, start_profiling, stop_profiling, get_report_path
+
+def test_stages_nest_and_accumulate(tmp_path):
+    with stage('unprofiled') as info:
+        info['rows'] = 1
+    profiler = start_profiling(trace_memory=True)
+    try:
+        with stage('outer'):
+            for chunk in stage_iter('chunk', [np.zeros(3), np.zeros(4)]):
+                with stage('work') as info:
+                    info['rows'] = len(chunk)
+            with stage('allocate'):
+                kept = np.ones(2**20)
+        report = profiler.write_report(str(tmp_path / 'report.json'), num_shards=2)
+    finally:
+        stop_profiling()
+
+    stages = {record['stage']: record for record in report['stages']}
+    assert list(stages) == ['outer', 'outer/chunk', 'outer/work', 'outer/allocate']
+    # One step per chunk plus the one that finds the iterator exhausted.
+    assert stages['outer/chunk']['calls'] == 3
+    assert stages['outer/chunk']['rows'] == 7
+    assert stages['outer/work']['calls'] == 2
+    assert stages['outer/work']['rows'] == 7
+    assert stages['outer/allocate']['traced_delta_mb'] >= kept.nbytes / 2**20 * 0.99
+    assert stages['outer']['traced_peak_mb'] >= stages['outer/allocate']['traced_peak_mb']
+    assert stages['outer']['wall_s'] >= stages['outer/allocate']['wall_s']
+    assert report['num_shards'] == 2
+    with open(tmp_path / 'report.json') as f:
+        assert json.load(f)['stages'] == report['stages']
+
+def test_report_path():
+    assert get_report_path('output/out.csv') == 'output/out_profile.json'
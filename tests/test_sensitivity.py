@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import write_synthetic_data
+from data import load_securities
+from main import load_historical_gdps, run_scenario
+from sensitivity import compute_sensitivities
+
+REISSUE_END_DATE = pd.Timestamp('2035-12-31')
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+SCENARIO = {
+    'interest_rates': {1: 4.2, 2: 3.8, 5: 3.4, 10: 3.4, 30: 3.5},
+    'gdp_millions': 29176000,
+    'gdp_growth_rate': 5.0,
+    'new_debt_pct_gdp': 7.0,
+    'new_debt_interest_rate': 3.7,
+    'new_debt_maturity_mix': {1: 0.4, 3: 0.3, 10: 0.3},
+    'multiplier': 1.19,
+}
+# Linear inputs are bumped by a lot, so the rounding of run_scenario's output is small next to the change.
+BUMPS = {'interest_rates': 1.0, 'new_debt_pct_gdp': 1.0, 'multiplier': 0.1}
+# Half the step of the reruns of inputs the output is not linear in.
+STEP = 0.25
+
+@pytest.fixture(scope='module')
+def data(tmp_path_factory):
+    raw_data_path, historical_gdps_path = write_synthetic_data(200, str(tmp_path_factory.mktemp('synthetic')))
+    df, max_record_date = load_securities(raw_data_path, SECURITY_TYPES)
+    return df, max_record_date, load_historical_gdps(historical_gdps_path)
+
+def rerun(data, legacy_new_debt, rate_interpolation, **params) -> pd.DataFrame:
+    df, max_record_date, historical_gdps = data
+    return run_scenario(
+        df=df,
+        max_record_date=max_record_date,
+        historical_gdps=historical_gdps,
+        reissue_end_date=REISSUE_END_DATE,
+        new_debt=True,
+        legacy_new_debt=legacy_new_debt,
+        rate_interpolation=rate_interpolation,
+        write_intermediates=False,
+        **{**SCENARIO, **params})
+
+@pytest.mark.parametrize('legacy_new_debt,rate_interpolation', [(False, 'nearest'), (False, 'linear'), (True, 'nearest')])
+def test_sensitivities_match_bump_and_rerun(data, legacy_new_debt, rate_interpolation):
+    df, max_record_date, historical_gdps = data
+    sensitivities = compute_sensitivities(
+        df, max_record_date, historical_gdps, REISSUE_END_DATE, True, **SCENARIO,
+        legacy_new_debt=legacy_new_debt, rate_interpolation=rate_interpolation, bumps=BUMPS)
+    base = rerun(data, legacy_new_debt, rate_interpolation)
+    years = sensitivities.loc['interest_payment'].index
+    assert len(years) > 10
+
+    def compare(name, change):
+        change = change.set_axis(change.index.astype(str)).loc[years]
+        # Interest is rounded to hundredths and interest / GDP to 5 decimals.
+        np.testing.assert_allclose(
+            sensitivities.loc['interest_payment'][name], change['interest_payment'], rtol=1e-3, atol=0.02, err_msg=name)
+        np.testing.assert_allclose(
+            sensitivities.loc['pct_gdp'][name], change['pct_gdp'], rtol=1e-3, atol=3e-5, err_msg=name)
+
+    for term, rate in SCENARIO['interest_rates'].items():
+        bumped = rerun(data, legacy_new_debt, rate_interpolation,
+                       interest_rates={**SCENARIO['interest_rates'], term: rate + BUMPS['interest_rates']})
+        compare(f'interest_rate_{term}', bumped - base)
+    bumped = rerun(data, legacy_new_debt, rate_interpolation,
+                   new_debt_pct_gdp=SCENARIO['new_debt_pct_gdp'] + BUMPS['new_debt_pct_gdp'])
+    compare('new_debt_pct_gdp', bumped - base)
+    bumped = rerun(data, legacy_new_debt, rate_interpolation, multiplier=SCENARIO['multiplier'] + BUMPS['multiplier'])
+    compare('multiplier', bumped - base)
+
+    # Central differences, scaled to the default bumps.
+    for name, bump in [('gdp_growth_rate', 0.1), ('new_debt_interest_rate', 0.01)]:
+        up = rerun(data, legacy_new_debt, rate_interpolation, **{name: SCENARIO[name] + STEP})
+        down = rerun(data, legacy_new_debt, rate_interpolation, **{name: SCENARIO[name] - STEP})
+        change = (up - down) * (bump / (2 * STEP))
+        change = change.set_axis(change.index.astype(str)).loc[years]
+        np.testing.assert_allclose(
+            sensitivities.loc['interest_payment'][name], change['interest_payment'],
+            rtol=1e-2, atol=0.02 * bump / STEP, err_msg=name)
+        np.testing.assert_allclose(
+            sensitivities.loc['pct_gdp'][name], change['pct_gdp'], rtol=1e-2, atol=3e-5 * bump / STEP, err_msg=name)
@@ -0,0 +1,114 @@
+import json
+import time
+import threading
+import urllib.request
+import numpy as np
+import pandas as pd
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from synthetic import write_synthetic_data
+from main import run_scenario
+from server import EXPOSURE_CACHE_SIZE, ModelServer, RequestHandler
+
+REISSUE_END_DATE = pd.Timestamp('2030-12-31')
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+DEFAULTS = {
+    'new_debt': True,
+    'interest_rates': {'1': 4.2, '2': 3.8, '5': 3.4, '10': 3.4, '30': 3.5},
+    'interest_rate_path': None,
+    'gdp_millions': 29176000,
+    'gdp_growth_rate': 5.0,
+    'new_debt_pct_gdp': 7.0,
+    'new_debt_interest_rate': 3.7,
+    'new_debt_maturity_mix': {'1': 0.5, '10': 0.5},
+    'legacy_new_debt': False,
+    'initial_debt_millions': None,
+    'multiplier': 1.19,
+    'fiscal_calendar': False,
+    'period': None,
+    'exact_accrual': False,
+    'cash_basis': False,
+    'rate_interpolation': 'nearest',
+}
+
+@pytest.fixture(scope='module')
+def model(tmp_path_factory):
+    raw_data_path, historical_gdps_path = write_synthetic_data(200, str(tmp_path_factory.mktemp('synthetic')))
+    return ModelServer(raw_data_path, historical_gdps_path, SECURITY_TYPES, REISSUE_END_DATE, DEFAULTS)
+
+def test_exposure_built_once_under_concurrent_requests(model):
+    state = model.state
+    calls = []
+    started = threading.Event()
+
+    def build():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {'built': len(calls)}
+
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(model.get_exposure, state, 'rate_exposures', ('slow',), build) for _ in range(8)]
+        # Other keys are not held up by the one being built.
+        assert started.wait(5)
+        assert model.get_exposure(state, 'rate_exposures', ('other',), lambda: 'other') == 'other'
+        assert not futures[0].done()
+        results = [future.result() for future in futures]
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+def test_failed_build_is_retried(model):
+    state = model.state
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError('build failed')
+
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(model.get_exposure, state, 'new_debt_exposures', ('failing',), fail) for _ in range(4)]
+        for future in futures:
+            with pytest.raises(ValueError, match='build failed'):
+                future.result()
+    assert ('failing',) not in state['new_debt_exposures']
+    assert model.get_exposure(state, 'new_debt_exposures', ('failing',), lambda: 'retried') == 'retried'
+
+def test_exposure_cache_is_bounded(model):
+    state = model.state
+    for i in range(EXPOSURE_CACHE_SIZE + 3):
+        model.get_exposure(state, 'rate_exposures', ('bounded', i), lambda: i)
+    keys = list(state['rate_exposures'])
+    assert len(keys) == EXPOSURE_CACHE_SIZE
+    assert keys[-1] == ('bounded', EXPOSURE_CACHE_SIZE + 2)
+
+def test_concurrent_scenarios_match_run_scenario(model):
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+    httpd.daemon_threads = True
+    httpd.model = model
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/scenario"
+
+    def post(params):
+        request = urllib.request.Request(url, json.dumps(params).encode(), {'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            body = json.loads(response.read())
+        return pd.DataFrame(body['data'], columns=body['columns']).set_index(body['columns'][0])
+
+    requests = [
+        {'gdp_growth_rate': growth, 'interest_rates': rates, '--new-debt-maturity-mix': mix}
+        for growth in [4.0, 6.0]
+        for rates in [{'1': 5.0, '10': 4.5}, {'3m': 5.2, '2': 4.0, '30': 4.4}]
+        for mix in [{'1': 1.0}, {'26w': 0.5, '10y': 0.5}]]
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(post, requests))
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    state = model.state
+    for params, result in zip(requests, results):
+        expected = run_scenario(
+            state['df'], state['max_record_date'], state['historical_gdps'], REISSUE_END_DATE,
+            write_intermediates=False, **model.parse_scenario(params))
+        np.testing.assert_allclose(result.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64), rtol=1e-9)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import write_synthetic_data
+from data import load_securities
+from main import load_historical_gdps, simulate_security_types, run_scenario
+from shards import partition_securities, simulate_sharded
+
+REISSUE_END_DATE = pd.Timestamp('2035-12-31')
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+INTEREST_RATES = {1: 4.2, 2: 3.8, 3: 3.6, 5: 3.4, 7: 3.4, 10: 3.4, 20: 3.4, 30: 3.5}
+
+@pytest.fixture(scope='module')
+def data(tmp_path_factory):
+    raw_data_path, historical_gdps_path = write_synthetic_data(300, str(tmp_path_factory.mktemp('synthetic')))
+    df, max_record_date = load_securities(raw_data_path, SECURITY_TYPES)
+    return df, max_record_date, load_historical_gdps(historical_gdps_path)
+
+def run(data, **kwargs) -> pd.DataFrame:
+    df, max_record_date, historical_gdps = data
+    return run_scenario(
+        df=df,
+        max_record_date=max_record_date,
+        historical_gdps=historical_gdps,
+        reissue_end_date=REISSUE_END_DATE,
+        new_debt=False,
+        interest_rates=INTEREST_RATES,
+        gdp_millions=29176000,
+        gdp_growth_rate=5.0,
+        new_debt_pct_gdp=7.0,
+        new_debt_interest_rate=3.7,
+        multiplier=1.19,
+        write_intermediates=False,
+        **kwargs)
+
+def test_partition_keeps_groups_whole():
+    groups = np.array([3, 0, 3, 1, 0, 5, 3])
+    work = np.array([1, 4, 1, 2, 4, 1, 1])
+    shards = partition_securities(groups, work, 3)
+    assert [list(positions) for positions in shards] == [[1, 4], [0, 2, 6], [3, 5]]
+    # No more shards than groups.
+    assert len(partition_securities(groups, work, 7)) == 4
+
+@pytest.mark.parametrize('num_shards', [2, 3, 7])
+def test_sharded_is_bit_identical(data, num_shards):
+    df, max_record_date, _ = data
+    serial = simulate_security_types(df, max_record_date, REISSUE_END_DATE, INTEREST_RATES)
+    sharded = simulate_sharded(df, max_record_date, REISSUE_END_DATE, INTEREST_RATES, num_shards, max_workers=2)
+    pd.testing.assert_frame_equal(sharded, serial, check_exact=True)
+    pd.testing.assert_frame_equal(run(data, num_shards=num_shards), run(data), check_exact=True)
+
+def test_sharded_rate_path_is_bit_identical(data):
+    df, max_record_date, _ = data
+    years = range(max_record_date.year, REISSUE_END_DATE.year + 1)
+    rate_path = pd.DataFrame(
+        {term: np.linspace(rate, rate + 1.5, len(years)) for term, rate in INTEREST_RATES.items()},
+        index=pd.Index(years, name='year'))
+    serial = simulate_security_types(
+        df, max_record_date, REISSUE_END_DATE, rate_path, rate_interpolation='linear')
+    sharded = simulate_sharded(
+        df, max_record_date, REISSUE_END_DATE, rate_path, 3, interpolation='linear', max_workers=2)
+    pd.testing.assert_frame_equal(sharded, serial, check_exact=True)
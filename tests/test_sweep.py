@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import write_synthetic_data
+from data import load_securities
+from main import load_historical_gdps, run_scenario
+from sweep import SCENARIO_PARAMETERS, build_scenarios, run_sweep, create_cube, open_cube, write_cube_slice, slice_cube
+
+REISSUE_END_DATE = pd.Timestamp('2030-12-31')
+SECURITY_TYPES = ['Notes', 'Bonds', 'Bills Maturity Value']
+DEFAULTS = {
+    'interest_rates': {'1': 4.2, '2': 3.8, '5': 3.4, '10': 3.4, '30': 3.5},
+    'gdp_millions': 29176000,
+    'gdp_growth_rate': 5.0,
+    'new_debt_pct_gdp': 7.0,
+    'new_debt_interest_rate': 3.7,
+    'new_debt_maturity_mix': {'1': 0.5, '10': 0.5},
+    'multiplier': 1.19,
+}
+
+@pytest.fixture(scope='module')
+def paths(tmp_path_factory):
+    return write_synthetic_data(200, str(tmp_path_factory.mktemp('synthetic')))
+
+def test_build_scenarios():
+    scenarios = build_scenarios({
+        'grid': {'gdp_growth_rate': [4.0, 5.0], 'new_debt_pct_gdp': [5.0, 6.0, 7.0]},
+        'scenarios': [{'interest_rates': {'1': 5.0, '10': 4.5}}]
+    }, DEFAULTS)
+    assert len(scenarios) == 7
+    assert [(s['gdp_growth_rate'], s['new_debt_pct_gdp']) for s in scenarios[:3]] == [(4.0, 5.0), (4.0, 6.0), (4.0, 7.0)]
+    assert all(set(scenario) == set(SCENARIO_PARAMETERS) for scenario in scenarios)
+    assert scenarios[0]['interest_rates'] == {1: 4.2, 2: 3.8, 5: 3.4, 10: 3.4, 30: 3.5}
+    assert scenarios[-1]['interest_rates'] == {1: 5.0, 10: 4.5}
+    with pytest.raises(ValueError):
+        build_scenarios({'scenarios': [{'gdp': 1}]}, DEFAULTS)
+
+def test_sweep_matches_run_scenario(paths, tmp_path):
+    raw_data_path, historical_gdps_path = paths
+    scenarios = build_scenarios({'grid': {'gdp_growth_rate': [4.0, 6.0]}}, DEFAULTS)
+    sweep_df = run_sweep(
+        raw_data_path, historical_gdps_path, str(tmp_path / 'sweep.csv'), REISSUE_END_DATE, True,
+        SECURITY_TYPES, scenarios, max_workers=2)
+
+    df, max_record_date = load_securities(raw_data_path, SECURITY_TYPES)
+    historical_gdps = load_historical_gdps(historical_gdps_path)
+    for scenario_id, scenario in enumerate(scenarios):
+        expected = run_scenario(
+            df, max_record_date, historical_gdps, REISSUE_END_DATE, True, **scenario, write_intermediates=False)
+        result = sweep_df[sweep_df['scenario_id'] == scenario_id].set_index('year')[expected.columns]
+        pd.testing.assert_frame_equal(result, expected.rename_axis('year'), check_exact=True, check_index_type=False)
+
+def test_cube_slices_match_run_scenario(paths, tmp_path):
+    raw_data_path, historical_gdps_path = paths
+    df, max_record_date = load_securities(raw_data_path, SECURITY_TYPES)
+    historical_gdps = load_historical_gdps(historical_gdps_path)
+    scenarios = build_scenarios({'grid': {'gdp_growth_rate': [4.0, 5.0, 6.0], 'new_debt_pct_gdp': [5.0, 7.0]}}, DEFAULTS)
+    results = [
+        run_scenario(df, max_record_date, historical_gdps, REISSUE_END_DATE, True, **scenario, write_intermediates=False)
+        for scenario in scenarios]
+    years = np.arange(2015, REISSUE_END_DATE.year + 1)
+    create_cube(str(tmp_path / 'cube'), scenarios, years)
+
+    cube = open_cube(str(tmp_path / 'cube'), mode='r+')
+    write_cube_slice(cube, 0, results[:4])
+    write_cube_slice(cube, 4, results[4:])
+    cube = open_cube(str(tmp_path / 'cube'))
+    for year in [2016, 2024, 2030]:
+        for metric in cube['metrics']:
+            expected = [result[metric].get(str(year), np.nan) for result in results]
+            np.testing.assert_array_equal(slice_cube(cube, year, metric), expected)
+    # Each year and metric is contiguous across scenarios on disk.
+    assert cube['values'][:, 0, 0].flags['C_CONTIGUOUS']
+
+def test_sweep_cube_matches_csv(paths, tmp_path):
+    raw_data_path, historical_gdps_path = paths
+    scenarios = build_scenarios({'grid': {'gdp_growth_rate': [4.0, 5.0, 6.0]}}, DEFAULTS)
+    args = (
+        raw_data_path, historical_gdps_path, str(tmp_path / 'sweep.csv'), REISSUE_END_DATE, True, SECURITY_TYPES,
+        scenarios)
+    sweep_df = run_sweep(*args, max_workers=2)
+    cube = run_sweep(*args, max_workers=2, cube_dir=str(tmp_path / 'cube'))
+    for metric in cube['metrics']:
+        values = sweep_df.pivot(index='scenario_id', columns='year', values=metric)
+        values.columns = values.columns.astype(int)
+        year_index = [cube['year_index'][year] for year in values.columns]
+        np.testing.assert_array_equal(values, cube['values'][:, year_index, cube['metric_index'][metric]])